@@ -0,0 +1,250 @@
+"""
+In-process TTL/LRU cache for analytics responses, kept consistent across
+API processes by PostgreSQL LISTEN/NOTIFY (see sql/02_triggers.sql)
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Set, Tuple
+from app.database import direct_engine, DB_APPLICATION_NAME
+import logging
+import os
+import select
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Listen for change notifications from the database; without it entries from
+# other processes' writes are only dropped by the TTL
+ANALYTICS_CACHE_LISTEN = os.getenv("ANALYTICS_CACHE_LISTEN", "true").lower() == "true"
+# 0 disables caching
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "300" if ANALYTICS_CACHE_LISTEN else "30"))
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "1000"))
+NOTIFY_CHANNEL = "analytics_changes"
+
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache with a TTL per entry.
+    Entries carry tags (e.g. "submissions", "contest:5"); invalidate(tag)
+    drops only the entries that depend on that data.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Hashable, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        self.keys_by_tag: dict = {}
+        # Invalidation clock: a value computed before an invalidation of one of
+        # its tags is stale and must not be stored (see token/set)
+        self.clock = 0
+        self.cleared_at = -1
+        self.invalidated_at: dict = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def token(self) -> int:
+        """Take before computing a value; pass to set()"""
+        with self.lock:
+            return self.clock
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(True, value) on a hit, (False, None) on a miss or expired entry"""
+        if not self.enabled:
+            return False, None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, value, tags = entry
+                if expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                self.remove(key, tags)
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str], token: int) -> None:
+        """Store a value computed after token() unless one of its tags was invalidated since"""
+        if not self.enabled:
+            return
+        tags = tuple(tags)
+        with self.lock:
+            if self.cleared_at > token or any(self.invalidated_at.get(tag, -1) > token for tag in tags):
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.untag(key, old[2])
+            self.entries[key] = (time.monotonic() + self.ttl_seconds, value, tags)
+            for tag in tags:
+                self.keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                oldest, (_, _, oldest_tags) = next(iter(self.entries.items()))
+                self.remove(oldest, oldest_tags)
+                self.evictions += 1
+
+    def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of the tags"""
+        with self.lock:
+            self.clock += 1
+            for tag in tags:
+                self.invalidated_at[tag] = self.clock
+                for key in self.keys_by_tag.pop(tag, set()):
+                    entry = self.entries.pop(key, None)
+                    if entry is not None:
+                        self.untag(key, entry[2])
+                        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after notifications may have been missed"""
+        with self.lock:
+            self.clock += 1
+            self.cleared_at = self.clock
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.keys_by_tag.clear()
+
+    def remove(self, key: Hashable, tags: Tuple[str, ...]) -> None:
+        del self.entries[key]
+        self.untag(key, tags)
+
+    def untag(self, key: Hashable, tags: Tuple[str, ...]) -> None:
+        for tag in tags:
+            keys = self.keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.keys_by_tag[tag]
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl_seconds,
+                "max_entries": self.max_entries,
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+
+def notification_tags(payload: str) -> tuple:
+    """Cache tags made stale by one analytics_changes notification"""
+    table, _, key = payload.partition(":")
+    if table == "submissions":
+        return ("submissions", f"contest:{key}")
+    if table == "standings":
+        return (f"contest:{key}",)
+    if table == "contests":
+        # Freeze and resolve change the record, the frozen scoreboard follows it
+        return (f"contest:{key}", f"frozen:{key}")
+    if table == "analytics_snapshots":
+        return (f"snapshot:{key}",)
+    return (table,)
+
+
+class InvalidationListener:
+    """Background thread that applies analytics_changes notifications to the cache and passes them on to handlers"""
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self.handlers = []
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+
+    def add_handler(self, handler: Callable[[Optional[Set[str]]], None]) -> None:
+        """
+        Call handler(payloads) from the listener thread with each batch of notification
+        payloads, and handler(None) after (re)connecting, when changes may have been missed
+        """
+        self.handlers.append(handler)
+
+    def dispatch(self, payloads: Optional[Set[str]]) -> None:
+        for handler in self.handlers:
+            try:
+                handler(payloads)
+            except Exception as e:
+                logger.error(f"Change notification handler failed: {str(e)}")
+
+    def connect(self):
+        # A dedicated connection outside the pool; LISTEN needs a session, so it
+        # goes to PostgreSQL directly even when DATABASE_URL points at PgBouncer
+        cargs, cparams = direct_engine.dialect.create_connect_args(direct_engine.url)
+        cparams["application_name"] = f"{DB_APPLICATION_NAME}-listener"
+        connection = direct_engine.dialect.connect(*cargs, **cparams)
+        connection.autocommit = True
+        connection.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return connection
+
+    def run(self) -> None:
+        delay = 1.0
+        while not self.stop_event.is_set():
+            connection = None
+            try:
+                connection = self.connect()
+                # Changes made while not listening were missed
+                self.cache.clear()
+                self.dispatch(None)
+                self.connected = True
+                delay = 1.0
+                while not self.stop_event.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    payloads = set()
+                    while connection.notifies:
+                        payloads.add(connection.notifies.pop(0).payload)
+                        self.notifications += 1
+                    if payloads:
+                        self.cache.invalidate(*{tag for payload in payloads for tag in notification_tags(payload)})
+                        self.dispatch(payloads)
+            except Exception as e:
+                logger.error(f"Analytics cache listener failed, retrying in {delay:.0f} s: {str(e)}")
+                self.reconnects += 1
+                self.stop_event.wait(delay)
+                delay = min(delay * 2, 30.0)
+            finally:
+                self.connected = False
+                if connection is not None:
+                    connection.close()
+
+    def start(self) -> None:
+        if not (ANALYTICS_CACHE_LISTEN and (self.cache.enabled or self.handlers)):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="analytics-cache-listener", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.thread is not None,
+            "connected": self.connected,
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+        }
+
+
+analytics_cache = ResponseCache(ANALYTICS_CACHE_MAX_ENTRIES, ANALYTICS_CACHE_TTL_SECONDS)
+cache_listener = InvalidationListener(analytics_cache)
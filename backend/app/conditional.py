@@ -0,0 +1,80 @@
+"""
+Conditional GET: ETag / Last-Modified from the time the data behind a response
+last changed (standings.last_updated, audit_log.changed_at) and 304 Not Modified
+"""
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+from email.utils import formatdate, mktime_tz, parsedate_tz
+from typing import NamedTuple, Optional
+import os
+import time
+
+# Validators are sent only once the data has not changed for this long. Change
+# times are transaction start times, so a writer that started earlier but
+# commits later does not move the latest one; this bounds how long such a
+# change could hide behind an already issued ETag.
+ETAG_SETTLE_SECONDS = float(os.getenv("ETAG_SETTLE_SECONDS", "5"))
+
+# Latest change time of a piece of data; each is an indexed MAX lookup, :id is the record or contest
+USERS_CHANGED = "SELECT MAX(changed_at) FROM audit_log WHERE table_name = 'users'"
+CONTEST_STANDINGS_CHANGED = "SELECT MAX(last_updated) FROM standings WHERE contest_id = :id"
+CONTEST_SUBMISSIONS_CHANGED = """
+    SELECT GREATEST(
+        (SELECT MAX(changed_at) FROM audit_log
+         WHERE table_name = 'submissions' AND (COALESCE(new_values, old_values)->>'contest_id')::INTEGER = :id),
+        (SELECT MAX(changed_at) FROM audit_log
+         WHERE table_name = 'submissions' AND operation = 'UPDATE'
+           AND old_values->'contest_id' IS DISTINCT FROM new_values->'contest_id'
+           AND (old_values->>'contest_id')::INTEGER = :id)
+    )
+"""
+
+
+def record_changed(table_name: str) -> str:
+    return f"SELECT MAX(changed_at) FROM audit_log WHERE table_name = '{table_name}' AND record_id = :id"
+
+
+def version_query(*sources: str) -> TextClause:
+    """Latest change time over sources (epoch seconds) and its age by the database clock"""
+    return text(f"""
+        WITH v AS MATERIALIZED (SELECT GREATEST({", ".join(f"({source})" for source in sources)}) AS changed_at)
+        SELECT EXTRACT(EPOCH FROM changed_at AT TIME ZONE current_setting('TimeZone')) AS changed_at,
+               EXTRACT(EPOCH FROM LOCALTIMESTAMP - changed_at) AS age
+        FROM v
+    """)
+
+
+class Version(NamedTuple):
+    changed_at: float
+    age: float
+    read_at: float
+
+
+def read_version(row) -> Optional[Version]:
+    """Version from a version_query row; None when nothing is recorded"""
+    if row is None or row.changed_at is None:
+        return None
+    return Version(float(row.changed_at), float(row.age), time.monotonic())
+
+
+def conditional_headers(request: Request, version: Optional[Version], name: str) -> dict:
+    """
+    ETag and Last-Modified of version for the response. Raises 304 Not Modified
+    (with the same headers) when the client already holds it: If-None-Match is
+    checked first, If-Modified-Since only without it.
+    """
+    if version is None or version.age + time.monotonic() - version.read_at < ETAG_SETTLE_SECONDS:
+        return {}
+    etag = f'"{name}-{round(version.changed_at * 1000000)}"'
+    headers = {"ETag": f"W/{etag}", "Last-Modified": formatdate(version.changed_at, usegmt=True)}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        current = "*" in tags or etag in tags
+    else:
+        since = parsedate_tz(request.headers.get("if-modified-since", ""))
+        current = since is not None and mktime_tz(since) >= int(version.changed_at)
+    if current:
+        raise HTTPException(status_code=304, headers=headers)
+    return headers
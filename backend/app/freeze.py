@@ -0,0 +1,72 @@
+"""
+Scoreboard freeze: during the last contests.freeze_minutes of a contest the public
+standings come from the frozen_standings snapshot (see sql/03_functions.sql);
+jury and admin viewers keep the live ones
+"""
+from bisect import bisect_left, insort
+from sqlalchemy import text
+from typing import List, Optional
+
+LIVE_STANDINGS_ROLES = ("jury", "admin")
+
+VIEWER_ROLE_QUERY = text("SELECT role FROM users WHERE user_id = :user_id")
+# No row: no such contest
+CONTEST_FREEZE_QUERY = text("""
+    SELECT COALESCE(freeze_time <= LOCALTIMESTAMP AND unfrozen_at IS NULL, FALSE) AS frozen,
+           frozen_at IS NOT NULL AS snapshot_taken
+    FROM contests
+    WHERE contest_id = :contest_id
+""")
+FREEZE_STANDINGS_QUERY = text("SELECT freeze_contest_standings(:contest_id)")
+
+
+def sees_live_standings(role: Optional[str]) -> bool:
+    return role in LIVE_STANDINGS_ROLES
+
+
+def frozen_tags(contest_id: int) -> tuple:
+    """Cache tags of a frozen scoreboard: only the contest record (freeze, resolve) and participants' names"""
+    return (f"frozen:{contest_id}", "users")
+
+
+def with_freeze_header(headers: dict, frozen: bool) -> dict:
+    return {**headers, "X-Standings-Frozen": "true"} if frozen else headers
+
+
+def replay_standings(base, steps) -> List[dict]:
+    """
+    Participant totals and rank after each hidden submission, starting from the
+    frozen board (base rows). Ranks order like v_contest_standings;
+    a participant is ranked from their first non-zero result on.
+    """
+    totals = {row.user_id: (row.total_score, row.problems_solved, row.penalty_time) for row in base}
+    board = sorted((-score, penalty, user_id) for user_id, (score, _, penalty) in totals.items())
+    replay = []
+    for number, step in enumerate(steps, 1):
+        score, solved, penalty = totals.get(step.user_id, (0, 0, 0))
+        old_key = (-score, penalty, step.user_id)
+        index = bisect_left(board, old_key)
+        previous_rank = index + 1 if index < len(board) and board[index] == old_key else None
+        if previous_rank is not None:
+            del board[index]
+        score, solved, penalty = score + step.score_delta, solved + step.solved_delta, penalty + step.penalty_delta
+        totals[step.user_id] = (score, solved, penalty)
+        rank = None
+        if previous_rank is not None or (score, solved, penalty) != (0, 0, 0):
+            new_key = (-score, penalty, step.user_id)
+            insort(board, new_key)
+            rank = bisect_left(board, new_key) + 1
+        replay.append({
+            "step": number,
+            "submission_id": step.submission_id,
+            "user_id": step.user_id,
+            "problem_id": step.problem_id,
+            "submitted_at": step.submitted_at,
+            "verdict": step.verdict,
+            "total_score": score,
+            "problems_solved": solved,
+            "penalty_time": penalty,
+            "previous_rank": previous_rank,
+            "rank": rank,
+        })
+    return replay
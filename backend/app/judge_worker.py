@@ -0,0 +1,285 @@
+"""
+Built-in judge: worker processes claim pending submissions from the judging
+queue (see app/routes/judge.py), run them against the problem's testcases in
+the sandbox (see app/sandbox.py) and report the verdicts of each claimed batch
+in one transaction. Verdicts reach the API cache through change notifications
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import text
+from app.database import SessionLocal
+from app.routes.judge import HEARTBEAT_QUERY, REPORT_QUERY, JUDGE_LEASE_SECONDS, JUDGE_MAX_ATTEMPTS
+from app.sandbox import (
+    LANGUAGES, JUDGE_BUILD_CACHE_DIR, JUDGE_BUILD_CACHE_MB, JUDGE_RUN_UID, BuildCache, BuildCacheStats, TestData,
+    cache_entries, check_sandbox, chunks, judge,
+)
+from app.testcase_store import ChunkCache, iter_chunks
+import functools
+import logging
+import multiprocessing
+import orjson
+import os
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Run the judge inside the API process tree; off by default because it executes submitted code
+JUDGE_LOCAL = os.getenv("JUDGE_LOCAL", "false").lower() == "true"
+JUDGE_WORKERS_PER_CORE = float(os.getenv("JUDGE_WORKERS_PER_CORE", "1"))
+# Submissions claimed (and reported) at once by a worker
+JUDGE_CLAIM_BATCH = int(os.getenv("JUDGE_CLAIM_BATCH", "4"))
+# Pause after an empty claim
+JUDGE_IDLE_SECONDS = float(os.getenv("JUDGE_IDLE_SECONDS", "0.5"))
+# Compressed chunks of large tests kept per worker, so they are not read again for every submission
+JUDGE_TESTCASE_CACHE_MB = int(os.getenv("JUDGE_TESTCASE_CACHE_MB", "256"))
+
+PROBLEMS_QUERY = text("""
+    SELECT p.problem_id, p.time_limit_ms, p.memory_limit_mb
+    FROM problems p
+    WHERE p.problem_id = ANY(:problem_ids)
+""")
+# Large tests come as chunk hashes; their data is read chunk by chunk while the test runs
+TESTCASES_QUERY = text("""
+    SELECT t.problem_id, t.input_data, t.expected_output, t.input_chunks, t.output_chunks, t.chunk_size
+    FROM testcases t
+    WHERE t.problem_id = ANY(:problem_ids)
+    ORDER BY t.problem_id, t.test_order, t.testcase_id
+""")
+MAX_SCORE_QUERY = text("""
+    SELECT cp.contest_id, cp.problem_id, cp.max_score
+    FROM contest_problems cp
+    WHERE cp.contest_id = ANY(:contest_ids) AND cp.problem_id = ANY(:problem_ids)
+""")
+# Only submissions of problems with testcases: the rest stay for external judges instead of
+# being claimed, skipped and claimed again when the lease lapses
+CLAIM_QUERY = text("""
+    SELECT * FROM claim_pending_submissions(:judge_id, :limit, :lease_seconds, :languages, TRUE, :max_attempts)
+""")
+# Expired leases stay: their attempts keep counting towards JUDGE_MAX_ATTEMPTS
+RELEASE_QUERY = text("DELETE FROM judge_leases WHERE judge_id = :judge_id AND expires_at > LOCALTIMESTAMP")
+RELEASE_SUBMISSIONS_QUERY = text("""
+    DELETE FROM judge_leases WHERE judge_id = :judge_id AND submission_id = ANY(:submission_ids)
+""")
+# A submission the judge failed on goes back to the queue at once, one attempt used
+EXPIRE_SUBMISSIONS_QUERY = text("""
+    UPDATE judge_leases SET expires_at = LOCALTIMESTAMP
+    WHERE judge_id = :judge_id AND submission_id = ANY(:submission_ids)
+""")
+
+judge_context = multiprocessing.get_context("spawn")
+# Set on shutdown: workers report what they have judged and release the rest of their batch
+judge_stop = None
+# Build cache hits and misses of all workers since the API started
+judge_stats: Optional[BuildCacheStats] = None
+# Created by start_judges, not at import: spawned workers import this module too
+judge_executor: Optional[ProcessPoolExecutor] = None
+# Why JUDGE_LOCAL is on but the workers were not started
+judge_error: Optional[str] = None
+chunk_cache = ChunkCache(JUDGE_TESTCASE_CACHE_MB)
+
+
+def judge_workers() -> int:
+    return max(1, round((os.cpu_count() or 1) * JUDGE_WORKERS_PER_CORE))
+
+
+def init_judge_worker(stop_event, stats) -> None:
+    """Set up a judge worker process"""
+    global judge_stop, judge_stats
+    judge_stop = stop_event
+    judge_stats = stats
+
+
+class Problem:
+    """Limits and testcases (input, expected output) in test order"""
+
+    __slots__ = ("time_limit_ms", "memory_limit_mb", "testcases")
+
+    def __init__(self, time_limit_ms: int, memory_limit_mb: int):
+        self.time_limit_ms = time_limit_ms
+        self.memory_limit_mb = memory_limit_mb
+        self.testcases: List[Tuple[TestData, TestData]] = []
+
+
+def test_data(inline: Optional[str], hashes: Optional[List[bytes]], chunk_size: int) -> TestData:
+    if hashes is None:
+        return functools.partial(chunks, inline)
+    return functools.partial(iter_chunks, [bytes(digest) for digest in hashes], chunk_size, cache=chunk_cache)
+
+
+def load_problems(db, tasks) -> Tuple[Dict[int, Problem], Dict[Tuple[int, int], int]]:
+    """Problems of a claimed batch with their testcases, and max scores by (contest, problem)"""
+    problem_ids = sorted({task.problem_id for task in tasks})
+    contest_ids = sorted({task.contest_id for task in tasks})
+    problems = {
+        row.problem_id: Problem(row.time_limit_ms, row.memory_limit_mb)
+        for row in db.execute(PROBLEMS_QUERY, {"problem_ids": problem_ids})
+    }
+    for row in db.execute(TESTCASES_QUERY, {"problem_ids": problem_ids}):
+        problems[row.problem_id].testcases.append((
+            test_data(row.input_data, row.input_chunks, row.chunk_size),
+            test_data(row.expected_output, row.output_chunks, row.chunk_size),
+        ))
+    max_scores = {
+        (row.contest_id, row.problem_id): row.max_score
+        for row in db.execute(MAX_SCORE_QUERY, {"contest_ids": contest_ids, "problem_ids": problem_ids})
+    }
+    db.commit()
+    return problems, max_scores
+
+
+def keep_leases(judge_id: str, submission_ids: List[int], done: threading.Event) -> None:
+    """Renew the batch's leases until it is reported; a test run may outlast one lease"""
+    db = SessionLocal()
+    try:
+        while not done.wait(JUDGE_LEASE_SECONDS / 3):
+            db.execute(HEARTBEAT_QUERY, {
+                "judge_id": judge_id, "submission_ids": submission_ids, "lease_seconds": JUDGE_LEASE_SECONDS,
+            })
+            db.commit()
+    except Exception as e:
+        logger.error(f"Judge {judge_id} could not renew leases: {str(e)}")
+    finally:
+        db.close()
+
+
+def judge_batch(db, judge_id: str, tasks, cache: BuildCache, uid: int) -> int:
+    """Judge claimed submissions in order as uid and report them together; returns the number applied"""
+    problems, max_scores = load_problems(db, tasks)
+    results = []
+    released = []
+    failed = []
+    done = threading.Event()
+    keeper = threading.Thread(
+        target=keep_leases, args=(judge_id, [task.submission_id for task in tasks], done), daemon=True,
+    )
+    keeper.start()
+    try:
+        for task in tasks:
+            if judge_stop.is_set():
+                break
+            problem = problems.get(task.problem_id)
+            if problem is None or not problem.testcases:
+                # Testcases deleted since the claim: the lease is released and local claims skip the submission
+                logger.warning(f"Judge {judge_id}: problem {task.problem_id} has no testcases")
+                released.append(task.submission_id)
+                continue
+            try:
+                build = cache.get(task.language, task.source_code, uid)
+                try:
+                    result = judge(build, problem.testcases, problem.time_limit_ms, problem.memory_limit_mb, uid)
+                finally:
+                    cache.release(build)
+            except Exception as e:
+                # Only this submission is retried (up to JUDGE_MAX_ATTEMPTS claims); the rest of the batch is reported
+                logger.error(f"Judge {judge_id} failed on submission {task.submission_id}: {str(e)}")
+                failed.append(task.submission_id)
+                continue
+            results.append({
+                "submission_id": task.submission_id,
+                "verdict": result.verdict,
+                "execution_time_ms": result.time_ms,
+                "memory_used_mb": result.memory_mb,
+                "score": max_scores.get((task.contest_id, task.problem_id), 100)
+                if result.verdict == "accepted" else 0,
+            })
+    finally:
+        done.set()
+        keeper.join()
+    if released:
+        db.execute(RELEASE_SUBMISSIONS_QUERY, {"judge_id": judge_id, "submission_ids": released})
+    if failed:
+        db.execute(EXPIRE_SUBMISSIONS_QUERY, {"judge_id": judge_id, "submission_ids": failed})
+    rows = []
+    if results:
+        rows = db.execute(REPORT_QUERY, {"judge_id": judge_id, "results": orjson.dumps(results).decode()}).all()
+    db.commit()
+    return len(rows)
+
+
+def run_judge_worker(number: int) -> None:
+    """Claim, judge and report until shutdown; leases left unjudged are released"""
+    judge_id = f"local-{socket.gethostname()}-{os.getpid()}"[:64]
+    cache = BuildCache(judge_stats)
+    db = SessionLocal()
+    logger.info(f"Judge worker {number} started as {judge_id}")
+    try:
+        while not judge_stop.is_set():
+            try:
+                tasks = db.execute(CLAIM_QUERY, {
+                    "judge_id": judge_id, "limit": JUDGE_CLAIM_BATCH,
+                    "lease_seconds": JUDGE_LEASE_SECONDS, "languages": list(LANGUAGES),
+                    "max_attempts": JUDGE_MAX_ATTEMPTS,
+                }).all()
+                db.commit()
+                if not tasks:
+                    judge_stop.wait(JUDGE_IDLE_SECONDS)
+                    continue
+                judge_batch(db, judge_id, tasks, cache, JUDGE_RUN_UID + number)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Judge worker {number} failed a batch: {str(e)}")
+                judge_stop.wait(JUDGE_IDLE_SECONDS)
+    finally:
+        try:
+            db.execute(RELEASE_QUERY, {"judge_id": judge_id})
+            db.commit()
+        finally:
+            db.close()
+
+
+def start_judges() -> None:
+    """Start JUDGE_WORKERS_PER_CORE workers per CPU core when JUDGE_LOCAL is on and solutions can be isolated"""
+    global judge_executor, judge_error, judge_stop, judge_stats
+    if not JUDGE_LOCAL:
+        return
+    workers = judge_workers()
+    # Submitted code must not run as the API's user: it could read DATABASE_URL from /proc
+    judge_error = check_sandbox(range(JUDGE_RUN_UID, JUDGE_RUN_UID + workers))
+    if judge_error is not None:
+        logger.error(f"Local judges not started: {judge_error}")
+        return
+    judge_stop = judge_context.Event()
+    if judge_stats is None:
+        judge_stats = BuildCacheStats(judge_context)
+    judge_executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=judge_context,
+        initializer=init_judge_worker,
+        initargs=(judge_stop, judge_stats),
+    )
+    for number in range(workers):
+        judge_executor.submit(run_judge_worker, number)
+    logger.info(f"Started {workers} local judge workers for {', '.join(LANGUAGES)}")
+
+
+async def stop_judges() -> None:
+    """Stop workers after the submission they are running"""
+    global judge_executor
+    if judge_executor is None:
+        return
+    judge_stop.set()
+    executor, judge_executor = judge_executor, None
+    # Waiting for the submissions in flight must not block the event loop
+    await run_in_threadpool(executor.shutdown, wait=True, cancel_futures=True)
+
+
+def judge_status() -> dict:
+    """Local judge pool and build cache: hits and misses since start, entries and size on disk"""
+    stats = judge_stats.snapshot() if judge_stats is not None else dict.fromkeys(BuildCacheStats.FIELDS, 0)
+    lookups = stats["hits"] + stats["misses"]
+    entries = cache_entries(JUDGE_BUILD_CACHE_DIR) if JUDGE_BUILD_CACHE_MB > 0 else []
+    return {
+        "enabled": judge_executor is not None,
+        "error": judge_error,
+        "workers": judge_workers() if judge_executor is not None else 0,
+        "languages": list(LANGUAGES),
+        "build_cache": {
+            **stats,
+            "hit_ratio": stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(entries),
+            "size_mb": round(sum(size for _, _, size in entries) / 1024 / 1024, 2),
+            "limit_mb": JUDGE_BUILD_CACHE_MB,
+        },
+    }
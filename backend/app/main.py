@@ -2,9 +2,34 @@
 Main FastAPI application
 Competitive Programming Contest Management System
 """
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import users, contests, problems, submissions, analytics, batch
+from starlette.concurrency import run_in_threadpool
+from app.routes import users, contests, problems, testcases, submissions, judge, analytics, batch, exports
+from app.database import get_pool_status, async_engine
+from app.cache import analytics_cache, cache_listener
+from app.responses import FastJSONResponse
+from app.judge_worker import start_judges, stop_judges, judge_status
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background work (batch jobs, local judges, snapshot refresh, live scoreboards, change listener); stop it and close async connections on shutdown"""
+    batch.start_jobs()
+    start_judges()
+    analytics.start_refresh_scheduler()
+    analytics.scoreboard_hub.start()
+    cache_listener.start()
+    yield
+    # Joins the listener thread; off the event loop so open streams keep being served
+    await run_in_threadpool(cache_listener.stop)
+    await analytics.scoreboard_hub.stop()
+    await run_in_threadpool(analytics.stop_refresh_scheduler)
+    await stop_judges()
+    await batch.stop_jobs()
+    await async_engine.dispose()
+
 
 app = FastAPI(
     title="Competitive Programming Contest Management System",
@@ -13,11 +38,14 @@ app = FastAPI(
     
     Основные возможности:
     - Users: Управление пользователями (участники, жюри, администраторы)
-    - Contests: Создание и управление соревнованиями
+    - Contests: Создание и управление соревнованиями, перепроверка посылок контеста
     - Problems: Управление задачами с ограничениями
+    - Testcases: Тесты задач; большие тесты хранятся сжатыми кусками без дублей, загружаются и читаются потоком (Range)
     - Submissions: Прием и оценка решений
-    - Analytics: Аналитика и отчеты (использует VIEW и SQL функции)
-    - Batch Import: Массовая загрузка данных с логированием ошибок
+    - Judge: Очередь проверки посылок (аренда с продлением, вердикты пачкой), встроенные проверяющие (JUDGE_LOCAL)
+    - Analytics: Аналитика и отчеты (использует VIEW и SQL функции), живая турнирная таблица (SSE)
+    - Batch Import: Массовая загрузка данных с логированием ошибок (синхронно, потоком или фоновой задачей)
+    - Export: Потоковая выгрузка турнирных таблиц, посылок, журнала аудита и статистики (NDJSON/CSV), снимки контестов в Parquet/Arrow
     
     Технологический стек:
     - Python 3.11
@@ -27,13 +55,15 @@ app = FastAPI(
     - Docker & docker-compose
     
     Особенности БД:
-    - 10 таблиц со связями 1:1, 1:N, N:M
-    - Триггеры для аудита и автообновления агрегатов
+    - 17 таблиц со связями 1:1, 1:N, N:M
+    - Триггеры для аудита и инкрементального обновления агрегатов
     - Скалярные и табличные SQL функции
-    - 5 представлений для аналитики
+    - 5 представлений для аналитики и их материализованные снимки
     - Индексы для оптимизации запросов
     """,
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # CORS middleware
@@ -48,10 +78,15 @@ app.add_middleware(
 # Include routers
 app.include_router(users.router)
 app.include_router(contests.router)
+if contests.CONTEST_JURY_ROUTES:
+    app.include_router(contests.jury_router)
 app.include_router(problems.router)
+app.include_router(testcases.router)
 app.include_router(submissions.router)
+app.include_router(judge.router)
 app.include_router(analytics.router)
 app.include_router(batch.router)
+app.include_router(exports.router)
 
 
 @app.get("/", tags=["root"])
@@ -69,3 +104,27 @@ def read_root():
 def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "cp-contest-api"}
+
+
+@app.get("/health/db-pool", tags=["root"])
+def db_pool_status():
+    """Connection pool state: checked-out connections, checkout wait time, overflow events"""
+    return get_pool_status()
+
+
+@app.get("/health/analytics-cache", tags=["root"])
+def analytics_cache_status():
+    """Analytics response cache: entries, hits, misses, evictions, invalidations and listener state"""
+    return {**analytics_cache.snapshot(), "listener": cache_listener.status()}
+
+
+@app.get("/health/judge", tags=["root"])
+def judge_pool_status():
+    """Local judge pool: workers, languages and build cache hits, misses, evictions, compile time saved and size"""
+    return judge_status()
+
+
+@app.get("/health/scoreboard-streams", tags=["root"])
+def scoreboard_streams_status():
+    """Live scoreboard streams: watched contests, subscribers, standings reads, frames sent and resyncs of lagging subscribers"""
+    return analytics.scoreboard_hub.status()
@@ -1,9 +1,9 @@
 """
 SQLAlchemy models for all database tables
 """
-from sqlalchemy import Column, Integer, String, Boolean, Text, TIMESTAMP, ForeignKey, CheckConstraint, UniqueConstraint, DECIMAL
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Text, LargeBinary, TIMESTAMP, ForeignKey, CheckConstraint, UniqueConstraint, DECIMAL, Computed
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -39,11 +39,16 @@ class Contest(Base):
     duration_minutes = Column(Integer, nullable=False)
     created_by = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'))
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    freeze_minutes = Column(Integer)
+    freeze_time = Column(TIMESTAMP, Computed("start_time + (duration_minutes - freeze_minutes) * INTERVAL '1 minute'"))
+    frozen_at = Column(TIMESTAMP)
+    unfrozen_at = Column(TIMESTAMP)
 
     __table_args__ = (
         CheckConstraint("contest_type IN ('ACM_ICPC', 'Codeforces', 'IOI')", name='check_contest_type'),
         CheckConstraint("status IN ('upcoming', 'running', 'finished')", name='check_contest_status'),
         CheckConstraint('duration_minutes > 0', name='check_duration'),
+        CheckConstraint('freeze_minutes > 0 AND freeze_minutes <= duration_minutes', name='check_freeze_minutes'),
     )
 
 
@@ -86,8 +91,15 @@ class Testcase(Base):
 
     testcase_id = Column(Integer, primary_key=True, index=True)
     problem_id = Column(Integer, ForeignKey('problems.problem_id', ondelete='CASCADE'))
-    input_data = Column(Text, nullable=False)
-    expected_output = Column(Text, nullable=False)
+    # Small tests are stored in the row; large ones as chunk hashes (see app/testcase_store.py).
+    # Loaded only when asked for, never when listing testcases
+    input_data = deferred(Column(Text))
+    expected_output = deferred(Column(Text))
+    input_chunks = deferred(Column(ARRAY(LargeBinary)))
+    output_chunks = deferred(Column(ARRAY(LargeBinary)))
+    input_size = Column(BigInteger)
+    output_size = Column(BigInteger)
+    chunk_size = Column(Integer, nullable=False, default=1048576)
     is_sample = Column(Boolean, nullable=False, default=False)
     test_order = Column(Integer, nullable=False)
     created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
@@ -95,6 +107,9 @@ class Testcase(Base):
     __table_args__ = (
         UniqueConstraint('problem_id', 'test_order', name='unique_problem_test_order'),
         CheckConstraint('test_order > 0', name='check_test_order'),
+        CheckConstraint('chunk_size > 0', name='check_chunk_size'),
+        CheckConstraint('(input_data IS NULL) <> (input_chunks IS NULL)', name='check_input_storage'),
+        CheckConstraint('(expected_output IS NULL) <> (output_chunks IS NULL)', name='check_output_storage'),
     )
 
 
@@ -112,6 +127,7 @@ class Submission(Base):
     memory_used_mb = Column(DECIMAL(10, 2))
     score = Column(Integer, default=0)
     submitted_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    rejudge_job_id = Column(Integer, ForeignKey('rejudge_jobs.job_id', ondelete='SET NULL'))
 
     __table_args__ = (
         CheckConstraint("language IN ('C++', 'Python', 'Java', 'C')", name='check_language'),
@@ -131,7 +147,6 @@ class Standing(Base):
     total_score = Column(Integer, nullable=False, default=0)
     problems_solved = Column(Integer, nullable=False, default=0)
     penalty_time = Column(Integer, nullable=False, default=0)
-    rank = Column(Integer)
     last_updated = Column(TIMESTAMP, server_default=func.current_timestamp())
 
     __table_args__ = (
@@ -139,7 +154,65 @@ class Standing(Base):
         CheckConstraint('total_score >= 0', name='check_total_score'),
         CheckConstraint('problems_solved >= 0', name='check_problems_solved'),
         CheckConstraint('penalty_time >= 0', name='check_penalty_time'),
-        CheckConstraint('rank > 0', name='check_rank'),
+    )
+
+
+class FrozenStanding(Base):
+    __tablename__ = "frozen_standings"
+
+    contest_id = Column(Integer, ForeignKey('contests.contest_id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    total_score = Column(Integer, nullable=False, default=0)
+    problems_solved = Column(Integer, nullable=False, default=0)
+    penalty_time = Column(Integer, nullable=False, default=0)
+    last_updated = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint('total_score >= 0', name='check_frozen_total_score'),
+        CheckConstraint('problems_solved >= 0', name='check_frozen_problems_solved'),
+        CheckConstraint('penalty_time >= 0', name='check_frozen_penalty_time'),
+    )
+
+
+class JudgeLease(Base):
+    __tablename__ = "judge_leases"
+
+    submission_id = Column(Integer, ForeignKey('submissions.submission_id', ondelete='CASCADE'), primary_key=True)
+    judge_id = Column(String(64), nullable=False)
+    claimed_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+    heartbeat_at = Column(TIMESTAMP, nullable=False, server_default=func.current_timestamp())
+    expires_at = Column(TIMESTAMP, nullable=False)
+    attempts = Column(Integer, nullable=False, default=1)
+
+    __table_args__ = (
+        CheckConstraint('attempts > 0', name='check_lease_attempts'),
+    )
+
+
+class StandingProblem(Base):
+    __tablename__ = "standing_problems"
+
+    contest_id = Column(Integer, ForeignKey('contests.contest_id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'), primary_key=True)
+    problem_id = Column(Integer, ForeignKey('problems.problem_id', ondelete='CASCADE'), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    solved = Column(Boolean, nullable=False, default=False)
+    first_ac_at = Column(TIMESTAMP)
+    solve_minute = Column(Integer)
+    rejected_attempts = Column(Integer, nullable=False, default=0)
+    best_score = Column(Integer, nullable=False, default=0)
+    best_time_ms = Column(Integer)
+    score = Column(Integer, nullable=False, default=0)
+    penalty = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        CheckConstraint('attempts >= 0', name='check_attempts'),
+        CheckConstraint('solve_minute >= 0', name='check_solve_minute'),
+        CheckConstraint('rejected_attempts >= 0', name='check_rejected_attempts'),
+        CheckConstraint('best_score >= 0', name='check_best_score'),
+        CheckConstraint('best_time_ms >= 0', name='check_best_time'),
+        CheckConstraint('score >= 0', name='check_problem_score'),
+        CheckConstraint('penalty >= 0', name='check_problem_penalty'),
     )
 
 
@@ -174,3 +247,81 @@ class AuditLog(Base):
     __table_args__ = (
         CheckConstraint("operation IN ('INSERT', 'UPDATE', 'DELETE')", name='check_operation'),
     )
+
+
+class BatchJob(Base):
+    __tablename__ = "batch_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    entity_type = Column(String(20), nullable=False)
+    mode = Column(String(10), nullable=False, default='orm')
+    chunk_size = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default='queued')
+    total_rows = Column(Integer, nullable=False)
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_success = Column(Integer, nullable=False, default=0)
+    rows_failed = Column(Integer, nullable=False, default=0)
+    errors = Column(JSONB, nullable=False, default=list)
+    # Loaded only by the worker, never when polling job status
+    payload = deferred(Column(JSONB))
+    error_message = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    started_at = Column(TIMESTAMP)
+    updated_at = Column(TIMESTAMP)
+    finished_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        CheckConstraint("entity_type IN ('users', 'contests', 'problems', 'submissions')", name='check_job_entity_type'),
+        CheckConstraint("mode IN ('orm', 'copy')", name='check_job_mode'),
+        CheckConstraint("status IN ('queued', 'running', 'completed', 'failed')", name='check_job_status'),
+        CheckConstraint('chunk_size > 0', name='check_job_chunk_size'),
+    )
+
+
+class AnalyticsSnapshot(Base):
+    __tablename__ = "analytics_snapshots"
+
+    view_name = Column(String(100), primary_key=True)
+    source_tables = Column(ARRAY(Text), nullable=False)
+    refresh_interval_seconds = Column(Integer, nullable=False, default=300)
+    refresh_min_changes = Column(Integer, nullable=False, default=1000)
+    refreshed_at = Column(TIMESTAMP)
+    source_changes = Column(BigInteger, nullable=False, default=0)
+    last_refresh_ms = Column(Integer)
+
+    __table_args__ = (
+        CheckConstraint('refresh_interval_seconds > 0', name='check_snapshot_refresh_interval'),
+        CheckConstraint('refresh_min_changes > 0', name='check_snapshot_refresh_min_changes'),
+    )
+
+
+class RejudgeJob(Base):
+    __tablename__ = "rejudge_jobs"
+
+    job_id = Column(Integer, primary_key=True, index=True)
+    contest_id = Column(Integer, ForeignKey('contests.contest_id', ondelete='CASCADE'), nullable=False)
+    problem_id = Column(Integer, ForeignKey('problems.problem_id', ondelete='CASCADE'))
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='CASCADE'))
+    verdict = Column(String(30))
+    status = Column(String(20), nullable=False, default='judging')
+    total_submissions = Column(Integer, nullable=False, default=0)
+    created_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+    finished_at = Column(TIMESTAMP)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('judging', 'completed')", name='check_rejudge_status'),
+        CheckConstraint('total_submissions >= 0', name='check_rejudge_total'),
+    )
+
+
+class TestcaseChunk(Base):
+    __tablename__ = "testcase_chunks"
+
+    chunk_hash = Column(LargeBinary, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, nullable=False)
+    last_used_at = Column(TIMESTAMP, server_default=func.current_timestamp())
+
+    __table_args__ = (
+        CheckConstraint('raw_size > 0', name='check_chunk_raw_size'),
+    )
@@ -0,0 +1,55 @@
+"""
+Keyset (cursor) pagination for list endpoints
+"""
+from fastapi import HTTPException, Response
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+from datetime import datetime
+from typing import List, Optional
+import base64
+import json
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor for the sort key of the last row of a page"""
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys: list) -> list:
+    """Sort key values from a cursor; 400 if it was not produced by encode_cursor for these keys"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("wrong number of values")
+        return [
+            datetime.fromisoformat(value) if key.type.python_type is datetime else key.type.python_type(value)
+            for key, value in zip(keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query: Query, keys: list, cursor: Optional[str], skip: int, limit: int,
+             response: Response, descending: bool = False) -> List:
+    """
+    One page of query ordered by keys (unique together).
+    With a cursor the page starts right after the row the cursor points at
+    (WHERE (keys) > cursor), so the cost does not grow with the page number;
+    skip keeps OFFSET paging for old clients. When more rows follow, the
+    cursor of the next page is returned in the X-Next-Cursor header.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    if cursor is not None:
+        if skip:
+            raise HTTPException(status_code=400, detail="Use either cursor or skip, not both")
+        values = decode_cursor(cursor, keys)
+        position = tuple_(*keys) < tuple_(*values) if descending else tuple_(*keys) > tuple_(*values)
+        query = query.filter(position)
+    order = [key.desc() if descending else key.asc() for key in keys]
+    rows = query.order_by(*order).offset(skip).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+    return rows
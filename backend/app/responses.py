@@ -0,0 +1,37 @@
+"""
+Fast JSON responses rendered with orjson
+"""
+from fastapi.responses import JSONResponse
+from datetime import timedelta
+from decimal import Decimal
+import orjson
+
+
+def json_default(value):
+    """Types orjson does not serialize natively, encoded the way jsonable_encoder does"""
+    if isinstance(value, Decimal):
+        # NUMERIC(x, 0) and integral aggregates (SUM of integers) stay ints
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered by orjson (datetime natively, Decimal via json_default).
+    Returned directly from a handler it also skips FastAPI's jsonable_encoder.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+
+def row_dicts(result) -> list:
+    """
+    Rows of a result as dicts, zipping the column names once instead of a RowMapping per row.
+    A dict per row is the cheapest input orjson encodes as an object; the dict-free
+    path is the JSON PostgreSQL assembles (ANALYTICS_SQL_JSON in routes/analytics.py)
+    """
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
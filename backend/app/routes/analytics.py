@@ -1,14 +1,39 @@
 """
 Analytics and complex queries using raw SQL
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Any
-from app.database import get_db
+from typing import List, Dict, Any, Optional
+from app.database import AnySession, get_db, get_session, run_db, SessionLocal
+from app.cache import analytics_cache
+from app.responses import FastJSONResponse, row_dicts
+from app.scoreboard import ScoreboardHub, ScoreboardResponse
+from app.freeze import (
+    CONTEST_FREEZE_QUERY, FREEZE_STANDINGS_QUERY, VIEWER_ROLE_QUERY,
+    frozen_tags, sees_live_standings, with_freeze_header,
+)
+from app.conditional import (
+    CONTEST_STANDINGS_CHANGED, CONTEST_SUBMISSIONS_CHANGED, USERS_CHANGED,
+    conditional_headers, read_version, record_changed, version_query,
+)
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
+# Background refresh of materialized statistics views (see analytics_snapshots)
+ANALYTICS_REFRESH_ENABLED = os.getenv("ANALYTICS_REFRESH_ENABLED", "true").lower() == "true"
+ANALYTICS_REFRESH_POLL_SECONDS = float(os.getenv("ANALYTICS_REFRESH_POLL_SECONDS", "5"))
+# Let PostgreSQL build the standings and leaderboard JSON and pass it through as is
+ANALYTICS_SQL_JSON = os.getenv("ANALYTICS_SQL_JSON", "false").lower() == "true"
+refresh_stop = threading.Event()
+refresh_thread = None
+
 
 @router.get("/top-participants")
 def get_top_participants(limit: int = 10, db: Session = Depends(get_db)):
@@ -22,12 +47,16 @@ def get_top_participants(limit: int = 10, db: Session = Depends(get_db)):
         LIMIT :limit
     """)
     result = db.execute(query, {"limit": limit})
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
 
 
 @router.get("/verdict-stats")
 def get_verdict_statistics(db: Session = Depends(get_db)):
     """Get statistics by verdict type"""
+    hit, rows = analytics_cache.get(("verdict-stats",))
+    if hit:
+        return FastJSONResponse(rows)
+    token = analytics_cache.token()
     query = text("""
         SELECT verdict, COUNT(*) as count 
         FROM submissions 
@@ -35,7 +64,9 @@ def get_verdict_statistics(db: Session = Depends(get_db)):
         ORDER BY count DESC
     """)
     result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+    rows = row_dicts(result)
+    analytics_cache.set(("verdict-stats",), rows, ("submissions",), token)
+    return FastJSONResponse(rows)
 
 
 @router.get("/user-activity")
@@ -54,7 +85,7 @@ def get_user_activity(limit: int = 20, db: Session = Depends(get_db)):
         LIMIT :limit
     """)
     result = db.execute(query, {"limit": limit})
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
 
 
 @router.get("/problem-difficulty")
@@ -72,12 +103,17 @@ def get_problem_difficulty_stats(db: Session = Depends(get_db)):
             END
     """)
     result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
+
+
+CONTEST_SUMMARY_VERSION_QUERY = version_query(record_changed("contests"), CONTEST_SUBMISSIONS_CHANGED)
 
 
 @router.get("/contest-summary")
-def get_contest_summary(contest_id: int, db: Session = Depends(get_db)):
+def get_contest_summary(contest_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get summary statistics for a contest"""
+    version = read_version(db.execute(CONTEST_SUMMARY_VERSION_QUERY, {"id": contest_id}).first())
+    response.headers.update(conditional_headers(request, version, f"contest-summary-{contest_id}"))
     query = text("""
         SELECT 
             c.contest_id,
@@ -99,56 +135,286 @@ def get_contest_summary(contest_id: int, db: Session = Depends(get_db)):
     return dict(row._mapping)
 
 
+CONTEST_EXISTS_QUERY = text("SELECT 1 FROM contests WHERE contest_id = :contest_id")
+
+
+def contest_tags(contest_id: int) -> tuple:
+    """Cache tags of per-contest results: the contest's submissions and participants' names"""
+    return (f"contest:{contest_id}", "users")
+
+STANDINGS_QUERY = text("""
+    SELECT * FROM v_contest_standings 
+    WHERE contest_id = :contest_id 
+    ORDER BY rank
+""")
+
+
+def sql_timestamp_json(column: str) -> str:
+    """
+    Timestamp as FastJSONResponse writes it: PostgreSQL's own JSON drops trailing
+    zeros of the fraction, orjson always writes all six digits (none if zero)
+    """
+    return (f"to_char({column}, 'YYYY-MM-DD\"T\"HH24:MI:SS') || "
+            f"CASE to_char({column}, 'US') WHEN '000000' THEN '' ELSE to_char({column}, '.US') END")
+
+
+def sql_json_array(query: str, order_by: str) -> text:
+    """
+    Rows of query as one JSON array text, byte-identical to FastJSONResponse(row_dicts(...)):
+    row_to_json keeps the column order and writes no spaces, unlike json_agg (", \\n " between rows)
+    """
+    return text(f"""
+        SELECT COALESCE('[' || string_agg(row_to_json(r)::text, ',' ORDER BY {order_by}) || ']', '[]')
+        FROM ({query}) r
+    """)
+
+
+def json_body_response(value, headers: dict) -> Response:
+    """Response of a cached value: JSON text assembled by PostgreSQL or rows"""
+    if isinstance(value, bytes):
+        return Response(value, media_type="application/json", headers=headers)
+    return FastJSONResponse(value, headers=headers)
+
+
+# Read before the payload and cached with it, so a cached payload is never newer than its ETag
+STANDINGS_VERSION_QUERY = version_query(CONTEST_STANDINGS_CHANGED, record_changed("contests"), USERS_CHANGED)
+
+
+def standings_json_query(view: str) -> text:
+    return sql_json_array(f"""
+        SELECT standing_id, contest_id, contest_title, user_id, username, full_name, country,
+               total_score, problems_solved, penalty_time, rank, {sql_timestamp_json("last_updated")} AS last_updated
+        FROM {view}
+        WHERE contest_id = :contest_id
+    """, "r.rank")
+
+
+STANDINGS_JSON_QUERY = standings_json_query("v_contest_standings")
+FROZEN_STANDINGS_QUERY = text("""
+    SELECT * FROM v_frozen_contest_standings
+    WHERE contest_id = :contest_id
+    ORDER BY rank
+""")
+# The snapshot never changes; only freeze/resolve (contest record) and names do
+FROZEN_STANDINGS_VERSION_QUERY = version_query(record_changed("contests"), USERS_CHANGED)
+FROZEN_STANDINGS_JSON_QUERY = standings_json_query("v_frozen_contest_standings")
+# frozen -> (version, JSON, rows) queries
+STANDINGS_SOURCES = {
+    False: (STANDINGS_VERSION_QUERY, STANDINGS_JSON_QUERY, STANDINGS_QUERY),
+    True: (FROZEN_STANDINGS_VERSION_QUERY, FROZEN_STANDINGS_JSON_QUERY, FROZEN_STANDINGS_QUERY),
+}
+
+
+def standings_response(db: Session, contest_id: int, request: Request, viewer_id: Optional[int]) -> Response:
+    live = viewer_id is not None and sees_live_standings(
+        db.execute(VIEWER_ROLE_QUERY, {"user_id": viewer_id}).scalar())
+    key, name = (("standings", contest_id, "live"), f"standings-live-{contest_id}") if live \
+        else (("standings", contest_id), f"standings-{contest_id}")
+    hit, cached = analytics_cache.get(key)
+    if hit:
+        value, version, frozen = cached
+        return json_body_response(value, with_freeze_header(conditional_headers(request, version, name), frozen))
+    token = analytics_cache.token()
+    state = db.execute(CONTEST_FREEZE_QUERY, {"contest_id": contest_id}).first()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Contest not found")
+    frozen = state.frozen and not live
+    if frozen and not state.snapshot_taken:
+        db.execute(FREEZE_STANDINGS_QUERY, {"contest_id": contest_id})
+        db.commit()
+    version_source, json_source, rows_source = STANDINGS_SOURCES[frozen]
+    version = read_version(db.execute(version_source, {"id": contest_id}).first())
+    headers = conditional_headers(request, version, name)
+    if ANALYTICS_SQL_JSON:
+        value = db.execute(json_source, {"contest_id": contest_id}).scalar().encode()
+    else:
+        value = row_dicts(db.execute(rows_source, {"contest_id": contest_id}))
+    analytics_cache.set(key, (value, version, frozen),
+                        frozen_tags(contest_id) if frozen else contest_tags(contest_id), token)
+    return json_body_response(value, with_freeze_header(headers, frozen))
+
+
 @router.get("/standings/{contest_id}")
-def get_contest_standings(contest_id: int, db: Session = Depends(get_db)):
-    """Get contest standings using VIEW"""
-    check_query = text("SELECT 1 FROM contests WHERE contest_id = :contest_id")
-    if not db.execute(check_query, {"contest_id": contest_id}).fetchone():
+async def get_contest_standings(contest_id: int, request: Request, viewer_id: Optional[int] = None,
+                                db: AnySession = Depends(get_session)):
+    """
+    Get contest standings using VIEW. During a scoreboard freeze the public gets the
+    frozen snapshot; jury and admin viewers (viewer_id) get live standings.
+    viewer_id is a client-supplied placeholder until the API has authentication
+    """
+    return await run_db(db, standings_response, contest_id, request, viewer_id)
+
+
+def read_standings(contest_id: int) -> Optional[List[Dict[str, Any]]]:
+    """Public standings rows for the live stream (frozen during a freeze), None when there is no such contest"""
+    db = SessionLocal()
+    try:
+        state = db.execute(CONTEST_FREEZE_QUERY, {"contest_id": contest_id}).first()
+        if state is None:
+            return None
+        if state.frozen and not state.snapshot_taken:
+            db.execute(FREEZE_STANDINGS_QUERY, {"contest_id": contest_id})
+            db.commit()
+        return row_dicts(db.execute(STANDINGS_SOURCES[state.frozen][2], {"contest_id": contest_id}))
+    finally:
+        db.close()
+
+
+scoreboard_hub = ScoreboardHub(read_standings)
+
+
+@router.get("/standings/{contest_id}/stream")
+async def stream_contest_standings(contest_id: int):
+    """
+    Public standings as Server-Sent Events (frozen during a scoreboard freeze): a snapshot event with the
+    rows of GET /standings/{contest_id}, then delta events with the changed rows (user_id, total_score,
+    problems_solved, penalty_time, rank; all columns for new participants) and the user_ids that left the board
+    """
+    subscriber = await scoreboard_hub.subscribe(contest_id)
+    if subscriber is None:
         raise HTTPException(status_code=404, detail="Contest not found")
-    
-    query = text("""
-        SELECT * FROM v_contest_standings 
-        WHERE contest_id = :contest_id 
-        ORDER BY rank
-    """)
-    result = db.execute(query, {"contest_id": contest_id})
-    return [dict(row._mapping) for row in result]
+    return ScoreboardResponse(scoreboard_hub, subscriber)
+
+
+def analytics_snapshot(view: str, order_by: str, live_tags: tuple, max_age: Optional[int],
+                       db: Session, limit: Optional[int] = None) -> FastJSONResponse:
+    """
+    Rows of a statistics view served from its materialized snapshot (mv_*),
+    the first limit of them in order_by order when limit is set.
+    max_age=None serves the snapshot as is, max_age=0 reads the live view,
+    max_age=N refreshes the snapshot first if it is older than N seconds.
+    Results are cached; live rows are invalidated by writes to live_tags,
+    snapshot rows by a refresh of the snapshot.
+    """
+    if max_age is not None and max_age < 0:
+        raise HTTPException(status_code=400, detail="max_age must be non-negative")
+    if max_age == 0:
+        key = ("live", view, limit)
+        hit, rows = analytics_cache.get(key)
+        if not hit:
+            token = analytics_cache.token()
+            # LIMIT NULL returns all rows
+            result = db.execute(text(f"SELECT * FROM v_{view} ORDER BY {order_by} LIMIT :limit"), {"limit": limit})
+            rows = row_dicts(result)
+            analytics_cache.set(key, rows, live_tags, token)
+        return FastJSONResponse(rows, headers={"X-Snapshot-Age": "0"})
+
+    snapshot_tag = f"snapshot:mv_{view}"
+    if max_age is not None:
+        refreshed = db.execute(text("SELECT refresh_analytics_view(:view_name, p_max_age_seconds => :max_age)"),
+                               {"view_name": f"mv_{view}", "max_age": max_age}).scalar()
+        db.commit()
+        if refreshed:
+            analytics_cache.invalidate(snapshot_tag)
+    key = ("snapshot", view, limit)
+    hit, cached = analytics_cache.get(key)
+    # A cached copy may predate a refresh made by another API process
+    if not hit or (max_age is not None and cached[2] + time.monotonic() - cached[3] > max_age):
+        token = analytics_cache.token()
+        result = db.execute(text(f"SELECT * FROM mv_{view} ORDER BY {order_by} LIMIT :limit"), {"limit": limit})
+        rows = row_dicts(result)
+        snapshot = db.execute(text("""
+            SELECT refreshed_at, age_seconds FROM get_analytics_snapshots() 
+            WHERE view_name = :view_name
+        """), {"view_name": f"mv_{view}"}).fetchone()
+        cached = (rows, snapshot.refreshed_at, float(snapshot.age_seconds or 0), time.monotonic())
+        analytics_cache.set(key, cached, (snapshot_tag,), token)
+    rows, refreshed_at, age, cached_at = cached
+    headers = {}
+    if refreshed_at is not None:
+        headers["X-Snapshot-Age"] = str(round(age + time.monotonic() - cached_at, 1))
+        headers["X-Snapshot-Refreshed-At"] = refreshed_at.isoformat()
+    return FastJSONResponse(rows, headers=headers)
 
 
 @router.get("/users/statistics/all")
-def get_user_statistics(db: Session = Depends(get_db)):
-    """Get user statistics using VIEW"""
-    query = text("""
-        SELECT * FROM v_user_statistics 
-        ORDER BY rating DESC 
-        LIMIT 50
-    """)
-    result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+def get_user_statistics(max_age: Optional[int] = None, db: Session = Depends(get_db)):
+    """Get user statistics from the materialized VIEW snapshot"""
+    return analytics_snapshot("user_statistics", "rating DESC, user_id",
+                              ("users", "submissions"), max_age, db, limit=50)
 
 
 @router.get("/problems/statistics/all")
-def get_problem_statistics(db: Session = Depends(get_db)):
-    """Get problem statistics using VIEW"""
-    query = text("SELECT * FROM v_problem_statistics ORDER BY problem_id")
-    result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+def get_problem_statistics(max_age: Optional[int] = None, db: Session = Depends(get_db)):
+    """Get problem statistics from the materialized VIEW snapshot"""
+    return analytics_snapshot("problem_statistics", "problem_id",
+                              ("problems", "users", "submissions"), max_age, db)
 
 
 @router.get("/languages/statistics")
-def get_language_statistics(db: Session = Depends(get_db)):
-    """Get language statistics using VIEW"""
-    query = text("SELECT * FROM v_language_statistics")
-    result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+def get_language_statistics(max_age: Optional[int] = None, db: Session = Depends(get_db)):
+    """Get language statistics from the materialized VIEW snapshot"""
+    return analytics_snapshot("language_statistics", "total_submissions DESC, language",
+                              ("submissions",), max_age, db)
 
 
 @router.get("/verdicts/distribution")
-def get_verdict_distribution(db: Session = Depends(get_db)):
-    """Get verdict distribution using VIEW"""
-    query = text("SELECT * FROM v_verdict_distribution")
-    result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+def get_verdict_distribution(max_age: Optional[int] = None, db: Session = Depends(get_db)):
+    """Get verdict distribution from the materialized VIEW snapshot"""
+    return analytics_snapshot("verdict_distribution", "count DESC, verdict",
+                              ("submissions",), max_age, db)
+
+
+@router.get("/snapshots")
+def get_snapshots(db: Session = Depends(get_db)):
+    """Age, pending source changes and last refresh time of each materialized VIEW"""
+    result = db.execute(text("SELECT * FROM get_analytics_snapshots()"))
+    return FastJSONResponse(row_dicts(result))
+
+
+@router.post("/snapshots/{view_name}/refresh")
+def refresh_snapshot(view_name: str, db: Session = Depends(get_db)):
+    """Refresh one materialized VIEW now (CONCURRENTLY, readers are not blocked)"""
+    if not db.execute(text("SELECT 1 FROM analytics_snapshots WHERE view_name = :view_name"),
+                      {"view_name": view_name}).fetchone():
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    db.execute(text("SELECT refresh_analytics_view(:view_name)"), {"view_name": view_name})
+    db.commit()
+    analytics_cache.invalidate(f"snapshot:{view_name}")
+    result = db.execute(text("SELECT * FROM get_analytics_snapshots() WHERE view_name = :view_name"),
+                        {"view_name": view_name})
+    return dict(result.fetchone()._mapping)
+
+
+def refresh_due_snapshots() -> None:
+    """Refresh every materialized VIEW whose snapshot is due"""
+    db = SessionLocal()
+    try:
+        due = db.execute(text("SELECT view_name FROM get_analytics_snapshots() WHERE due")).scalars().all()
+        for view_name in due:
+            refreshed = db.execute(text("SELECT refresh_analytics_view(:view_name, p_only_if_due => TRUE)"),
+                                   {"view_name": view_name}).scalar()
+            db.commit()
+            if refreshed:
+                analytics_cache.invalidate(f"snapshot:{view_name}")
+                logger.debug(f"Refreshed analytics snapshot {view_name}")
+    finally:
+        db.close()
+
+
+def refresh_loop() -> None:
+    while not refresh_stop.wait(ANALYTICS_REFRESH_POLL_SECONDS):
+        try:
+            refresh_due_snapshots()
+        except Exception as e:
+            logger.error(f"Analytics snapshot refresh failed: {str(e)}")
+
+
+def start_refresh_scheduler() -> None:
+    """Start the background thread that refreshes due snapshots"""
+    global refresh_thread
+    if not ANALYTICS_REFRESH_ENABLED:
+        return
+    refresh_stop.clear()
+    refresh_thread = threading.Thread(target=refresh_loop, name="analytics-refresh", daemon=True)
+    refresh_thread.start()
+
+
+def stop_refresh_scheduler() -> None:
+    """Stop the refresh thread after its current refresh"""
+    refresh_stop.set()
+    if refresh_thread is not None:
+        refresh_thread.join()
 
 
 @router.get("/users/{user_id}/success-rate")
@@ -211,7 +477,7 @@ def get_top_users(limit: int = 10, db: Session = Depends(get_db)):
     """Get top users using table-valued function"""
     query = text("SELECT * FROM get_top_users(:limit)")
     result = db.execute(query, {"limit": limit})
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
 
 
 @router.get("/contests/{contest_id}/statistics")
@@ -240,7 +506,7 @@ def get_user_contest_report(user_id: int, contest_id: int, db: Session = Depends
     
     query = text("SELECT * FROM get_user_contest_report(:user_id, :contest_id)")
     result = db.execute(query, {"user_id": user_id, "contest_id": contest_id})
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
 
 
 @router.get("/problems/statistics/detailed")
@@ -248,7 +514,7 @@ def get_detailed_problem_statistics(db: Session = Depends(get_db)):
     """Get detailed problem statistics using table-valued function"""
     query = text("SELECT * FROM get_problem_statistics()")
     result = db.execute(query)
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
 
 
 @router.get("/audit-log")
@@ -274,43 +540,98 @@ def get_audit_log(table_name: str = None, limit: int = 100, db: Session = Depend
         """)
         result = db.execute(query, {"limit": limit})
     
-    return [dict(row._mapping) for row in result]
+    return FastJSONResponse(row_dicts(result))
+
+
+LEADERBOARD_QUERY = text("""
+    WITH user_scores AS (
+        SELECT 
+            s.user_id,
+            COUNT(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.problem_id END) as solved,
+            COALESCE(SUM(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.score END), 0) as total_score,
+            MIN(s.submitted_at) as first_solve
+        FROM submissions s
+        WHERE s.contest_id = :contest_id
+        GROUP BY s.user_id
+    )
+    SELECT 
+        ROW_NUMBER() OVER (ORDER BY us.total_score DESC, us.solved DESC, us.first_solve ASC) as rank,
+        u.user_id,
+        u.username,
+        u.full_name,
+        u.country,
+        u.rating,
+        COALESCE(us.solved, 0) as problems_solved,
+        COALESCE(us.total_score, 0) as total_score
+    FROM users u
+    LEFT JOIN user_scores us ON u.user_id = us.user_id
+    WHERE u.role = 'participant' AND us.user_id IS NOT NULL
+    ORDER BY rank
+""")
+LEADERBOARD_JSON_QUERY = sql_json_array(LEADERBOARD_QUERY.text, "r.rank")
+LEADERBOARD_VERSION_QUERY = version_query(CONTEST_SUBMISSIONS_CHANGED, USERS_CHANGED)
+# Public leaderboard during a freeze: the frozen_standings snapshot, so hidden submissions and
+# rejudges of earlier ones change neither the rows nor the ETag (first_solve is not in the
+# snapshot; ties go by penalty like the frozen standings)
+FROZEN_LEADERBOARD_QUERY = text("""
+    SELECT 
+        ROW_NUMBER() OVER (ORDER BY f.total_score DESC, f.problems_solved DESC, f.penalty_time ASC, f.user_id ASC) as rank,
+        u.user_id,
+        u.username,
+        u.full_name,
+        u.country,
+        u.rating,
+        f.problems_solved,
+        f.total_score
+    FROM frozen_standings f
+    JOIN users u ON u.user_id = f.user_id
+    WHERE f.contest_id = :contest_id AND u.role = 'participant'
+    ORDER BY rank
+""")
+FROZEN_LEADERBOARD_JSON_QUERY = sql_json_array(FROZEN_LEADERBOARD_QUERY.text, "r.rank")
+# frozen -> (version, JSON, rows) queries
+LEADERBOARD_SOURCES = {
+    False: (LEADERBOARD_VERSION_QUERY, LEADERBOARD_JSON_QUERY, LEADERBOARD_QUERY),
+    True: (FROZEN_STANDINGS_VERSION_QUERY, FROZEN_LEADERBOARD_JSON_QUERY, FROZEN_LEADERBOARD_QUERY),
+}
+
+
+def leaderboard_response(db: Session, contest_id: int, request: Request, viewer_id: Optional[int]) -> Response:
+    live = viewer_id is not None and sees_live_standings(
+        db.execute(VIEWER_ROLE_QUERY, {"user_id": viewer_id}).scalar())
+    key, name = (("leaderboard", contest_id, "live"), f"leaderboard-live-{contest_id}") if live \
+        else (("leaderboard", contest_id), f"leaderboard-{contest_id}")
+    hit, cached = analytics_cache.get(key)
+    if hit:
+        value, version, frozen = cached
+        return json_body_response(value, with_freeze_header(conditional_headers(request, version, name), frozen))
+    token = analytics_cache.token()
+    state = db.execute(CONTEST_FREEZE_QUERY, {"contest_id": contest_id}).first()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Contest not found")
+    frozen = state.frozen and not live
+    if frozen and not state.snapshot_taken:
+        db.execute(FREEZE_STANDINGS_QUERY, {"contest_id": contest_id})
+        db.commit()
+    version_source, json_source, rows_source = LEADERBOARD_SOURCES[frozen]
+    version = read_version(db.execute(version_source, {"id": contest_id}).first())
+    headers = conditional_headers(request, version, name)
+    if ANALYTICS_SQL_JSON:
+        value = db.execute(json_source, {"contest_id": contest_id}).scalar().encode()
+    else:
+        value = row_dicts(db.execute(rows_source, {"contest_id": contest_id}))
+    analytics_cache.set(key, (value, version, frozen),
+                        frozen_tags(contest_id) if frozen else contest_tags(contest_id), token)
+    return json_body_response(value, with_freeze_header(headers, frozen))
 
 
 @router.get("/contests/{contest_id}/leaderboard")
-def get_contest_leaderboard(contest_id: int, db: Session = Depends(get_db)):
+async def get_contest_leaderboard(contest_id: int, request: Request, viewer_id: Optional[int] = None,
+                                  db: AnySession = Depends(get_session)):
     """
     Complex query: Get contest leaderboard with user details
-    Uses JOIN, aggregation, and subqueries
+    Uses JOIN, aggregation, and subqueries; hides submissions made during a scoreboard freeze
+    from everyone but jury and admin viewers (viewer_id).
+    viewer_id is a client-supplied placeholder until the API has authentication
     """
-    check_query = text("SELECT 1 FROM contests WHERE contest_id = :contest_id")
-    if not db.execute(check_query, {"contest_id": contest_id}).fetchone():
-        raise HTTPException(status_code=404, detail="Contest not found")
-    
-    query = text("""
-        WITH user_scores AS (
-            SELECT 
-                s.user_id,
-                COUNT(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.problem_id END) as solved,
-                COALESCE(SUM(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.score END), 0) as total_score,
-                MIN(s.submitted_at) as first_solve
-            FROM submissions s
-            WHERE s.contest_id = :contest_id
-            GROUP BY s.user_id
-        )
-        SELECT 
-            ROW_NUMBER() OVER (ORDER BY us.total_score DESC, us.solved DESC, us.first_solve ASC) as rank,
-            u.user_id,
-            u.username,
-            u.full_name,
-            u.country,
-            u.rating,
-            COALESCE(us.solved, 0) as problems_solved,
-            COALESCE(us.total_score, 0) as total_score
-        FROM users u
-        LEFT JOIN user_scores us ON u.user_id = us.user_id
-        WHERE u.role = 'participant' AND us.user_id IS NOT NULL
-        ORDER BY rank
-    """)
-    result = db.execute(query, {"contest_id": contest_id})
-    return [dict(row._mapping) for row in result]
+    return await run_db(db, leaderboard_response, contest_id, request, viewer_id)
@@ -1,14 +1,30 @@
 """
 Batch import operations with error logging
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, DataError
-from typing import List, Dict, Any
-from app.database import get_db
-from app.models import User, Contest, Problem, Submission
-from app.schemas import BatchImportRequest, BatchImportResponse
+from sqlalchemy import text, func
+from pydantic import ValidationError
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from app.database import get_db, SessionLocal, direct_engine
+from app.cache import analytics_cache
+from app.models import User, Contest, Problem, Submission, BatchJob
+from app.schemas import (
+    BatchImportRequest, BatchImportResponse, BatchJobResponse,
+    UserImport, ContestImport, ProblemImport, SubmissionImport,
+)
+import codecs
+import csv
+import io
+import json
 import logging
+import multiprocessing
+import os
 
 router = APIRouter(prefix="/batch", tags=["batch-operations"])
 
@@ -16,156 +32,291 @@ router = APIRouter(prefix="/batch", tags=["batch-operations"])
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Rows per savepoint/commit in orm mode (see BatchImportRequest.chunk_size)
+DEFAULT_CHUNK_SIZE = 100
 
-def import_users(data: List[Dict[Any, Any]], db: Session) -> tuple:
-    """Import multiple users"""
+
+def row_error(row: int, item: Dict[Any, Any], error: Exception) -> dict:
+    """Build an error entry for a failed row"""
+    if isinstance(error, IntegrityError):
+        error_msg = f"Row {row}: Integrity error - {str(error.orig)}"
+    elif isinstance(error, DataError):
+        error_msg = f"Row {row}: Data error - {str(error.orig)}"
+    else:
+        error_msg = f"Row {row}: Unexpected error - {str(error)}"
+    logger.error(error_msg)
+    return {"row": row, "error": error_msg, "data": item}
+
+
+def import_rows(model, data: List[Dict[Any, Any]], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
+    """
+    Import rows through the ORM in chunks
+
+    Each chunk is flushed inside a savepoint and committed, so a failure never
+    discards rows from earlier chunks. If a chunk fails, it is replayed row by
+    row with a savepoint per row and only the failing rows are dropped.
+    """
     success_count = 0
     errors = []
-    
-    for idx, item in enumerate(data):
+
+    for chunk_start in range(0, len(data), chunk_size):
+        chunk = data[chunk_start:chunk_start + chunk_size]
         try:
-            user = User(**item)
-            db.add(user)
-            db.flush()
-            success_count += 1
-            logger.info(f"Successfully imported user: {item.get('username')}")
-        except IntegrityError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Integrity error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except DataError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Data error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
+            with db.begin_nested():
+                db.add_all([model(**item) for item in chunk])
+            success_count += len(chunk)
+        except Exception:
+            for offset, item in enumerate(chunk):
+                try:
+                    with db.begin_nested():
+                        db.add(model(**item))
+                    success_count += 1
+                except Exception as e:
+                    errors.append(row_error(chunk_start + offset + 1, item, e))
+
+        try:
+            db.commit()
         except Exception as e:
             db.rollback()
-            error_msg = f"Row {idx + 1}: Unexpected error - {str(e)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-    
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Commit failed: {str(e)}")
-        raise
-    
+            logger.error(f"Commit failed: {str(e)}")
+            raise
+        logger.debug(f"Imported {model.__tablename__} rows {chunk_start + 1}-{chunk_start + len(chunk)}")
+
     return success_count, errors
 
 
-def import_contests(data: List[Dict[Any, Any]], db: Session) -> tuple:
+def import_users(data: List[Dict[Any, Any]], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
+    """Import multiple users"""
+    return import_rows(User, data, db, chunk_size)
+
+
+def import_contests(data: List[Dict[Any, Any]], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
     """Import multiple contests"""
-    success_count = 0
-    errors = []
-    
-    for idx, item in enumerate(data):
-        try:
-            contest = Contest(**item)
-            db.add(contest)
-            db.flush()
-            success_count += 1
-            logger.info(f"Successfully imported contest: {item.get('title')}")
-        except IntegrityError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Integrity error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except DataError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Data error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except Exception as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Unexpected error - {str(e)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-    
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Commit failed: {str(e)}")
-        raise
-    
-    return success_count, errors
+    return import_rows(Contest, data, db, chunk_size)
 
 
-def import_problems(data: List[Dict[Any, Any]], db: Session) -> tuple:
+def import_problems(data: List[Dict[Any, Any]], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
     """Import multiple problems"""
-    success_count = 0
-    errors = []
-    
-    for idx, item in enumerate(data):
-        try:
-            problem = Problem(**item)
-            db.add(problem)
-            db.flush()
-            success_count += 1
-            logger.info(f"Successfully imported problem: {item.get('title')}")
-        except IntegrityError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Integrity error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except DataError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Data error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except Exception as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Unexpected error - {str(e)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-    
-    try:
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Commit failed: {str(e)}")
-        raise
-    
-    return success_count, errors
+    return import_rows(Problem, data, db, chunk_size)
 
 
-def import_submissions(data: List[Dict[Any, Any]], db: Session) -> tuple:
+def import_submissions(data: List[Dict[Any, Any]], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple:
     """Import multiple submissions"""
-    success_count = 0
+    return import_rows(Submission, data, db, chunk_size)
+
+
+IMPORTERS = {
+    "users": import_users,
+    "contests": import_contests,
+    "problems": import_problems,
+    "submissions": import_submissions,
+}
+
+
+# Copy mode: rows are validated in Python, streamed with COPY into a staging
+# table, rows with missing references or duplicates are rejected with set-based
+# checks, and the rest is merged with one INSERT ... SELECT. The merge writes
+# audit_log rows itself; row-level triggers are skipped via app.bulk_import.
+BULK_IMPORT_SPECS = {
+    "users": {
+        "table": "users",
+        "schema": UserImport,
+        "columns": ["username", "email", "full_name", "role", "rating", "country", "is_active", "registration_date"],
+        "checks": [
+            ("Integrity error - username already exists",
+             "EXISTS (SELECT 1 FROM users u WHERE u.username = st.username)"),
+            ("Integrity error - email already exists",
+             "EXISTS (SELECT 1 FROM users u WHERE u.email = st.email)"),
+            ("Integrity error - duplicate username or email within batch",
+             """st.row_num IN (
+                 SELECT row_num FROM (
+                     SELECT row_num,
+                            ROW_NUMBER() OVER (PARTITION BY username ORDER BY row_num) AS by_username,
+                            ROW_NUMBER() OVER (PARTITION BY email ORDER BY row_num) AS by_email
+                     FROM batch_stage
+                 ) d
+                 WHERE d.by_username > 1 OR d.by_email > 1
+             )"""),
+        ],
+        "merge": """
+            WITH ins AS (
+                INSERT INTO users (username, email, full_name, role, rating, country, is_active, registration_date)
+                SELECT username, email, full_name, role, rating, country, is_active,
+                       COALESCE(registration_date, CURRENT_TIMESTAMP)
+                FROM batch_stage
+                ORDER BY row_num
+                ON CONFLICT DO NOTHING
+                RETURNING *
+            ), audit AS (
+                INSERT INTO audit_log (table_name, operation, record_id, new_values)
+                SELECT 'users', 'INSERT', ins.user_id, row_to_json(ins)::jsonb FROM ins
+            )
+            SELECT COUNT(*) FROM ins
+        """,
+    },
+    "contests": {
+        "table": "contests",
+        "schema": ContestImport,
+        "columns": ["title", "description", "contest_type", "status", "start_time", "duration_minutes", "created_by",
+                    "freeze_minutes"],
+        "checks": [
+            ("Integrity error - created_by user not found",
+             "NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = st.created_by)"),
+        ],
+        "merge": """
+            WITH ins AS (
+                INSERT INTO contests (title, description, contest_type, status, start_time, duration_minutes, created_by,
+                                      freeze_minutes)
+                SELECT title, description, contest_type, status, start_time, duration_minutes, created_by, freeze_minutes
+                FROM batch_stage
+                ORDER BY row_num
+                RETURNING *
+            ), audit AS (
+                INSERT INTO audit_log (table_name, operation, record_id, new_values)
+                SELECT 'contests', 'INSERT', ins.contest_id, row_to_json(ins)::jsonb FROM ins
+            )
+            SELECT COUNT(*) FROM ins
+        """,
+    },
+    "problems": {
+        "table": "problems",
+        "schema": ProblemImport,
+        "columns": ["title", "description", "difficulty", "time_limit_ms", "memory_limit_mb", "author_id"],
+        "checks": [
+            ("Integrity error - author_id user not found",
+             "NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = st.author_id)"),
+        ],
+        "merge": """
+            WITH ins AS (
+                INSERT INTO problems (title, description, difficulty, time_limit_ms, memory_limit_mb, author_id)
+                SELECT title, description, difficulty, time_limit_ms, memory_limit_mb, author_id
+                FROM batch_stage
+                ORDER BY row_num
+                RETURNING *
+            ), audit AS (
+                INSERT INTO audit_log (table_name, operation, record_id, new_values)
+                SELECT 'problems', 'INSERT', ins.problem_id, row_to_json(ins)::jsonb FROM ins
+            )
+            SELECT COUNT(*) FROM ins
+        """,
+    },
+    "submissions": {
+        "table": "submissions",
+        "schema": SubmissionImport,
+        "columns": ["contest_id", "problem_id", "user_id", "source_code", "language", "verdict",
+                    "execution_time_ms", "memory_used_mb", "score", "submitted_at"],
+        "checks": [
+            ("Integrity error - contest_id not found",
+             "NOT EXISTS (SELECT 1 FROM contests c WHERE c.contest_id = st.contest_id)"),
+            ("Integrity error - problem_id not found",
+             "NOT EXISTS (SELECT 1 FROM problems p WHERE p.problem_id = st.problem_id)"),
+            ("Integrity error - user_id not found",
+             "NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = st.user_id)"),
+        ],
+        "merge": """
+            WITH ins AS (
+                INSERT INTO submissions (contest_id, problem_id, user_id, source_code, language, verdict,
+                                         execution_time_ms, memory_used_mb, score, submitted_at)
+                SELECT contest_id, problem_id, user_id, source_code, language, verdict,
+                       execution_time_ms, memory_used_mb, score, COALESCE(submitted_at, CURRENT_TIMESTAMP)
+                FROM batch_stage
+                ORDER BY row_num
+                RETURNING *
+            ), audit AS (
+                INSERT INTO audit_log (table_name, operation, record_id, new_values)
+                SELECT 'submissions', 'INSERT', ins.submission_id, row_to_json(ins)::jsonb FROM ins
+            )
+            SELECT COUNT(*) FROM ins
+        """,
+        # Standings are recomputed and analytics caches notified once per
+        # affected contest instead of once per row
+        "after_merge": """
+            SELECT refresh_contest_standings(contest_id),
+                   pg_notify('analytics_changes', 'submissions:' || contest_id)
+            FROM (SELECT DISTINCT contest_id FROM batch_stage) c
+        """,
+    },
+}
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Join pydantic errors into one line: 'field: message; ...'"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+
+
+def copy_text_value(value: Any) -> str:
+    """Encode a value for COPY text format: NULL as \\N, escaped separators"""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_import(entity_type: str, data: List[Dict[Any, Any]], db: Session) -> tuple:
+    """Import rows through COPY into a staging table and one set-based merge"""
+    spec = BULK_IMPORT_SPECS[entity_type]
+    columns = spec["columns"]
+    column_list = ", ".join(columns)
     errors = []
-    
+
+    buffer = io.StringIO()
+    staged_count = 0
     for idx, item in enumerate(data):
         try:
-            submission = Submission(**item)
-            db.add(submission)
-            db.flush()
-            success_count += 1
-            logger.info(f"Successfully imported submission from user {item.get('user_id')}")
-        except IntegrityError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Integrity error - {str(e.orig)}"
+            row = spec["schema"].model_validate(item).model_dump()
+        except ValidationError as e:
+            error_msg = f"Row {idx + 1}: Validation error - {format_validation_error(e)}"
             errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except DataError as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Data error - {str(e.orig)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-        except Exception as e:
-            db.rollback()
-            error_msg = f"Row {idx + 1}: Unexpected error - {str(e)}"
-            errors.append({"row": idx + 1, "error": error_msg, "data": item})
-            logger.error(error_msg)
-    
+            continue
+        values = [str(idx + 1)] + [copy_text_value(row[column]) for column in columns]
+        buffer.write("\t".join(values) + "\n")
+        staged_count += 1
+    buffer.seek(0)
+
     try:
+        db.execute(text(
+            f"CREATE TEMP TABLE batch_stage ON COMMIT DROP AS "
+            f"SELECT NULL::INTEGER AS row_num, {column_list} FROM {spec['table']} WITH NO DATA"
+        ))
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(f"COPY batch_stage (row_num, {column_list}) FROM STDIN", buffer)
+
+        for message, condition in spec["checks"]:
+            rejected = db.execute(text(
+                f"DELETE FROM batch_stage st WHERE {condition} RETURNING st.row_num"
+            )).scalars().all()
+            for row_num in rejected:
+                errors.append({"row": row_num, "error": f"Row {row_num}: {message}", "data": data[row_num - 1]})
+            staged_count -= len(rejected)
+
+        db.execute(text("SELECT set_config('app.bulk_import', 'on', true)"))
+        success_count = db.execute(text(spec["merge"])).scalar()
+        db.execute(text("SELECT set_config('app.bulk_import', 'off', true)"))
+        if "after_merge" in spec:
+            db.execute(text(spec["after_merge"]))
         db.commit()
     except Exception as e:
         db.rollback()
-        logger.error(f"Commit failed: {str(e)}")
+        logger.error(f"Copy import failed: {str(e)}")
         raise
-    
+
+    # Rows skipped by ON CONFLICT were inserted concurrently after the checks ran
+    if success_count < staged_count:
+        skipped = staged_count - success_count
+        error_msg = f"{skipped} rows skipped: conflicting rows were inserted concurrently"
+        errors.append({"row": None, "error": error_msg, "data": None})
+        logger.error(error_msg)
+
+    errors.sort(key=lambda error: error["row"] or 0)
+    for error in errors:
+        logger.error(error["error"])
     return success_count, errors
 
 
@@ -176,28 +327,32 @@ def batch_import(request: BatchImportRequest, db: Session = Depends(get_db)):
     
     Supports: users, contests, problems, submissions
     
+    Modes:
+    - orm (default): rows are added through the ORM in chunks of chunk_size;
+      each chunk is committed separately and a failing row discards only itself
+    - copy: rows are validated, loaded with COPY into a staging table and merged
+      with one INSERT ... SELECT; much faster for large archives
+    
     Example request:
     {
         "entity_type": "users",
+        "mode": "copy",
         "data": [
             {"username": "test1", "email": "test1@example.com", "full_name": "Test User", "role": "participant"},
             {"username": "test2", "email": "test2@example.com", "full_name": "Test User 2", "role": "participant"}
         ]
     }
     """
-    logger.info(f"Starting batch import for {request.entity_type}, {len(request.data)} records")
-    
-    importers = {
-        "users": import_users,
-        "contests": import_contests,
-        "problems": import_problems,
-        "submissions": import_submissions,
-    }
+    logger.info(f"Starting batch import for {request.entity_type} ({request.mode} mode), {len(request.data)} records")
     
-    if request.entity_type not in importers:
+    if request.entity_type not in IMPORTERS:
         raise HTTPException(status_code=400, detail=f"Unsupported entity type: {request.entity_type}")
     
-    success_count, errors = importers[request.entity_type](request.data, db)
+    if request.mode == "copy":
+        success_count, errors = copy_import(request.entity_type, request.data, db)
+    else:
+        success_count, errors = IMPORTERS[request.entity_type](request.data, db, request.chunk_size)
+    analytics_cache.invalidate(*import_cache_tags(request.entity_type, request.data))
     
     logger.info(f"Batch import completed: {success_count} success, {len(errors)} failed")
     
@@ -207,3 +362,432 @@ def batch_import(request: BatchImportRequest, db: Session = Depends(get_db)):
         failed=len(errors),
         errors=errors
     )
+
+
+def import_cache_tags(entity_type: str, rows: List[Dict[Any, Any]]) -> tuple:
+    """Analytics cache tags made stale by importing rows of an entity type"""
+    if entity_type == "submissions":
+        return ("submissions", *{f"contest:{row.get('contest_id')}" for row in rows})
+    if entity_type in ("users", "problems"):
+        return (entity_type,)
+    return ()
+
+
+def import_chunk(entity_type: str, mode: str, chunk: List[Dict[Any, Any]], db: Session, chunk_size: int) -> tuple:
+    """Import one chunk of rows with the importer for the given mode"""
+    if mode == "copy":
+        return copy_import(entity_type, chunk, db)
+    return IMPORTERS[entity_type](chunk, db, chunk_size)
+
+
+def renumber_errors(errors: List[dict], rows: List[int]) -> List[dict]:
+    """Map chunk-local row numbers of importer errors to the given source rows"""
+    for error in errors:
+        if error["row"] is not None:
+            local_row = error["row"]
+            error["row"] = rows[local_row - 1]
+            error["error"] = error["error"].replace(f"Row {local_row}:", f"Row {error['row']}:", 1)
+    return errors
+
+
+# Streaming import: the upload is parsed line by line and written in chunks,
+# so memory stays bounded by chunk_size whatever the size of the body.
+
+STREAM_FORMATS = ("ndjson", "csv")
+# Longest line, and longest CSV record kept while waiting for a closing quote (characters):
+# a body without newlines or with an unbalanced quote would otherwise be buffered whole
+STREAM_MAX_RECORD = int(os.getenv("BATCH_STREAM_MAX_RECORD", str(1024 * 1024)))
+# Characters of an unparsed record echoed back in its error
+STREAM_ERROR_DATA = 200
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator reads the request body itself"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        # StreamingResponse listens for disconnects by calling receive(), which
+        # would swallow the upload; request.stream() reports disconnects instead
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class OversizedLine(str):
+    """Start of a line longer than the limit; the rest of it was skipped"""
+
+
+async def iter_lines(byte_stream: AsyncIterator[bytes], max_length: int = STREAM_MAX_RECORD) -> AsyncIterator[str]:
+    """
+    Split a byte stream into decoded lines without buffering the whole body; a line longer
+    than max_length is not buffered further: its start is yielded as an OversizedLine
+    and the stream is skipped up to the next newline
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    # Pieces of the current line, joined once when it ends
+    pending = []
+    length = 0
+    skipping = False
+
+    def split(text: str) -> Iterator[str]:
+        nonlocal pending, length, skipping
+        *ends, tail = text.split("\n")
+        for piece in ends:
+            if skipping:
+                skipping = False
+            elif length + len(piece) > max_length:
+                yield OversizedLine(("".join(pending) + piece[:STREAM_ERROR_DATA])[:STREAM_ERROR_DATA])
+            else:
+                yield ("".join(pending) + piece).rstrip("\r")
+            pending, length = [], 0
+        if tail and not skipping:
+            pending.append(tail)
+            length += len(tail)
+            if length > max_length:
+                yield OversizedLine("".join(pending)[:STREAM_ERROR_DATA])
+                pending, length, skipping = [], 0, True
+
+    async for chunk in byte_stream:
+        for line in split(decoder.decode(chunk)):
+            yield line
+    for line in split(decoder.decode(b"", final=True)):
+        yield line
+    if pending:
+        yield "".join(pending).rstrip("\r")
+
+
+def unterminated_record(row: int, record: List[str], reason: str) -> dict:
+    """Parse error for a CSV record whose quoted field is never closed"""
+    data = "\n".join(record)[:STREAM_ERROR_DATA]
+    return {"row": row, "error": f"Row {row}: Parse error - unterminated quoted field, {reason}", "data": data}
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[tuple]:
+    """Yield (row, item, error) for each record; error is set when a record cannot be parsed"""
+    row = 0
+    header = None
+    record = []
+    record_length = 0
+    quotes = 0
+    async for line in lines:
+        if isinstance(line, OversizedLine):
+            row += 1
+            if record:
+                # The line belongs to the open quoted field
+                yield row, None, unterminated_record(row, [*record, line],
+                                                     f"record longer than {STREAM_MAX_RECORD} characters")
+                record, record_length, quotes = [], 0, 0
+            else:
+                yield row, None, {"row": row,
+                                  "error": f"Row {row}: Parse error - line longer than {STREAM_MAX_RECORD} characters",
+                                  "data": str(line)}
+            continue
+        if fmt == "csv":
+            # A quoted field may contain newlines: wait until the quotes are balanced
+            record.append(line)
+            record_length += len(line) + 1
+            quotes += line.count('"')
+            if quotes % 2:
+                if record_length <= STREAM_MAX_RECORD:
+                    continue
+                row += 1
+                yield row, None, unterminated_record(row, record, f"record longer than {STREAM_MAX_RECORD} characters")
+                record, record_length, quotes = [], 0, 0
+                continue
+            line = "\n".join(record)
+            record, record_length, quotes = [], 0, 0
+        if not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = next(csv.reader([line]))
+            continue
+
+        row += 1
+        try:
+            if fmt == "csv":
+                values = next(csv.reader([line]))
+                if len(values) != len(header):
+                    raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+                # Empty CSV fields are treated as missing so defaults apply
+                item = {key: value for key, value in zip(header, values) if value != ""}
+            else:
+                item = json.loads(line)
+                if not isinstance(item, dict):
+                    raise ValueError("expected a JSON object")
+        except ValueError as e:
+            yield row, None, {"row": row, "error": f"Row {row}: Parse error - {str(e)}", "data": line}
+            continue
+        yield row, item, None
+    if record:
+        row += 1
+        yield row, None, unterminated_record(row, record, "unexpected end of data")
+
+
+@router.post("/import/stream")
+async def batch_import_stream(
+    request: Request,
+    entity_type: str,
+    format: str = "ndjson",
+    mode: str = "orm",
+    chunk_size: int = 1000,
+):
+    """
+    Streaming batch import for large uploads
+
+    The request body is NDJSON (one JSON object per line) or CSV with a header
+    line. Rows are written in chunks of chunk_size with the same importers as
+    /batch/import (orm or copy mode). The response is NDJSON: one "error" line
+    per failed row, a "progress" line after each chunk and a final "summary".
+    Clients should read the response while uploading: results are sent as soon
+    as each chunk is written, so a client that reads only after the upload can
+    stall on a body with many failing rows.
+
+    Example:
+    curl -X POST "localhost:8000/batch/import/stream?entity_type=users&format=csv&mode=copy" \\
+         --data-binary @users.csv
+    """
+    if entity_type not in IMPORTERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported entity type: {entity_type}")
+    if format not in STREAM_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if mode not in ("orm", "copy"):
+        raise HTTPException(status_code=400, detail=f"Unsupported mode: {mode}")
+    if not 1 <= chunk_size <= 10000:
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 10000")
+
+    async def run_import() -> AsyncIterator[str]:
+        logger.info(f"Starting streaming import for {entity_type} ({format}, {mode} mode)")
+        db = SessionLocal()
+        total = success = failed = 0
+        chunk, chunk_rows = [], []
+
+        async def flush() -> AsyncIterator[str]:
+            nonlocal success, failed
+            chunk_success, chunk_errors = await run_in_threadpool(
+                import_chunk, entity_type, mode, chunk, db, chunk_size
+            )
+            analytics_cache.invalidate(*import_cache_tags(entity_type, chunk))
+            success += chunk_success
+            for error in renumber_errors(chunk_errors, chunk_rows):
+                failed += 1
+                yield json.dumps({"type": "error", **error}, default=str) + "\n"
+            chunk.clear()
+            chunk_rows.clear()
+            yield json.dumps({"type": "progress", "processed": total, "success": success, "failed": failed}) + "\n"
+
+        try:
+            async for row, item, error in iter_records(iter_lines(request.stream()), format):
+                total = row
+                if error is not None:
+                    failed += 1
+                    logger.error(error["error"])
+                    yield json.dumps({"type": "error", **error}) + "\n"
+                    continue
+                chunk.append(item)
+                chunk_rows.append(row)
+                if len(chunk) >= chunk_size:
+                    async for line in flush():
+                        yield line
+            if chunk:
+                async for line in flush():
+                    yield line
+        finally:
+            db.close()
+
+        logger.info(f"Streaming import completed: {total} records, {success} success, {failed} failed")
+        yield json.dumps({"type": "summary", "total": total, "success": success, "failed": failed}) + "\n"
+
+    return UploadStreamingResponse(run_import(), media_type="application/x-ndjson")
+
+
+# Background jobs: the batch is stored in batch_jobs and imported by a bounded
+# pool of worker processes, so the request returns at once and progress can be
+# polled. Workers run with a lower CPU priority so imports yield to API requests.
+# Workers reach the API's analytics cache through database notifications
+# (analytics_changes, see app/cache.py).
+
+MAX_JOB_ERRORS = 1000
+
+job_context = multiprocessing.get_context("spawn")
+# Set on shutdown: workers stop after the current chunk and resume on next start
+job_stop = None
+# Created by start_jobs, not at import: spawned workers import this module too
+job_executor: Optional[ProcessPoolExecutor] = None
+
+
+def init_job_worker(stop_event) -> None:
+    """Set up a job worker process"""
+    global job_stop
+    job_stop = stop_event
+    os.nice(int(os.getenv("BATCH_JOB_NICE", "10")))
+
+
+def run_job(job_id: int) -> None:
+    """
+    Import a batch job chunk by chunk, recording progress after each chunk
+
+    A job resumes from rows_done, so a job interrupted by a restart continues
+    where it stopped (the chunk in flight at the time may be imported again).
+    """
+    with direct_engine.connect() as connection:
+        # Session-level advisory lock: one worker per job across API processes,
+        # released automatically if the worker dies
+        locked = connection.execute(
+            text("SELECT pg_try_advisory_lock('batch_jobs'::regclass::oid::integer, :job_id)"),
+            {"job_id": job_id},
+        ).scalar()
+        connection.commit()
+        if not locked:
+            return
+
+        db = Session(bind=connection, expire_on_commit=False)
+        try:
+            job = db.get(BatchJob, job_id)
+            if job is None or job.status not in ("queued", "running"):
+                return
+            job.status = "running"
+            job.started_at = job.started_at or func.current_timestamp()
+            job.updated_at = func.current_timestamp()
+            db.commit()
+            db.refresh(job)
+            data = job.payload
+            logger.info(f"Batch job {job_id}: importing {job.entity_type} rows {job.rows_done + 1}-{job.total_rows}")
+
+            for chunk_start in range(job.rows_done, job.total_rows, job.chunk_size):
+                if job_stop.is_set():
+                    logger.info(f"Batch job {job_id} paused at row {job.rows_done} for shutdown")
+                    return
+                chunk = data[chunk_start:chunk_start + job.chunk_size]
+                success_count, errors = import_chunk(job.entity_type, job.mode, chunk, db, job.chunk_size)
+                renumber_errors(errors, list(range(chunk_start + 1, chunk_start + len(chunk) + 1)))
+                job.rows_done = chunk_start + len(chunk)
+                job.rows_success += success_count
+                job.rows_failed += len(errors)
+                if len(job.errors) < MAX_JOB_ERRORS:
+                    job.errors = job.errors + errors[:MAX_JOB_ERRORS - len(job.errors)]
+                job.updated_at = func.current_timestamp()
+                db.commit()
+
+            job.status = "completed"
+            job.payload = None
+            job.finished_at = job.updated_at = func.current_timestamp()
+            db.commit()
+            logger.info(f"Batch job {job_id} completed: {job.rows_success} success, {job.rows_failed} failed")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batch job {job_id} failed: {str(e)}")
+            job = db.get(BatchJob, job_id)
+            job.status = "failed"
+            job.error_message = str(e)
+            job.finished_at = job.updated_at = func.current_timestamp()
+            db.commit()
+        finally:
+            db.close()
+            connection.execute(
+                text("SELECT pg_advisory_unlock('batch_jobs'::regclass::oid::integer, :job_id)"),
+                {"job_id": job_id},
+            )
+            connection.commit()
+
+
+def start_jobs() -> None:
+    """Start the worker pool and queue jobs left unfinished by a previous run of the API"""
+    global job_executor, job_stop
+    job_stop = job_context.Event()
+    job_executor = ProcessPoolExecutor(
+        max_workers=int(os.getenv("BATCH_JOB_WORKERS", "2")),
+        mp_context=job_context,
+        initializer=init_job_worker,
+        initargs=(job_stop,),
+    )
+    db = SessionLocal()
+    try:
+        job_ids = db.query(BatchJob.job_id).filter(
+            BatchJob.status.in_(["queued", "running"])
+        ).order_by(BatchJob.job_id).all()
+    except Exception as e:
+        logger.error(f"Could not load unfinished batch jobs: {str(e)}")
+        return
+    finally:
+        db.close()
+    for (job_id,) in job_ids:
+        logger.info(f"Resuming batch job {job_id}")
+        job_executor.submit(run_job, job_id)
+
+
+async def stop_jobs() -> None:
+    """Stop workers after their current chunk; unfinished jobs stay queued or running"""
+    global job_executor
+    if job_executor is None:
+        return
+    job_stop.set()
+    executor, job_executor = job_executor, None
+    # Waiting for the chunks in flight must not block the event loop
+    await run_in_threadpool(executor.shutdown, wait=True, cancel_futures=True)
+
+
+def job_response(job: BatchJob, now: datetime) -> BatchJobResponse:
+    """Build job status with throughput and ETA; now is the database clock"""
+    rows_per_second = eta_seconds = None
+    if job.started_at is not None:
+        elapsed = ((job.finished_at or now) - job.started_at).total_seconds()
+        if elapsed > 0 and job.rows_done > 0:
+            rows_per_second = round(job.rows_done / elapsed, 1)
+            if job.status == "running":
+                eta_seconds = round((job.total_rows - job.rows_done) / rows_per_second, 1)
+    return BatchJobResponse(
+        job_id=job.job_id,
+        entity_type=job.entity_type,
+        mode=job.mode,
+        status=job.status,
+        total_rows=job.total_rows,
+        rows_done=job.rows_done,
+        rows_success=job.rows_success,
+        rows_failed=job.rows_failed,
+        rows_per_second=rows_per_second,
+        eta_seconds=eta_seconds,
+        errors=job.errors,
+        error_message=job.error_message,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post("/jobs", response_model=BatchJobResponse, status_code=202)
+def create_batch_job(request: BatchImportRequest, db: Session = Depends(get_db)):
+    """
+    Submit a batch import to run in the background
+
+    Accepts the same body as /batch/import and returns the job at once;
+    poll GET /batch/jobs/{job_id} for progress.
+    """
+    job = BatchJob(
+        entity_type=request.entity_type,
+        mode=request.mode,
+        chunk_size=request.chunk_size,
+        total_rows=len(request.data),
+        payload=request.data,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info(f"Queued batch job {job.job_id} for {request.entity_type}, {len(request.data)} records")
+    executor = job_executor
+    try:
+        if executor is None:
+            raise RuntimeError("no worker pool")
+        executor.submit(run_job, job.job_id)
+    except RuntimeError:
+        # Shutting down: the job stays queued and is picked up by start_jobs on the next start
+        logger.info(f"Batch job {job.job_id} left queued: workers are stopped")
+    return job_response(job, job.created_at)
+
+
+@router.get("/jobs/{job_id}", response_model=BatchJobResponse)
+def get_batch_job(job_id: int, db: Session = Depends(get_db)):
+    """Get progress of a background batch import"""
+    result = db.query(BatchJob, func.localtimestamp()).filter(BatchJob.job_id == job_id).first()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job, now = result
+    return job_response(job, now)
@@ -1,15 +1,52 @@
 """
 Contest CRUD operations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import os
 from app.database import get_db
-from app.models import Contest
-from app.schemas import ContestCreate, ContestUpdate, ContestResponse
+from app.cache import analytics_cache
+from app.pagination import paginate
+from app.models import Contest, RejudgeJob
+from app.conditional import conditional_headers, read_version, record_changed, version_query
+from app.freeze import VIEWER_ROLE_QUERY, replay_standings, sees_live_standings
+from app.schemas import (
+    ContestCreate, ContestUpdate, ContestResponse, ContestResolveResponse, RejudgeRequest, RejudgeJobResponse,
+)
 
 router = APIRouter(prefix="/contests", tags=["contests"])
+# Jury-only actions gated by the client-supplied viewer_id; mounted only with CONTEST_JURY_ROUTES=true
+# until the API has authentication (see app/main.py)
+jury_router = APIRouter(prefix="/contests", tags=["contests"])
+CONTEST_JURY_ROUTES = os.getenv("CONTEST_JURY_ROUTES", "false").lower() == "true"
+CONTEST_VERSION_QUERY = version_query(record_changed("contests"))
+UNFREEZE_QUERY = text("""
+    UPDATE contests SET unfrozen_at = CURRENT_TIMESTAMP
+    WHERE contest_id = :contest_id AND freeze_time <= LOCALTIMESTAMP AND unfrozen_at IS NULL
+    RETURNING freeze_time, frozen_at, unfrozen_at
+""")
+# The board the public saw during the freeze; without a snapshot, the standings at freeze time
+FROZEN_STANDINGS_QUERY = text("""
+    SELECT user_id, total_score, problems_solved, penalty_time
+    FROM frozen_standings
+    WHERE contest_id = :contest_id
+""")
+STANDINGS_BEFORE_QUERY = text("""
+    SELECT user_id, total_score, problems_solved, penalty_time
+    FROM get_contest_standings_before(:contest_id, :before)
+""")
+REPLAY_QUERY = text("SELECT * FROM get_standings_replay(:contest_id)")
+REJUDGE_QUERY = text("SELECT * FROM start_contest_rejudge(:contest_id, :problem_id, :user_id, :verdict)")
+REJUDGE_VERDICTS_QUERY = text("""
+    SELECT verdict, COUNT(*) AS submissions
+    FROM submissions
+    WHERE rejudge_job_id = :job_id
+    GROUP BY verdict
+""")
 
 
 @router.post("/", response_model=ContestResponse, status_code=status.HTTP_201_CREATED)
@@ -36,15 +73,17 @@ def create_contest(contest: ContestCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[ContestResponse])
-def get_contests(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all contests with pagination"""
-    contests = db.query(Contest).offset(skip).limit(limit).all()
-    return contests
+def get_contests(response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100,
+                 db: Session = Depends(get_db)):
+    """Get contests ordered by ID; pass X-Next-Cursor as cursor for the next page (skip is kept for old clients)"""
+    return paginate(db.query(Contest), [Contest.contest_id], cursor, skip, limit, response)
 
 
 @router.get("/{contest_id}", response_model=ContestResponse)
-def get_contest(contest_id: int, db: Session = Depends(get_db)):
+def get_contest(contest_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get contest by ID"""
+    version = read_version(db.execute(CONTEST_VERSION_QUERY, {"id": contest_id}).first())
+    response.headers.update(conditional_headers(request, version, f"contest-{contest_id}"))
     contest = db.query(Contest).filter(Contest.contest_id == contest_id).first()
     if not contest:
         raise HTTPException(status_code=404, detail="Contest not found")
@@ -64,6 +103,7 @@ def update_contest(contest_id: int, contest_update: ContestUpdate, db: Session =
             setattr(contest, field, value)
         
         db.commit()
+        analytics_cache.invalidate(f"contest:{contest_id}", f"frozen:{contest_id}")
         db.refresh(contest)
         return contest
     except IntegrityError as e:
@@ -84,4 +124,103 @@ def delete_contest(contest_id: int, db: Session = Depends(get_db)):
     
     db.delete(contest)
     db.commit()
+    analytics_cache.invalidate(f"contest:{contest_id}", f"frozen:{contest_id}", "submissions")
     return None
+
+
+@jury_router.post("/{contest_id}/resolve", response_model=ContestResolveResponse)
+def resolve_contest(contest_id: int, viewer_id: int, db: Session = Depends(get_db)):
+    """
+    Unfreeze the scoreboard: public standings turn live again. Returns the submissions
+    hidden by the freeze in submission order with the totals and rank after each one,
+    starting from the frozen board the public saw (jury and admin viewers only).
+    Submissions sent before the freeze but judged or rejudged after the snapshot are hidden too.
+    viewer_id is a client-supplied placeholder until the API has authentication, so the
+    route is only mounted with CONTEST_JURY_ROUTES=true
+    """
+    if not sees_live_standings(db.execute(VIEWER_ROLE_QUERY, {"user_id": viewer_id}).scalar()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only jury and admin can resolve a contest")
+    contest = db.query(Contest).filter(Contest.contest_id == contest_id).first()
+    if not contest:
+        raise HTTPException(status_code=404, detail="Contest not found")
+    if contest.freeze_time is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Contest has no scoreboard freeze")
+    resolved = db.execute(UNFREEZE_QUERY, {"contest_id": contest_id}).first()
+    if resolved is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="Contest is already resolved or its freeze has not started")
+    if resolved.frozen_at is not None:
+        base = db.execute(FROZEN_STANDINGS_QUERY, {"contest_id": contest_id}).all()
+    else:
+        base = db.execute(STANDINGS_BEFORE_QUERY, {"contest_id": contest_id, "before": resolved.freeze_time}).all()
+    steps = replay_standings(base, db.execute(REPLAY_QUERY, {"contest_id": contest_id}))
+    db.commit()
+    analytics_cache.invalidate(f"contest:{contest_id}", f"frozen:{contest_id}")
+    return {"contest_id": contest_id, "freeze_time": resolved.freeze_time,
+            "unfrozen_at": resolved.unfrozen_at, "steps": steps}
+
+
+def rejudge_response(job, verdicts: dict, now: datetime) -> RejudgeJobResponse:
+    """Build rejudge progress with throughput and ETA; now is the database clock"""
+    pending = verdicts.get("pending", 0)
+    judged = sum(verdicts.values()) - pending
+    submissions_per_second = eta_seconds = None
+    elapsed = ((job.finished_at or now) - job.created_at).total_seconds()
+    if elapsed > 0 and judged > 0:
+        submissions_per_second = round(judged / elapsed, 1)
+        if job.status == "judging":
+            eta_seconds = round(pending / submissions_per_second, 1)
+    return RejudgeJobResponse(
+        job_id=job.job_id,
+        contest_id=job.contest_id,
+        problem_id=job.problem_id,
+        user_id=job.user_id,
+        verdict=job.verdict,
+        status=job.status,
+        total_submissions=job.total_submissions,
+        judged=judged,
+        pending=pending,
+        verdicts=verdicts,
+        submissions_per_second=submissions_per_second,
+        eta_seconds=eta_seconds,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+    )
+
+
+@router.post("/{contest_id}/rejudge", response_model=RejudgeJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def rejudge_contest(contest_id: int, request: RejudgeRequest, db: Session = Depends(get_db)):
+    """
+    Rejudge the contest's submissions matching the filters: verdicts are reset in one
+    statement and the submissions go back to the judging queue behind new submissions.
+    Standings are recomputed once, when the last of them is judged;
+    poll GET /contests/{contest_id}/rejudge/{job_id} for progress
+    """
+    if db.query(Contest.contest_id).filter(Contest.contest_id == contest_id).first() is None:
+        raise HTTPException(status_code=404, detail="Contest not found")
+    try:
+        job = db.execute(REJUDGE_QUERY, {"contest_id": contest_id, **request.model_dump()}).one()
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid reference (problem_id or user_id not found): {str(e.orig)}"
+        )
+    if job.total_submissions:
+        analytics_cache.invalidate("submissions", f"contest:{contest_id}")
+    verdicts = {"pending": job.total_submissions} if job.total_submissions else {}
+    return rejudge_response(job, verdicts, job.created_at)
+
+
+@router.get("/{contest_id}/rejudge/{job_id}", response_model=RejudgeJobResponse)
+def get_rejudge(contest_id: int, job_id: int, db: Session = Depends(get_db)):
+    """Get progress of a contest rejudge: submissions judged and pending, verdicts so far, throughput and ETA"""
+    result = db.query(RejudgeJob, func.localtimestamp()).filter(
+        RejudgeJob.job_id == job_id, RejudgeJob.contest_id == contest_id,
+    ).first()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Rejudge not found")
+    job, now = result
+    verdicts = {row.verdict: row.submissions for row in db.execute(REJUDGE_VERDICTS_QUERY, {"job_id": job_id})}
+    return rejudge_response(job, verdicts, now)
@@ -0,0 +1,160 @@
+"""
+Streaming exports of large results as NDJSON or CSV
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, Optional
+from app.database import get_db, engine
+from app.models import Submission
+from app.freeze import CONTEST_FREEZE_QUERY, FREEZE_STANDINGS_QUERY, VIEWER_ROLE_QUERY, sees_live_standings, with_freeze_header
+from app.routes.analytics import STANDINGS_SOURCES
+from app.routes.submissions import submission_filters
+from app.schemas import SnapshotExportRequest
+import csv
+import io
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# Rows fetched from the server-side cursor at a time; bounds worker memory
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+
+
+def json_default(value):
+    """JSON encoding of the column types json.dumps does not know"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=json_default)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def stream_rows(query, params: dict, fmt: str) -> Iterator[str]:
+    """
+    Encode the rows of query batch by batch. The query runs on a server-side
+    cursor (stream_results) of its own connection, so only EXPORT_FETCH_SIZE
+    rows are held in memory whatever the size of the result.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(query, params)
+        keys = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(keys)
+        total = 0
+        for rows in result.partitions():
+            if fmt == "csv":
+                writer.writerows([csv_value(value) for value in row] for row in rows)
+            else:
+                for row in rows:
+                    buffer.write(json.dumps(dict(zip(keys, row)), default=json_default))
+                    buffer.write("\n")
+            total += len(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if fmt == "csv" and not total:
+            yield buffer.getvalue()
+    logger.info(f"Export completed: {total} rows")
+
+
+def export_response(query, params: dict, fmt: str, name: str, headers: Optional[dict] = None) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    return StreamingResponse(
+        stream_rows(query, params, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={**(headers or {}), "Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@router.get("/standings/{contest_id}")
+def export_contest_standings(contest_id: int, format: str = "ndjson", viewer_id: Optional[int] = None,
+                             db: Session = Depends(get_db)):
+    """
+    Export contest standings: during a scoreboard freeze the public gets the frozen
+    snapshot and jury and admin viewers the live rows, as in /analytics/standings/{contest_id}.
+    viewer_id is a client-supplied placeholder until the API has authentication
+    """
+    live = viewer_id is not None and sees_live_standings(
+        db.execute(VIEWER_ROLE_QUERY, {"user_id": viewer_id}).scalar())
+    state = db.execute(CONTEST_FREEZE_QUERY, {"contest_id": contest_id}).first()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Contest not found")
+    frozen = state.frozen and not live
+    if frozen and not state.snapshot_taken:
+        db.execute(FREEZE_STANDINGS_QUERY, {"contest_id": contest_id})
+        db.commit()
+    return export_response(STANDINGS_SOURCES[frozen][2], {"contest_id": contest_id}, format,
+                           f"standings_{contest_id}", with_freeze_header({}, frozen))
+
+
+@router.get("/submissions")
+def export_submissions(format: str = "ndjson", filters: list = Depends(submission_filters)):
+    """Export submissions, newest first, with the filters of GET /submissions/"""
+    query = (
+        select(Submission.__table__)
+        .where(*filters)
+        .order_by(Submission.submitted_at.desc(), Submission.submission_id.desc())
+    )
+    return export_response(query, {}, format, "submissions")
+
+
+@router.get("/audit-log")
+def export_audit_log(table_name: Optional[str] = None, format: str = "ndjson"):
+    """Export the audit log, newest first, optionally for one table"""
+    where = "WHERE table_name = :table_name" if table_name else ""
+    query = text(f"""
+        SELECT log_id, table_name, operation, record_id,
+               old_values, new_values, changed_by, changed_at
+        FROM audit_log
+        {where}
+        ORDER BY changed_at DESC
+    """)
+    return export_response(query, {"table_name": table_name}, format, "audit_log")
+
+
+@router.get("/problems/statistics")
+def export_problem_statistics(format: str = "ndjson"):
+    """Export live problem statistics (v_problem_statistics)"""
+    query = text("SELECT * FROM v_problem_statistics ORDER BY problem_id")
+    return export_response(query, {}, format, "problem_statistics")
+
+
+@router.post("/snapshot")
+def export_contest_snapshot(request: SnapshotExportRequest):
+    """
+    Admin: write a Parquet / Arrow IPC snapshot of contests contest_from..contest_to
+    under SNAPSHOT_EXPORT_DIR on the server (see app/snapshot_export.py);
+    incremental appends only submissions with ids above the last exported one,
+    so rejudges and late-committed submissions need incremental=false
+    """
+    # pyarrow is loaded only by the processes that export snapshots
+    from app.snapshot_export import SnapshotExportBusy, SnapshotExportError, export_snapshot
+    try:
+        return export_snapshot(request.contest_from, request.contest_to, request.format,
+                               incremental=request.incremental, include_source=request.include_source)
+    except SnapshotExportBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except SnapshotExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,104 @@
+"""
+Judging queue: judges claim pending submissions for a lease, renew it with
+heartbeats while they judge and report verdicts in batches
+"""
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import List
+from app.database import AnySession, get_db, get_session, run_db
+from app.cache import analytics_cache
+from app.schemas import (
+    JudgeClaimRequest, JudgeTask, JudgeHeartbeatRequest, JudgeLeaseResponse,
+    JudgeResultsRequest, JudgeResultsResponse, JudgeQueueStatus,
+)
+import orjson
+import os
+
+router = APIRouter(prefix="/judge", tags=["judge"])
+
+# A claimed submission not renewed or reported within this time goes back to the queue
+JUDGE_LEASE_SECONDS = int(os.getenv("JUDGE_LEASE_SECONDS", "60"))
+# Claims of a submission that was never reported; past this it is no longer handed out
+# (a judge crashing on it would otherwise get it back forever)
+JUDGE_MAX_ATTEMPTS = int(os.getenv("JUDGE_MAX_ATTEMPTS", "5"))
+
+CLAIM_QUERY = text("""
+    SELECT * FROM claim_pending_submissions(:judge_id, :limit, :lease_seconds, :languages,
+                                            p_max_attempts => :max_attempts)
+""")
+HEARTBEAT_QUERY = text("SELECT * FROM extend_judge_leases(:judge_id, :submission_ids, :lease_seconds)")
+REPORT_QUERY = text("SELECT * FROM report_judge_results(:judge_id, CAST(:results AS JSONB))")
+QUEUE_STATUS_QUERY = text("""
+    SELECT COUNT(*) AS pending,
+           COUNT(*) FILTER (WHERE s.rejudge_job_id IS NOT NULL) AS rejudge,
+           COUNT(l.submission_id) FILTER (WHERE l.expires_at > LOCALTIMESTAMP) AS leased,
+           COUNT(l.submission_id) FILTER (WHERE l.expires_at <= LOCALTIMESTAMP) AS expired,
+           COUNT(l.submission_id) FILTER (WHERE l.expires_at <= LOCALTIMESTAMP
+                                            AND l.attempts >= :max_attempts) AS exhausted,
+           EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(s.submitted_at)) AS oldest_pending_seconds
+    FROM submissions s
+    LEFT JOIN judge_leases l ON l.submission_id = s.submission_id
+    WHERE s.verdict = 'pending'
+""")
+
+
+def report_params(request: JudgeResultsRequest) -> dict:
+    return {
+        "judge_id": request.judge_id,
+        "results": orjson.dumps([result.model_dump(mode="json") for result in request.results]).decode(),
+    }
+
+
+def reported(request: JudgeResultsRequest, rows) -> JudgeResultsResponse:
+    """Invalidate analytics of the contests whose submissions got a verdict; split applied and rejected"""
+    applied = {row.submission_id: row.contest_id for row in rows}
+    if applied:
+        analytics_cache.invalidate("submissions", *{f"contest:{contest_id}" for contest_id in applied.values()})
+    return JudgeResultsResponse(
+        applied=sorted(applied),
+        rejected=[result.submission_id for result in request.results if result.submission_id not in applied],
+    )
+
+
+def committed_rows(db: Session, query, params: dict) -> list:
+    """Rows of a queue function call, committed"""
+    rows = db.execute(query, params).all()
+    db.commit()
+    return rows
+
+
+@router.post("/claim", response_model=List[JudgeTask])
+async def claim_submissions(request: JudgeClaimRequest, db: AnySession = Depends(get_session)):
+    """
+    Claim up to limit pending submissions, oldest first and rejudges last, for
+    JUDGE_LEASE_SECONDS; concurrent judges never get the same submission. Empty list: nothing to judge
+    """
+    return await run_db(db, committed_rows, CLAIM_QUERY, {
+        **request.model_dump(), "lease_seconds": JUDGE_LEASE_SECONDS, "max_attempts": JUDGE_MAX_ATTEMPTS,
+    })
+
+
+@router.post("/heartbeat", response_model=List[JudgeLeaseResponse])
+async def renew_leases(request: JudgeHeartbeatRequest, db: AnySession = Depends(get_session)):
+    """Renew the judge's leases; submissions missing from the response were lost and must not be reported"""
+    return await run_db(db, committed_rows, HEARTBEAT_QUERY,
+                        {**request.model_dump(), "lease_seconds": JUDGE_LEASE_SECONDS})
+
+
+@router.post("/results", response_model=JudgeResultsResponse)
+async def report_results(request: JudgeResultsRequest, db: AnySession = Depends(get_session)):
+    """
+    Record a batch of verdicts in one transaction. Only submissions still leased
+    by this judge are updated; the rest are returned as rejected
+    """
+    return reported(request, await run_db(db, committed_rows, REPORT_QUERY, report_params(request)))
+
+
+@router.get("/queue", response_model=JudgeQueueStatus)
+def get_queue_status(db: Session = Depends(get_db)):
+    """
+    Pending submissions: total, of rejudges, under an active lease, with an expired lease (back in the queue),
+    out of attempts (no longer handed out until rejudged), oldest age
+    """
+    return db.execute(QUEUE_STATUS_QUERY, {"max_attempts": JUDGE_MAX_ATTEMPTS}).one()
@@ -1,15 +1,19 @@
 """
 Problem CRUD operations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Optional
 from app.database import get_db
-from app.models import Problem
+from app.models import Problem, Submission
+from app.conditional import conditional_headers, read_version, record_changed, version_query
+from app.cache import analytics_cache
+from app.pagination import paginate
 from app.schemas import ProblemCreate, ProblemUpdate, ProblemResponse
 
 router = APIRouter(prefix="/problems", tags=["problems"])
+PROBLEM_VERSION_QUERY = version_query(record_changed("problems"))
 
 
 @router.post("/", response_model=ProblemResponse, status_code=status.HTTP_201_CREATED)
@@ -19,6 +23,7 @@ def create_problem(problem: ProblemCreate, db: Session = Depends(get_db)):
         db_problem = Problem(**problem.model_dump())
         db.add(db_problem)
         db.commit()
+        analytics_cache.invalidate("problems")
         db.refresh(db_problem)
         return db_problem
     except IntegrityError as e:
@@ -36,15 +41,17 @@ def create_problem(problem: ProblemCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[ProblemResponse])
-def get_problems(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all problems with pagination"""
-    problems = db.query(Problem).offset(skip).limit(limit).all()
-    return problems
+def get_problems(response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100,
+                 db: Session = Depends(get_db)):
+    """Get problems ordered by ID; pass X-Next-Cursor as cursor for the next page (skip is kept for old clients)"""
+    return paginate(db.query(Problem), [Problem.problem_id], cursor, skip, limit, response)
 
 
 @router.get("/{problem_id}", response_model=ProblemResponse)
-def get_problem(problem_id: int, db: Session = Depends(get_db)):
+def get_problem(problem_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get problem by ID"""
+    version = read_version(db.execute(PROBLEM_VERSION_QUERY, {"id": problem_id}).first())
+    response.headers.update(conditional_headers(request, version, f"problem-{problem_id}"))
     problem = db.query(Problem).filter(Problem.problem_id == problem_id).first()
     if not problem:
         raise HTTPException(status_code=404, detail="Problem not found")
@@ -64,6 +71,7 @@ def update_problem(problem_id: int, problem_update: ProblemUpdate, db: Session =
             setattr(problem, field, value)
         
         db.commit()
+        analytics_cache.invalidate("problems")
         db.refresh(problem)
         return problem
     except IntegrityError as e:
@@ -82,6 +90,11 @@ def delete_problem(problem_id: int, db: Session = Depends(get_db)):
     if not problem:
         raise HTTPException(status_code=404, detail="Problem not found")
     
+    # Submissions to the problem are deleted with it, changing those contests' standings
+    contest_ids = [row[0] for row in db.query(Submission.contest_id).filter(
+        Submission.problem_id == problem_id
+    ).distinct()]
     db.delete(problem)
     db.commit()
+    analytics_cache.invalidate("problems", "submissions", *(f"contest:{cid}" for cid in contest_ids))
     return None
@@ -1,50 +1,99 @@
 """
 Submission CRUD operations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
-from app.database import get_db
+from typing import List, Optional
+from datetime import datetime
+from app.database import AnySession, get_db, get_session, run_db
+from app.cache import analytics_cache
+from app.pagination import paginate
 from app.models import Submission
+from app.conditional import conditional_headers, read_version, record_changed, version_query
 from app.schemas import SubmissionCreate, SubmissionUpdate, SubmissionResponse
 
 router = APIRouter(prefix="/submissions", tags=["submissions"])
+SUBMISSION_VERSION_QUERY = version_query(record_changed("submissions"))
 
 
-@router.post("/", response_model=SubmissionResponse, status_code=status.HTTP_201_CREATED)
-def create_submission(submission: SubmissionCreate, db: Session = Depends(get_db)):
-    """Create a new submission"""
+def submission_integrity_error(e: IntegrityError) -> HTTPException:
+    """Map an IntegrityError on submission insert to a 400 response"""
+    error_msg = str(e.orig)
+    if "foreign key" in error_msg.lower():
+        return HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid reference (user_id, contest_id, or problem_id not found): {error_msg}"
+        )
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Database constraint violation: {error_msg}"
+    )
+
+
+def insert_submission(db: Session, submission: SubmissionCreate) -> Submission:
     try:
         db_submission = Submission(**submission.model_dump())
         db.add(db_submission)
         db.commit()
+        analytics_cache.invalidate("submissions", f"contest:{submission.contest_id}")
         db.refresh(db_submission)
         return db_submission
     except IntegrityError as e:
         db.rollback()
-        error_msg = str(e.orig)
-        if "foreign key" in error_msg.lower():
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid reference (user_id, contest_id, or problem_id not found): {error_msg}"
-            )
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Database constraint violation: {error_msg}"
-        )
+        raise submission_integrity_error(e)
+
+
+@router.post("/", response_model=SubmissionResponse, status_code=status.HTTP_201_CREATED)
+async def create_submission(submission: SubmissionCreate, db: AnySession = Depends(get_session)):
+    """Create a new submission"""
+    return await run_db(db, insert_submission, submission)
+
+
+def submission_filters(
+    contest_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    problem_id: Optional[int] = None,
+    verdict: Optional[str] = Query(None, pattern="^(pending|accepted|wrong_answer|time_limit|memory_limit|runtime_error|compilation_error)$"),
+    language: Optional[str] = Query(None, pattern="^(C\\+\\+|Python|Java|C)$"),
+    submitted_from: Optional[datetime] = None,
+    submitted_to: Optional[datetime] = None,
+) -> list:
+    """Dependency: WHERE clauses of the submission list filters (submitted_from inclusive, submitted_to exclusive)"""
+    filters = []
+    if contest_id is not None:
+        filters.append(Submission.contest_id == contest_id)
+    if user_id is not None:
+        filters.append(Submission.user_id == user_id)
+    if problem_id is not None:
+        filters.append(Submission.problem_id == problem_id)
+    if verdict is not None:
+        filters.append(Submission.verdict == verdict)
+    if language is not None:
+        filters.append(Submission.language == language)
+    if submitted_from is not None:
+        filters.append(Submission.submitted_at >= submitted_from)
+    if submitted_to is not None:
+        filters.append(Submission.submitted_at < submitted_to)
+    return filters
 
 
 @router.get("/", response_model=List[SubmissionResponse])
-def get_submissions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all submissions with pagination"""
-    submissions = db.query(Submission).offset(skip).limit(limit).all()
-    return submissions
+def get_submissions(response: Response, filters: list = Depends(submission_filters), cursor: Optional[str] = None,
+                    skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    Get submissions, newest first, optionally filtered; pass X-Next-Cursor
+    as cursor for the next page (skip is kept for old clients)
+    """
+    return paginate(db.query(Submission).filter(*filters), [Submission.submitted_at, Submission.submission_id],
+                    cursor, skip, limit, response, descending=True)
 
 
 @router.get("/{submission_id}", response_model=SubmissionResponse)
-def get_submission(submission_id: int, db: Session = Depends(get_db)):
+def get_submission(submission_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get submission by ID"""
+    version = read_version(db.execute(SUBMISSION_VERSION_QUERY, {"id": submission_id}).first())
+    response.headers.update(conditional_headers(request, version, f"submission-{submission_id}"))
     submission = db.query(Submission).filter(Submission.submission_id == submission_id).first()
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
@@ -58,12 +107,14 @@ def update_submission(submission_id: int, submission_update: SubmissionUpdate, d
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    old_contest_id = submission.contest_id
     try:
         update_data = submission_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(submission, field, value)
         
         db.commit()
+        analytics_cache.invalidate("submissions", f"contest:{old_contest_id}", f"contest:{submission.contest_id}")
         db.refresh(submission)
         return submission
     except IntegrityError as e:
@@ -82,6 +133,8 @@ def delete_submission(submission_id: int, db: Session = Depends(get_db)):
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     
+    contest_id = submission.contest_id
     db.delete(submission)
     db.commit()
+    analytics_cache.invalidate("submissions", f"contest:{contest_id}")
     return None
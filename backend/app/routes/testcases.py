@@ -0,0 +1,260 @@
+"""
+Testcase operations: small tests are created and read as JSON; large tests are
+uploaded as raw request bodies and read as byte streams with Range support,
+without being loaded into memory whole (see app/testcase_store.py)
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from typing import Iterator, List, Optional, Tuple
+from app.database import get_db, SessionLocal
+from app.models import Testcase
+from app.schemas import TestcaseCreate, TestcaseResponse, TestcaseInfo, TestcaseUploadResponse
+from app.testcase_store import (
+    DELETE_ORPHANS_QUERY, PARTS, TESTCASE_CHUNK_KB, ChunkWriter, iter_chunks, store_text,
+)
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/testcases", tags=["testcases"])
+
+# Larger tests are not returned inside JSON; read them with GET /testcases/{id}/input and /output
+TESTCASE_JSON_LIMIT_KB = int(os.getenv("TESTCASE_JSON_LIMIT_KB", "1024"))
+
+TESTCASE_INFO_QUERY = text("""
+    SELECT t.testcase_id, t.problem_id, t.is_sample, t.test_order,
+           COALESCE(t.input_size, octet_length(t.input_data)) AS input_size,
+           COALESCE(t.output_size, octet_length(t.expected_output)) AS output_size,
+           t.input_chunks IS NOT NULL OR t.output_chunks IS NOT NULL AS chunked,
+           t.created_at
+    FROM testcases t
+    WHERE t.problem_id = :problem_id
+    ORDER BY t.test_order, t.testcase_id
+""")
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def part_query(part: str):
+    """Storage of one part of a testcase: inline text or chunk hashes, size and chunk size"""
+    inline, chunks, size = PARTS[part]
+    return text(f"""
+        SELECT t.{inline} AS inline, t.{chunks} AS chunks, COALESCE(t.{size}, octet_length(t.{inline})) AS size,
+               t.chunk_size
+        FROM testcases t
+        WHERE t.testcase_id = :testcase_id
+    """)
+
+
+def update_part_query(part: str):
+    inline, chunks, size = PARTS[part]
+    return text(f"""
+        UPDATE testcases SET {inline} = NULL, {chunks} = :hashes, {size} = :size
+        WHERE testcase_id = :testcase_id
+    """)
+
+
+def testcase_response(db: Session, testcase: Testcase) -> TestcaseResponse:
+    """The testcase with its data; chunked parts are assembled up to TESTCASE_JSON_LIMIT_KB"""
+    values = {}
+    for part, (inline, _, _) in PARTS.items():
+        row = db.execute(part_query(part), {"testcase_id": testcase.testcase_id}).one()
+        if row.chunks is None:
+            values[inline], values[f"{part}_size"] = row.inline, row.size
+            continue
+        if row.size > TESTCASE_JSON_LIMIT_KB * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Testcase {part} is {row.size} bytes; read it with GET /testcases/{testcase.testcase_id}/{part}",
+            )
+        data = b"".join(iter_chunks([bytes(digest) for digest in row.chunks], row.chunk_size))
+        values[inline], values[f"{part}_size"] = data.decode(errors="replace"), row.size
+    return TestcaseResponse(
+        testcase_id=testcase.testcase_id,
+        problem_id=testcase.problem_id,
+        is_sample=testcase.is_sample,
+        test_order=testcase.test_order,
+        created_at=testcase.created_at,
+        **values,
+    )
+
+
+def constraint_error(e: IntegrityError) -> HTTPException:
+    error_msg = str(e.orig)
+    if "foreign key" in error_msg.lower():
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                             detail=f"Invalid reference (problem_id not found): {error_msg}")
+    if "unique" in error_msg.lower():
+        return HTTPException(status_code=status.HTTP_409_CONFLICT,
+                             detail=f"Problem already has a testcase with this test_order: {error_msg}")
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Database constraint violation: {error_msg}")
+
+
+@router.post("/", response_model=TestcaseResponse, status_code=status.HTTP_201_CREATED)
+def create_testcase(testcase: TestcaseCreate, db: Session = Depends(get_db)):
+    """
+    Create a testcase from JSON. Input or output larger than TESTCASE_INLINE_KB is
+    stored as deduplicated chunks; for tests of many megabytes create the testcase
+    with empty data and upload it with PUT /testcases/{id}/input and /output
+    """
+    chunk_size = TESTCASE_CHUNK_KB * 1024
+    try:
+        input_data, input_chunks, input_size = store_text(db, testcase.input_data, chunk_size)
+        expected_output, output_chunks, output_size = store_text(db, testcase.expected_output, chunk_size)
+        db_testcase = Testcase(
+            problem_id=testcase.problem_id,
+            is_sample=testcase.is_sample,
+            test_order=testcase.test_order,
+            input_data=input_data,
+            expected_output=expected_output,
+            input_chunks=input_chunks,
+            output_chunks=output_chunks,
+            input_size=input_size,
+            output_size=output_size,
+            chunk_size=chunk_size,
+        )
+        db.add(db_testcase)
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise constraint_error(e)
+    return TestcaseResponse(**testcase.model_dump(), testcase_id=db_testcase.testcase_id,
+                            input_size=input_size, output_size=output_size, created_at=db_testcase.created_at)
+
+
+@router.get("/", response_model=List[TestcaseInfo])
+def get_testcases(problem_id: int, db: Session = Depends(get_db)):
+    """Testcases of a problem in test order, with sizes but without their data"""
+    return db.execute(TESTCASE_INFO_QUERY, {"problem_id": problem_id}).all()
+
+
+@router.get("/{testcase_id}", response_model=TestcaseResponse)
+def get_testcase(testcase_id: int, db: Session = Depends(get_db)):
+    """Get a testcase with its data (413 for tests over TESTCASE_JSON_LIMIT_KB: stream them instead)"""
+    testcase = db.query(Testcase).filter(Testcase.testcase_id == testcase_id).first()
+    if not testcase:
+        raise HTTPException(status_code=404, detail="Testcase not found")
+    return testcase_response(db, testcase)
+
+
+@router.delete("/{testcase_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_testcase(testcase_id: int, db: Session = Depends(get_db)):
+    """Delete a testcase; chunks no other test refers to are collected after a grace period"""
+    testcase = db.query(Testcase).filter(Testcase.testcase_id == testcase_id).first()
+    if not testcase:
+        raise HTTPException(status_code=404, detail="Testcase not found")
+    db.delete(testcase)
+    db.commit()
+    deleted = db.execute(DELETE_ORPHANS_QUERY).scalar()
+    db.commit()
+    if deleted:
+        logger.info(f"Deleted {deleted} orphan testcase chunks")
+    return None
+
+
+def check_part(part: str) -> None:
+    if part not in PARTS:
+        raise HTTPException(status_code=404, detail="Testcase part must be input or output")
+
+
+@router.put("/{testcase_id}/{part}", response_model=TestcaseUploadResponse)
+async def upload_testcase_part(testcase_id: int, part: str, request: Request):
+    """
+    Replace the input or expected output of a testcase with the raw request body.
+    The body is chunked as it arrives; only TESTCASE_FETCH_CHUNKS chunks are held
+    in memory, and chunks already stored for any problem are not stored again
+
+    Example:
+    curl -X PUT localhost:8000/testcases/1/input --data-binary @big.in
+    """
+    check_part(part)
+    db = SessionLocal()
+    try:
+        chunk_size = await run_in_threadpool(
+            lambda: db.query(Testcase.chunk_size).filter(Testcase.testcase_id == testcase_id).scalar()
+        )
+        if chunk_size is None:
+            raise HTTPException(status_code=404, detail="Testcase not found")
+        writer = ChunkWriter(db, chunk_size)
+        async for data in request.stream():
+            writer.write(data)
+            if writer.full:
+                await run_in_threadpool(writer.flush)
+        hashes = await run_in_threadpool(writer.close)
+
+        def commit() -> None:
+            db.execute(update_part_query(part), {"testcase_id": testcase_id, "hashes": hashes, "size": writer.size})
+            db.commit()
+            # Chunks of the replaced data are collected once nothing refers to them
+            db.execute(DELETE_ORPHANS_QUERY)
+            db.commit()
+
+        await run_in_threadpool(commit)
+    finally:
+        db.close()
+    logger.info(f"Testcase {testcase_id} {part}: {writer.size} bytes, {len(hashes)} chunks, {writer.new_chunks} new")
+    return TestcaseUploadResponse(
+        testcase_id=testcase_id,
+        part=part,
+        size=writer.size,
+        chunks=len(hashes),
+        new_chunks=writer.new_chunks,
+        stored_bytes=writer.stored_bytes,
+    )
+
+
+def byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """[start, end) of a single-range Range header; None: no header. Raises 416 for ranges outside the data"""
+    if header is None:
+        return None
+    match = RANGE_PATTERN.fullmatch(header.strip())
+    if match is None or match.groups() == ("", ""):
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                            headers={"Content-Range": f"bytes */{size}"}, detail="Only one byte range is supported")
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size
+    else:
+        start, end = int(first), min(int(last) + 1, size) if last else size
+    if start >= end:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                            headers={"Content-Range": f"bytes */{size}"}, detail="Range outside the testcase data")
+    return start, end
+
+
+def iter_inline(data: str, start: int, end: int) -> Iterator[bytes]:
+    yield data.encode()[start:end]
+
+
+@router.get("/{testcase_id}/{part}")
+def read_testcase_part(testcase_id: int, part: str, request: Request, db: Session = Depends(get_db)):
+    """
+    Stream the input or expected output of a testcase as bytes. Supports a single
+    Range (206 Partial Content): only the chunks covering the range are read
+
+    Example:
+    curl -H "Range: bytes=0-1023" localhost:8000/testcases/1/input
+    """
+    check_part(part)
+    row = db.execute(part_query(part), {"testcase_id": testcase_id}).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Testcase not found")
+    db.commit()
+    requested = byte_range(request.headers.get("range"), row.size)
+    start, end = requested or (0, row.size)
+    if row.chunks is None:
+        body = iter_inline(row.inline, start, end)
+    else:
+        body = iter_chunks([bytes(digest) for digest in row.chunks], row.chunk_size, start, end)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start)}
+    if requested is not None:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{row.size}"
+    return StreamingResponse(
+        body, status_code=status.HTTP_206_PARTIAL_CONTENT if requested else status.HTTP_200_OK,
+        media_type="application/octet-stream", headers=headers,
+    )
@@ -1,15 +1,19 @@
 """
 User CRUD operations
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from typing import List
+from typing import List, Optional
 from app.database import get_db
+from app.cache import analytics_cache
+from app.pagination import paginate
 from app.models import User
+from app.conditional import conditional_headers, read_version, record_changed, version_query
 from app.schemas import UserCreate, UserUpdate, UserResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
+USER_VERSION_QUERY = version_query(record_changed("users"))
 
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -19,6 +23,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         db_user = User(**user.model_dump())
         db.add(db_user)
         db.commit()
+        analytics_cache.invalidate("users")
         db.refresh(db_user)
         return db_user
     except IntegrityError as e:
@@ -36,15 +41,17 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=List[UserResponse])
-def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all users with pagination"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+def get_users(response: Response, cursor: Optional[str] = None, skip: int = 0, limit: int = 100,
+              db: Session = Depends(get_db)):
+    """Get users ordered by ID; pass X-Next-Cursor as cursor for the next page (skip is kept for old clients)"""
+    return paginate(db.query(User), [User.user_id], cursor, skip, limit, response)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+def get_user(user_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get user by ID"""
+    version = read_version(db.execute(USER_VERSION_QUERY, {"id": user_id}).first())
+    response.headers.update(conditional_headers(request, version, f"user-{user_id}"))
     user = db.query(User).filter(User.user_id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -64,6 +71,7 @@ def update_user(user_id: int, user_update: UserUpdate, db: Session = Depends(get
             setattr(user, field, value)
         
         db.commit()
+        analytics_cache.invalidate("users")
         db.refresh(user)
         return user
     except IntegrityError as e:
@@ -89,4 +97,6 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
     
     db.delete(user)
     db.commit()
+    # Cascades to the user's submissions, problems and contests
+    analytics_cache.invalidate("users", "problems", "submissions")
     return None
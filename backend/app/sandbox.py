@@ -0,0 +1,701 @@
+"""
+Compile and run submissions under rlimit-based CPU, memory, file size and process
+limits, as an unprivileged user without network access; testcase input is streamed
+to stdin and output is checked as it is produced
+"""
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import fcntl
+import functools
+import hashlib
+import math
+import orjson
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Compilers and interpreter; flags are part of the compile cache key
+JUDGE_CC = os.getenv("JUDGE_CC", "gcc")
+JUDGE_CXX = os.getenv("JUDGE_CXX", "g++")
+JUDGE_PYTHON = os.getenv("JUDGE_PYTHON", sys.executable)
+JUDGE_C_FLAGS = os.getenv("JUDGE_C_FLAGS", "-O2 -std=gnu17 -pipe").split()
+JUDGE_CXX_FLAGS = os.getenv("JUDGE_CXX_FLAGS", "-O2 -std=gnu++17 -pipe").split()
+JUDGE_COMPILE_SECONDS = int(os.getenv("JUDGE_COMPILE_SECONDS", "30"))
+# Address space of each compiler process (driver, cc1/cc1plus, as, ld)
+JUDGE_COMPILE_MEMORY_MB = int(os.getenv("JUDGE_COMPILE_MEMORY_MB", "2048"))
+# Address space above the problem's memory limit: runtime and allocator overhead
+JUDGE_MEMORY_SLACK_MB = int(os.getenv("JUDGE_MEMORY_SLACK_MB", "64"))
+# Output beyond this is not compared and the run is a wrong answer
+JUDGE_OUTPUT_LIMIT_MB = int(os.getenv("JUDGE_OUTPUT_LIMIT_MB", "64"))
+# Wall clock limit as a multiple of the CPU time limit (sleeping or blocked programs)
+JUDGE_WALL_FACTOR = float(os.getenv("JUDGE_WALL_FACTOR", "2"))
+JUDGE_WORK_DIR = os.getenv("JUDGE_WORK_DIR", os.path.join(tempfile.gettempdir(), "cp-judge"))
+# Build cache shared by all judge processes on the host; 0 MB disables it
+JUDGE_BUILD_CACHE_DIR = os.getenv("JUDGE_BUILD_CACHE_DIR", os.path.join(JUDGE_WORK_DIR, "builds"))
+JUDGE_BUILD_CACHE_MB = int(os.getenv("JUDGE_BUILD_CACHE_MB", "512"))
+# Solutions run as this uid (and gid) plus the worker number: a range of ids no account
+# or file on the host uses. Switching to them needs the judge to run as root
+JUDGE_RUN_UID = int(os.getenv("JUDGE_RUN_UID", "20000"))
+# Processes and threads a solution may have at once (RLIMIT_NPROC)
+JUDGE_RUN_PROCESSES = int(os.getenv("JUDGE_RUN_PROCESSES", "32"))
+
+CHUNK_SIZE = 64 * 1024
+STDERR_TAIL = 4096
+
+
+@dataclass
+class Language:
+    source_name: str
+    compile_command: Optional[List[str]]
+    run_command: List[str]
+
+
+# {src} and {exe} are replaced with paths in the build directory
+LANGUAGES = {
+    "C": Language("solution.c", [JUDGE_CC, *JUDGE_C_FLAGS, "-o", "{exe}", "{src}", "-lm"], ["{exe}"]),
+    "C++": Language("solution.cpp", [JUDGE_CXX, *JUDGE_CXX_FLAGS, "-o", "{exe}", "{src}"], ["{exe}"]),
+    # Isolated mode without site: no user site-packages, environment or current directory on sys.path
+    "Python": Language("solution.py", None, [JUDGE_PYTHON, "-I", "-S", "{src}"]),
+}
+
+
+@dataclass
+class RunResult:
+    verdict: str
+    time_ms: int
+    memory_mb: int
+
+
+@dataclass
+class Build:
+    """Compiled (or checked) program; error is the compiler output when it failed"""
+    directory: str
+    run_command: Optional[List[str]]
+    error: Optional[str] = None
+
+
+# Testcase input or expected output: called once per run for a fresh byte stream
+TestData = Callable[[], Iterable[bytes]]
+
+
+def chunks(data: str) -> Iterator[bytes]:
+    """Encode text to bytes piece by piece"""
+    for start in range(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE].encode()
+
+
+def tokens(parts: Iterable[bytes]) -> Iterator[bytes]:
+    """Whitespace-separated tokens of a byte stream"""
+    pending = b""
+    for part in parts:
+        data = pending + part
+        words = data.split()
+        pending = words.pop() if words and not data[-1:].isspace() else b""
+        yield from words
+    if pending:
+        yield pending
+
+
+class OutputChecker:
+    """
+    Compare program output with the expected answer token by token as it arrives,
+    ignoring differences in whitespace; stops at the first mismatch
+    """
+
+    def __init__(self, expected: Iterable[bytes]):
+        self.expected = tokens(expected)
+        self.pending = b""
+        self.size = 0
+        self.ok = True
+
+    def feed(self, part: bytes) -> bool:
+        """Consume a piece of output; False once it can no longer match"""
+        self.size += len(part)
+        if self.size > JUDGE_OUTPUT_LIMIT_MB * 1024 * 1024:
+            self.ok = False
+            return False
+        data = self.pending + part
+        words = data.split()
+        self.pending = words.pop() if words and not data[-1:].isspace() else b""
+        for word in words:
+            if next(self.expected, None) != word:
+                self.ok = False
+                return False
+        return True
+
+    def finish(self) -> bool:
+        """True if the whole output matched and nothing expected is left"""
+        if self.ok and self.pending:
+            self.ok = next(self.expected, None) == self.pending
+        return self.ok and next(self.expected, None) is None
+
+
+def limit_compiler() -> None:
+    """Applied in the compiler before exec: CPU and memory limits for it and the passes it starts"""
+    resource.setrlimit(resource.RLIMIT_CPU, (JUDGE_COMPILE_SECONDS, JUDGE_COMPILE_SECONDS + 1))
+    memory = JUDGE_COMPILE_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+# Starts the solution with rlimits and reports its exit status and resource usage.
+# A child forked from the judge worker itself would inherit the worker's resident
+# set in ru_maxrss; forked from this small process it reports only its own memory
+RUNNER_SOURCE = r"""
+#define _GNU_SOURCE
+#include <errno.h>
+#include <fcntl.h>
+#include <grp.h>
+#include <linux/audit.h>
+#include <linux/filter.h>
+#include <linux/seccomp.h>
+#include <signal.h>
+#include <stddef.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/syscall.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+#if defined(__x86_64__)
+#define SANDBOX_ARCH AUDIT_ARCH_X86_64
+#elif defined(__aarch64__)
+#define SANDBOX_ARCH AUDIT_ARCH_AARCH64
+#else
+#error "no seccomp filter for this architecture"
+#endif
+#ifndef __NR_io_uring_setup
+#define __NR_io_uring_setup 425
+#endif
+
+/* runner REPORT_FD UID PROCESSES CPU_SECONDS WALL_MS ADDRESS_SPACE_MB OUTPUT_MB PROGRAM [ARGS...]
+   The program runs as UID (and group UID) with no supplementary groups, no new
+   privileges, at most PROCESSES processes of that user and without sockets.
+   SIGTERM stops the program early; the report line is
+   "exit_code_or_minus_signal timed_out stopped cpu_ms max_rss_kb",
+   or "sandbox errno" (exit status 3) when the program could not be isolated */
+static volatile sig_atomic_t timed_out = 0, stopped = 0;
+static pid_t child;
+
+static void on_signal(int sig) {
+    if (sig == SIGALRM) timed_out = 1; else stopped = 1;
+    kill(-child, SIGKILL);
+}
+
+static int limit(int resource, rlim_t value, rlim_t hard) {
+    struct rlimit r = {value, hard};
+    return setrlimit(resource, &r);
+}
+
+/* socket() (and io_uring, which can open sockets past seccomp) fail with EACCES;
+   other ABIs than the native one (i386, x32) are not allowed at all */
+static int deny_network(void) {
+    struct sock_filter filter[] = {
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS, offsetof(struct seccomp_data, arch)),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, SANDBOX_ARCH, 1, 0),
+        BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_KILL_PROCESS),
+        BPF_STMT(BPF_LD | BPF_W | BPF_ABS, offsetof(struct seccomp_data, nr)),
+        BPF_JUMP(BPF_JMP | BPF_JGE | BPF_K, 0x40000000, 2, 0),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_socket, 1, 0),
+        BPF_JUMP(BPF_JMP | BPF_JEQ | BPF_K, __NR_io_uring_setup, 0, 1),
+        BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_ERRNO | EACCES),
+        BPF_STMT(BPF_RET | BPF_K, SECCOMP_RET_ALLOW),
+    };
+    struct sock_fprog program = {sizeof(filter) / sizeof(filter[0]), filter};
+    return prctl(PR_SET_SECCOMP, SECCOMP_MODE_FILTER, &program);
+}
+
+static int isolate(uid_t uid, rlim_t processes) {
+    if (uid == 0 || uid == getuid()) { errno = EINVAL; return -1; }
+    if (setgroups(0, NULL) || setgid(uid) || setuid(uid)) return -1;
+    if (getuid() != uid || geteuid() != uid) { errno = EPERM; return -1; }
+    if (prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0)) return -1;
+    if (limit(RLIMIT_NPROC, processes, processes)) return -1;
+    return deny_network();
+}
+
+int main(int argc, char **argv) {
+    if (argc < 9) return 2;
+    int report = atoi(argv[1]);
+    uid_t uid = strtoul(argv[2], NULL, 10);
+    rlim_t processes = strtoull(argv[3], NULL, 10);
+    rlim_t cpu = strtoull(argv[4], NULL, 10);
+    long wall_ms = atol(argv[5]);
+    rlim_t memory = strtoull(argv[6], NULL, 10) << 20;
+    rlim_t output = strtoull(argv[7], NULL, 10) << 20;
+    /* The child writes errno here if it cannot be isolated; exec closes it otherwise */
+    int setup[2];
+    if (pipe2(setup, O_CLOEXEC)) return 2;
+    sigset_t all, old;
+    sigfillset(&all);
+    sigprocmask(SIG_BLOCK, &all, &old);
+    child = fork();
+    if (child < 0) return 2;
+    if (child == 0) {
+        sigprocmask(SIG_SETMASK, &old, NULL);
+        setpgid(0, 0);
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        close(report);
+        close(setup[0]);
+        if (isolate(uid, processes)) {
+            int error = errno;
+            write(setup[1], &error, sizeof error);
+            _exit(127);
+        }
+        limit(RLIMIT_CPU, cpu, cpu + 1);
+        if (memory) limit(RLIMIT_AS, memory, memory);
+        limit(RLIMIT_FSIZE, output, output);
+        limit(RLIMIT_CORE, 0, 0);
+        execvp(argv[8], argv + 8);
+        _exit(127);
+    }
+    close(setup[1]);
+    setpgid(child, child);
+    close(0);
+    close(1);
+    struct sigaction action = {0};
+    action.sa_handler = on_signal;
+    sigaction(SIGTERM, &action, NULL);
+    sigaction(SIGALRM, &action, NULL);
+    struct itimerval timer = {{0, 0}, {wall_ms / 1000, (wall_ms % 1000) * 1000}};
+    setitimer(ITIMER_REAL, &timer, NULL);
+    sigprocmask(SIG_SETMASK, &old, NULL);
+    int status;
+    struct rusage usage;
+    while (wait4(child, &status, 0, &usage) < 0)
+        if (errno != EINTR) return 2;
+    kill(-child, SIGKILL);
+    int error;
+    if (read(setup[0], &error, sizeof error) == sizeof error) {
+        dprintf(report, "sandbox %d\n", error);
+        return 3;
+    }
+    long cpu_ms = (usage.ru_utime.tv_sec + usage.ru_stime.tv_sec) * 1000L
+        + (usage.ru_utime.tv_usec + usage.ru_stime.tv_usec) / 1000;
+    dprintf(report, "%d %d %d %ld %ld\n", WIFEXITED(status) ? WEXITSTATUS(status) : -WTERMSIG(status),
+            (int)timed_out, (int)stopped, cpu_ms, usage.ru_maxrss);
+    return 0;
+}
+"""
+runner_lock = threading.Lock()
+runner: Optional[str] = None
+
+
+def runner_path() -> str:
+    """Build the runner once per source and compiler; concurrent workers replace it atomically"""
+    global runner
+    with runner_lock:
+        if runner is None:
+            digest = hashlib.sha256(f"{JUDGE_CC}\0{RUNNER_SOURCE}".encode()).hexdigest()[:16]
+            path = os.path.join(JUDGE_WORK_DIR, f"runner-{digest}")
+            if not os.path.exists(path):
+                os.makedirs(JUDGE_WORK_DIR, exist_ok=True)
+                partial = f"{path}.{os.getpid()}"
+                subprocess.run([JUDGE_CC, "-O2", "-x", "c", "-o", partial, "-"],
+                               input=RUNNER_SOURCE.encode(), check=True, capture_output=True)
+                os.replace(partial, path)
+            runner = path
+        return runner
+
+
+def prepare_directories() -> None:
+    """Run directories can be reached by solutions but not listed; the build cache is the judge's alone"""
+    os.makedirs(JUDGE_WORK_DIR, exist_ok=True)
+    os.chmod(JUDGE_WORK_DIR, 0o711)
+    os.makedirs(JUDGE_BUILD_CACHE_DIR, exist_ok=True)
+    os.chmod(JUDGE_BUILD_CACHE_DIR, 0o700)
+
+
+def check_sandbox(uids: range) -> Optional[str]:
+    """Why solutions cannot be isolated as these uids, or None if a test run succeeds"""
+    if os.geteuid() != 0:
+        return "the judge must run as root to switch solutions to JUDGE_RUN_UID"
+    if uids[0] <= 0:
+        return "JUDGE_RUN_UID must be above 0: solutions must not run as the API's user"
+    prepare_directories()
+    directory = tempfile.mkdtemp(prefix="run-", dir=JUDGE_WORK_DIR)
+    try:
+        build = Build(directory, ["true"])
+        for uid in (uids[0], uids[-1]):
+            share_build(build, uid)
+            result = run_testcase(build, [], [], 1000, 16, uid)
+            if result.verdict != "accepted":
+                return f"a test run as uid {uid} failed: {result.verdict}"
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+        return str(e)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return None
+
+
+class BuildCacheStats:
+    """Build cache counters shared by the worker processes of a pool"""
+
+    FIELDS = ("hits", "misses", "evictions", "saved_compile_ms")
+
+    def __init__(self, context):
+        self.values = context.Array("q", len(self.FIELDS))
+
+    def add(self, field: str, amount: int = 1) -> None:
+        with self.values.get_lock():
+            self.values[self.FIELDS.index(field)] += amount
+
+    def snapshot(self) -> dict:
+        with self.values.get_lock():
+            return dict(zip(self.FIELDS, self.values))
+
+
+@functools.lru_cache(maxsize=None)
+def toolchain_version(command: str) -> str:
+    """First line of --version: a compiler upgrade changes every cache key"""
+    try:
+        result = subprocess.run([command, "--version"], capture_output=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return (result.stdout or result.stderr).decode(errors="replace").partition("\n")[0]
+
+
+def run_command(language: str, directory: str) -> List[str]:
+    spec = LANGUAGES[language]
+    paths = {"src": os.path.join(directory, spec.source_name), "exe": os.path.join(directory, "solution")}
+    return [part.format(**paths) for part in spec.run_command]
+
+
+def artifact_name(language: str) -> str:
+    """File the program runs from: the executable, or the script for Python"""
+    return "solution" if LANGUAGES[language].compile_command is not None else LANGUAGES[language].source_name
+
+
+class BuildCache:
+    """
+    Content-addressed build cache on local disk shared by all judge processes:
+    an entry per hash(language, toolchain, flags, source) holds the artifact and
+    the compiler's verdict, so rejudged and resubmitted sources are not compiled
+    again. Entries are published by an atomic rename; concurrent misses on the
+    same key wait on a striped flock and reuse the winner's build. The least
+    recently used entries (directory mtime, touched on every hit) are evicted
+    when the cache grows past limit_mb; 0 disables the cache. Only the judge's
+    user can reach the cache, and each run gets its own copy of the artifact, so
+    a solution cannot plant a modified build for later runs of the same source
+    """
+
+    def __init__(self, stats: Optional[BuildCacheStats] = None, root: str = JUDGE_BUILD_CACHE_DIR,
+                 limit_mb: int = JUDGE_BUILD_CACHE_MB):
+        self.stats = stats
+        self.root = root
+        self.limit = limit_mb * 1024 * 1024
+        # Bytes this process added since it last checked the cache size
+        self.added = self.limit
+
+    @staticmethod
+    def key(language: str, source: str) -> str:
+        spec = LANGUAGES[language]
+        command = spec.compile_command or spec.run_command
+        digest = hashlib.sha256()
+        for part in [language, toolchain_version(command[0]), *command, source]:
+            digest.update(part.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def count(self, field: str, amount: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.add(field, amount)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, language: str, source: str, uid: int = JUDGE_RUN_UID) -> Build:
+        """A build in a private directory, compiled as uid on a miss; hand it back with release()"""
+        os.makedirs(JUDGE_WORK_DIR, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix="run-", dir=JUDGE_WORK_DIR)
+        if self.limit <= 0:
+            self.count("misses")
+            return compile_source(language, source, directory, uid)
+        key = self.key(language, source)
+        entry = self.entry_path(key)
+        build = self.load(entry, language, directory)
+        if build is None:
+            os.makedirs(self.root, mode=0o700, exist_ok=True)
+            os.makedirs(os.path.join(self.root, "locks"), exist_ok=True)
+            with open(os.path.join(self.root, "locks", key[:2]), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                build = self.load(entry, language, directory)
+                if build is None:
+                    self.count("misses")
+                    self.store(entry, language, source, uid)
+                    build = self.load(entry, language, directory, hit=False)
+        if build is None:
+            build = compile_source(language, source, directory, uid)
+        if self.added > self.limit // 8:
+            self.evict()
+        return build
+
+    def load(self, entry: str, language: str, directory: str, hit: bool = True) -> Optional[Build]:
+        """Copy the entry's artifact into directory; None if there is no such entry (or it was just evicted)"""
+        try:
+            with open(os.path.join(entry, "build.json"), "rb") as file:
+                meta = orjson.loads(file.read())
+            if meta["error"] is None:
+                name = artifact_name(language)
+                # A copy, not a hard link: whatever the run does to its file never reaches the entry
+                shutil.copyfile(os.path.join(entry, name), os.path.join(directory, name))
+            os.utime(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if hit:
+            self.count("hits")
+            self.count("saved_compile_ms", meta["compile_ms"])
+        if meta["error"] is not None:
+            return Build(directory, None, meta["error"])
+        return Build(directory, run_command(language, directory))
+
+    def store(self, entry: str, language: str, source: str, uid: int) -> None:
+        """Compile as uid in a run directory (uid cannot reach the cache) and publish the result as the entry"""
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.join(self.root, "tmp"))
+        workspace = tempfile.mkdtemp(prefix="build-", dir=JUDGE_WORK_DIR)
+        try:
+            start = time.perf_counter()
+            build = compile_source(language, source, workspace, uid)
+            compile_ms = round((time.perf_counter() - start) * 1000)
+            if build.error is None:
+                name = artifact_name(language)
+                shutil.copyfile(os.path.join(workspace, name), os.path.join(staging, name))
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+        with open(os.path.join(staging, "build.json"), "wb") as file:
+            file.write(orjson.dumps({"language": language, "error": build.error, "compile_ms": compile_ms}))
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        self.added += directory_size(staging)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Published by a process that does not share our lock directory
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def evict(self) -> None:
+        """Drop least recently used entries down to 90% of the limit; one process at a time"""
+        self.added = 0
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, "evict.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            remove_stale(os.path.join(self.root, "tmp"))
+            entries = cache_entries(self.root)
+            total = sum(size for _, _, size in entries)
+            if total <= self.limit:
+                return
+            evicted = 0
+            for _, path, size in sorted(entries):
+                if total <= self.limit * 0.9:
+                    break
+                # Renamed away first so that no reader sees a half-deleted entry
+                doomed = tempfile.mkdtemp(dir=os.path.join(self.root, "tmp"))
+                try:
+                    os.rename(path, os.path.join(doomed, "entry"))
+                except OSError:
+                    continue
+                shutil.rmtree(doomed, ignore_errors=True)
+                total -= size
+                evicted += 1
+            self.count("evictions", evicted)
+
+    @staticmethod
+    def release(build: Build) -> None:
+        shutil.rmtree(build.directory, ignore_errors=True)
+
+
+def directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def remove_stale(path: str, seconds: float = 3600) -> None:
+    """Staging directories left behind by killed workers"""
+    if not os.path.isdir(path):
+        return
+    deadline = time.time() - seconds
+    for entry in os.scandir(path):
+        try:
+            if entry.stat().st_mtime < deadline:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except FileNotFoundError:
+            continue
+
+
+def cache_entries(root: str) -> List[Tuple[float, str, int]]:
+    """(last use, path, bytes) of every entry in the build cache"""
+    entries = []
+    for shard in os.scandir(root) if os.path.isdir(root) else []:
+        if len(shard.name) != 2 or not shard.is_dir():
+            continue
+        for entry in os.scandir(shard.path):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path, directory_size(entry.path)))
+            except FileNotFoundError:
+                continue
+    return entries
+
+
+def reclaim_directory(directory: str) -> None:
+    """Take a directory the compiler wrote as another uid back: owned by the judge, closed to others"""
+    for entry in os.scandir(directory):
+        os.chown(entry.path, 0, 0, follow_symlinks=False)
+    os.chown(directory, 0, 0)
+    os.chmod(directory, 0o700)
+
+
+def compile_source(language: str, source: str, directory: str, uid: int = JUDGE_RUN_UID) -> Build:
+    """
+    Write the source to directory and compile it as uid with CPU and memory limits;
+    Python is only syntax-checked
+    """
+    spec = LANGUAGES[language]
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, spec.source_name), "w") as file:
+        file.write(source)
+    if spec.compile_command is None:
+        try:
+            compile(source, spec.source_name, "exec")
+        except Exception as e:
+            # Not only SyntaxError: deep nesting raises RecursionError, long expressions MemoryError
+            return Build(directory, None, f"{type(e).__name__}: {e}")
+        return Build(directory, run_command(language, directory))
+    paths = {"src": os.path.join(directory, spec.source_name), "exe": os.path.join(directory, "solution")}
+    # The compiler parses untrusted input: it gets the directory and nothing of the judge's,
+    # not even its environment (DATABASE_URL)
+    os.chmod(paths["src"], 0o644)
+    os.chown(directory, uid, uid)
+    try:
+        result = subprocess.run(
+            [part.format(**paths) for part in spec.compile_command],
+            cwd=directory, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            timeout=JUDGE_COMPILE_SECONDS, preexec_fn=limit_compiler,
+            user=uid, group=uid, extra_groups=[],
+            env={"PATH": os.environ.get("PATH", os.defpath), "TMPDIR": directory, "LC_ALL": "C"},
+        )
+    except subprocess.TimeoutExpired:
+        return Build(directory, None, "compilation timed out")
+    finally:
+        reclaim_directory(directory)
+    if result.returncode != 0:
+        return Build(directory, None, result.stderr[-STDERR_TAIL:].decode(errors="replace"))
+    if not os.path.isfile(paths["exe"]) or os.path.islink(paths["exe"]):
+        return Build(directory, None, "the compiler produced no executable")
+    return Build(directory, run_command(language, directory))
+
+
+def feed_input(process: subprocess.Popen, data: Iterable[bytes]) -> None:
+    """Stream testcase input to stdin; the program may exit without reading all of it"""
+    try:
+        for part in data:
+            process.stdin.write(part)
+        process.stdin.close()
+    except (BrokenPipeError, ValueError, OSError):
+        pass
+
+
+def share_build(build: Build, uid: int) -> None:
+    """Let a solution running as uid read and run its build, but not change it or see other builds"""
+    os.chown(build.directory, 0, uid)
+    os.chmod(build.directory, 0o750)
+    for entry in os.scandir(build.directory):
+        if entry.is_file(follow_symlinks=False):
+            os.chown(entry.path, 0, uid)
+            os.chmod(entry.path, 0o750 if entry.name == "solution" else 0o640)
+
+
+def run_testcase(build: Build, input_data: Iterable[bytes], expected_output: Iterable[bytes],
+                 time_limit_ms: int, memory_limit_mb: int, uid: int = JUDGE_RUN_UID) -> RunResult:
+    """
+    Run the program on one testcase as uid, in a working directory of its own.
+    time_ms is CPU time (user + system), memory_mb the peak resident set size
+    """
+    wall_ms = max(round(time_limit_ms * JUDGE_WALL_FACTOR), 1000)
+    report_read, report_write = os.pipe()
+    with tempfile.TemporaryDirectory(dir=build.directory) as sandbox, \
+            tempfile.TemporaryFile(dir=build.directory) as stderr:
+        os.chown(sandbox, uid, uid)
+        try:
+            process = subprocess.Popen(
+                [runner_path(), str(report_write), str(uid), str(JUDGE_RUN_PROCESSES),
+                 str(math.ceil(time_limit_ms / 1000)), str(wall_ms),
+                 str(memory_limit_mb + JUDGE_MEMORY_SLACK_MB), str(JUDGE_OUTPUT_LIMIT_MB), *build.run_command],
+                cwd=sandbox, env={"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8"},
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr,
+                pass_fds=(report_write,), start_new_session=True,
+            )
+        finally:
+            os.close(report_write)
+        # The runner enforces the wall limit itself; this only guards against the runner hanging
+        watchdog = threading.Timer(wall_ms / 1000 + 5, process.kill)
+        writer = threading.Thread(target=feed_input, args=(process, input_data), daemon=True)
+        watchdog.start()
+        writer.start()
+        checker = OutputChecker(expected_output)
+        try:
+            descriptor = process.stdout.fileno()
+            while True:
+                part = os.read(descriptor, CHUNK_SIZE)
+                if not part:
+                    break
+                if not checker.feed(part):
+                    process.terminate()
+                    break
+            process.wait()
+            with os.fdopen(report_read, "rb") as report:
+                fields = report.read().split()
+        finally:
+            watchdog.cancel()
+            process.stdout.close()
+            writer.join()
+        if fields[:1] == [b"sandbox"]:
+            raise RuntimeError(f"Could not isolate the solution as uid {uid}: {os.strerror(int(fields[1]))}")
+        if len(fields) != 5:
+            return RunResult("time_limit", time_limit_ms, 0)
+        exit_code, timed_out, _, time_ms, memory_kb = map(int, fields)
+        memory_mb = math.ceil(memory_kb / 1024)
+        if timed_out or time_ms > time_limit_ms or exit_code == -signal.SIGXCPU:
+            return RunResult("time_limit", time_ms, memory_mb)
+        if memory_mb > memory_limit_mb:
+            return RunResult("memory_limit", time_ms, memory_mb)
+        if not checker.ok:
+            return RunResult("wrong_answer", time_ms, memory_mb)
+        if exit_code != 0:
+            stderr.seek(-min(STDERR_TAIL, os.fstat(stderr.fileno()).st_size), os.SEEK_END)
+            tail = stderr.read()
+            # Allocation refused by RLIMIT_AS before the resident set reached the limit
+            if b"MemoryError" in tail or b"bad_alloc" in tail:
+                return RunResult("memory_limit", time_ms, memory_mb)
+            return RunResult("runtime_error", time_ms, memory_mb)
+        if not checker.finish():
+            return RunResult("wrong_answer", time_ms, memory_mb)
+        return RunResult("accepted", time_ms, memory_mb)
+
+
+def judge(build: Build, testcases: Iterable[Tuple[TestData, TestData]], time_limit_ms: int,
+          memory_limit_mb: int, uid: int = JUDGE_RUN_UID) -> RunResult:
+    """
+    Run testcases (input, expected output) in order as uid and stop at the first failure.
+    The result carries the worst time and memory over the tests that ran
+    """
+    if build.error is not None:
+        return RunResult("compilation_error", 0, 0)
+    share_build(build, uid)
+    time_ms = memory_mb = 0
+    for input_data, expected_output in testcases:
+        result = run_testcase(build, input_data(), expected_output(), time_limit_ms, memory_limit_mb, uid)
+        time_ms, memory_mb = max(time_ms, result.time_ms), max(memory_mb, result.memory_mb)
+        if result.verdict != "accepted":
+            return RunResult(result.verdict, time_ms, memory_mb)
+    return RunResult("accepted", time_ms, memory_mb)
@@ -3,7 +3,7 @@ Pydantic schemas for request/response validation
 """
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from decimal import Decimal
 
 
@@ -43,6 +43,7 @@ class ContestBase(BaseModel):
     contest_type: str = Field(..., pattern="^(ACM_ICPC|Codeforces|IOI)$")
     start_time: datetime
     duration_minutes: int = Field(..., gt=0)
+    freeze_minutes: Optional[int] = Field(None, gt=0)
 
 class ContestCreate(ContestBase):
     created_by: int
@@ -53,12 +54,16 @@ class ContestUpdate(BaseModel):
     status: Optional[str] = Field(None, pattern="^(upcoming|running|finished)$")
     start_time: Optional[datetime] = None
     duration_minutes: Optional[int] = Field(None, gt=0)
+    freeze_minutes: Optional[int] = Field(None, gt=0)
 
 class ContestResponse(ContestBase):
     contest_id: int
     status: str
     created_by: int
     created_at: datetime
+    freeze_time: Optional[datetime] = None
+    frozen_at: Optional[datetime] = None
+    unfrozen_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -120,6 +125,67 @@ class SubmissionResponse(SubmissionBase):
         from_attributes = True
 
 
+# Judge queue schemas
+class JudgeClaimRequest(BaseModel):
+    judge_id: str = Field(..., min_length=1, max_length=64)
+    limit: int = Field(default=10, ge=1, le=100)
+    # Only submissions in these languages; None: any
+    languages: Optional[List[str]] = Field(default=None, min_length=1)
+
+class JudgeTask(BaseModel):
+    submission_id: int
+    contest_id: int
+    problem_id: int
+    user_id: int
+    language: str
+    source_code: str
+    submitted_at: datetime
+    lease_expires_at: datetime
+    attempts: int
+
+    class Config:
+        from_attributes = True
+
+class JudgeHeartbeatRequest(BaseModel):
+    judge_id: str = Field(..., min_length=1, max_length=64)
+    submission_ids: List[int] = Field(..., max_length=1000)
+
+class JudgeLeaseResponse(BaseModel):
+    submission_id: int
+    lease_expires_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class JudgeResult(BaseModel):
+    submission_id: int
+    verdict: str = Field(..., pattern="^(accepted|wrong_answer|time_limit|memory_limit|runtime_error|compilation_error)$")
+    execution_time_ms: Optional[int] = Field(None, ge=0)
+    memory_used_mb: Optional[Decimal] = Field(None, ge=0)
+    score: int = Field(default=0, ge=0)
+
+class JudgeResultsRequest(BaseModel):
+    judge_id: str = Field(..., min_length=1, max_length=64)
+    results: List[JudgeResult] = Field(..., max_length=1000)
+
+class JudgeResultsResponse(BaseModel):
+    applied: List[int]
+    rejected: List[int]
+
+class JudgeQueueStatus(BaseModel):
+    pending: int
+    # Pending submissions of contest rejudges, handed out after the rest
+    rejudge: int
+    leased: int
+    expired: int
+    # Claimed JUDGE_MAX_ATTEMPTS times without a verdict: no longer handed out
+    exhausted: int
+    oldest_pending_seconds: Optional[float] = None
+
+    class Config:
+        from_attributes = True
+
+
 # Tag Schemas
 class TagBase(BaseModel):
     tag_name: str = Field(..., max_length=50)
@@ -149,11 +215,34 @@ class TestcaseCreate(TestcaseBase):
 
 class TestcaseResponse(TestcaseBase):
     testcase_id: int
+    input_size: int
+    output_size: int
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+# Testcase without its data; large tests are read with GET /testcases/{id}/input and /output
+class TestcaseInfo(BaseModel):
+    testcase_id: int
+    problem_id: int
+    is_sample: bool
+    test_order: int
+    input_size: int
+    output_size: int
+    # In testcase_chunks rather than in the row
+    chunked: bool
+    created_at: datetime
+
+class TestcaseUploadResponse(BaseModel):
+    testcase_id: int
+    part: str
+    size: int
+    chunks: int
+    # Chunks not stored before (by this or any other test) and their compressed size
+    new_chunks: int
+    stored_bytes: int
+
 
 # Standing Schemas
 class StandingResponse(BaseModel):
@@ -170,9 +259,74 @@ class StandingResponse(BaseModel):
         from_attributes = True
 
 
+class StandingsReplayStep(BaseModel):
+    step: int
+    submission_id: int
+    user_id: int
+    problem_id: int
+    submitted_at: datetime
+    verdict: str
+    total_score: int
+    problems_solved: int
+    penalty_time: int
+    previous_rank: Optional[int] = None
+    rank: Optional[int] = None
+
+class ContestResolveResponse(BaseModel):
+    contest_id: int
+    freeze_time: datetime
+    unfrozen_at: datetime
+    steps: List[StandingsReplayStep]
+
+
+# Rejudge Schemas: filters left out match any value
+class RejudgeRequest(BaseModel):
+    problem_id: Optional[int] = None
+    user_id: Optional[int] = None
+    verdict: Optional[str] = Field(None, pattern="^(accepted|wrong_answer|time_limit|memory_limit|runtime_error|compilation_error)$")
+
+class RejudgeJobResponse(BaseModel):
+    job_id: int
+    contest_id: int
+    problem_id: Optional[int] = None
+    user_id: Optional[int] = None
+    verdict: Optional[str] = None
+    status: str
+    total_submissions: int
+    judged: int
+    pending: int
+    # Current verdicts of the rejudged submissions
+    verdicts: Dict[str, int]
+    submissions_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+# Batch import row schemas (copy mode): create schemas plus archived fields
+class UserImport(UserCreate):
+    is_active: bool = True
+    registration_date: Optional[datetime] = None
+
+class ContestImport(ContestCreate):
+    status: str = Field(default="upcoming", pattern="^(upcoming|running|finished)$")
+
+class ProblemImport(ProblemCreate):
+    pass
+
+class SubmissionImport(SubmissionCreate):
+    verdict: str = Field(default="pending", pattern="^(pending|accepted|wrong_answer|time_limit|memory_limit|runtime_error|compilation_error)$")
+    execution_time_ms: Optional[int] = Field(None, ge=0)
+    memory_used_mb: Optional[Decimal] = Field(None, ge=0)
+    score: int = Field(default=0, ge=0)
+    submitted_at: Optional[datetime] = None
+
+
 # Batch Import Schema
 class BatchImportRequest(BaseModel):
     entity_type: str = Field(..., pattern="^(users|contests|problems|submissions)$")
+    mode: str = Field(default="orm", pattern="^(orm|copy)$")
+    chunk_size: int = Field(default=100, ge=1, le=10000)
     data: List[dict]
 
 class BatchImportResponse(BaseModel):
@@ -180,3 +334,31 @@ class BatchImportResponse(BaseModel):
     success: int
     failed: int
     errors: List[dict]
+
+
+class BatchJobResponse(BaseModel):
+    job_id: int
+    entity_type: str
+    mode: str
+    status: str
+    total_rows: int
+    rows_done: int
+    rows_success: int
+    rows_failed: int
+    rows_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    errors: List[dict]
+    error_message: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+
+# Snapshot Export Schema
+class SnapshotExportRequest(BaseModel):
+    contest_from: int = Field(..., ge=1)
+    contest_to: int = Field(..., ge=1)
+    format: str = Field(default="parquet", pattern="^(parquet|arrow)$")
+    incremental: bool = True
+    include_source: bool = False
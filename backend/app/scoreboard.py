@@ -0,0 +1,255 @@
+"""
+Live scoreboard push over Server-Sent Events: each viewer gets a standings
+snapshot, then delta frames with only the rows that changed. Standings are
+re-read once per contest per change notification (see app/cache.py) and the
+encoded frames are shared by all of the contest's subscribers.
+"""
+from collections import deque
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+from typing import Callable, Dict, List, Optional, Set
+from app.cache import cache_listener
+from app.responses import json_default
+import asyncio
+import logging
+import orjson
+import os
+
+logger = logging.getLogger(__name__)
+
+# Frames a subscriber may fall behind by; past that its queue is replaced by one fresh snapshot
+SCOREBOARD_STREAM_QUEUE = int(os.getenv("SCOREBOARD_STREAM_QUEUE", "16"))
+# Keep-alive comment interval; without a connected change listener feeds are also re-read this often
+SCOREBOARD_STREAM_PING_SECONDS = float(os.getenv("SCOREBOARD_STREAM_PING_SECONDS", "15"))
+
+# Columns sent for a row whose participant was already on the board with the same name
+DELTA_FIELDS = ("user_id", "total_score", "problems_solved", "penalty_time", "rank")
+# Not streamed: changes with every submission even when the score does not
+UNTRACKED_FIELDS = ("last_updated",)
+PING_FRAME = b": ping\n\n"
+
+
+def sse_frame(event: str, seq: int, data: dict) -> bytes:
+    return b"event: %s\nid: %d\ndata: %s\n\n" % (event.encode(), seq, orjson.dumps(data, default=json_default))
+
+
+class Subscriber:
+    """Frames not yet sent to one viewer of a feed"""
+
+    __slots__ = ("feed", "frames", "wakeup", "resync")
+
+    def __init__(self, feed: "ContestFeed"):
+        self.feed = feed
+        self.frames = deque()
+        self.wakeup = asyncio.Event()
+        # Send a snapshot next (a new or lagging subscriber) instead of the queued deltas
+        self.resync = True
+
+    def push(self, frame: bytes) -> bool:
+        """Queue a frame; False when the subscriber fell too far behind and will resync"""
+        overflow = len(self.frames) >= SCOREBOARD_STREAM_QUEUE
+        if overflow:
+            self.frames.clear()
+            self.resync = True
+        else:
+            self.frames.append(frame)
+        self.wakeup.set()
+        return not overflow
+
+
+class ContestFeed:
+    """Last read standings of one contest and its subscribers"""
+
+    def __init__(self, contest_id: int):
+        self.contest_id = contest_id
+        self.subscribers: Set[Subscriber] = set()
+        self.rows: List[dict] = []
+        self.rows_by_user: Dict[int, dict] = {}
+        self.exists = False
+        self.seq = 0
+        self.snapshot: Optional[bytes] = None
+        self.loaded = asyncio.Event()
+        self.error: Optional[Exception] = None
+        self.dirty = True
+        self.task: Optional[asyncio.Task] = None
+
+    def snapshot_frame(self) -> bytes:
+        if self.snapshot is None:
+            self.snapshot = sse_frame("snapshot", self.seq, {"contest_id": self.contest_id, "seq": self.seq,
+                                                             "rows": self.rows})
+        return self.snapshot
+
+    def apply(self, rows: Optional[List[dict]]) -> Optional[bytes]:
+        """Take newly read rows (None: no such contest); the delta frame, if anything visible changed"""
+        self.exists = rows is not None
+        rows = rows or []
+        rows_by_user = {row["user_id"]: row for row in rows}
+        changed = []
+        for user_id, row in rows_by_user.items():
+            old = self.rows_by_user.get(user_id)
+            if old is None or any(old[key] != value for key, value in row.items()
+                                  if key not in DELTA_FIELDS and key not in UNTRACKED_FIELDS):
+                changed.append(row)
+            elif any(old[key] != row[key] for key in DELTA_FIELDS):
+                changed.append({key: row[key] for key in DELTA_FIELDS})
+        removed = [user_id for user_id in self.rows_by_user if user_id not in rows_by_user]
+        self.rows, self.rows_by_user, self.snapshot = rows, rows_by_user, None
+        if not (changed or removed) or not self.loaded.is_set():
+            return None
+        self.seq += 1
+        return sse_frame("delta", self.seq, {"contest_id": self.contest_id, "seq": self.seq,
+                                             "rows": changed, "removed": removed})
+
+
+class ScoreboardHub:
+    """
+    Per-contest feeds fed by the analytics_changes listener. read(contest_id)
+    returns the standings rows ordered by rank, or None when there is no such
+    contest; it runs in the threadpool, once per change however many watch.
+    """
+
+    def __init__(self, read: Callable[[int], Optional[List[dict]]]):
+        self.read = read
+        self.feeds: Dict[int, ContestFeed] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.ping_task: Optional[asyncio.Task] = None
+        self.reads = 0
+        self.frames = 0
+        self.resyncs = 0
+
+    def start(self) -> None:
+        """Call from the event loop before cache_listener.start()"""
+        self.loop = asyncio.get_running_loop()
+        cache_listener.add_handler(self.notify)
+        self.ping_task = self.loop.create_task(self.ping_loop())
+
+    async def stop(self) -> None:
+        if self.ping_task is not None:
+            self.ping_task.cancel()
+            self.ping_task = None
+
+    def notify(self, payloads: Optional[Set[str]]) -> None:
+        """Listener thread: hand the contests a notification batch touches over to the event loop"""
+        contests = None if payloads is None else set()
+        for payload in payloads or ():
+            table, _, key = payload.partition(":")
+            if table in ("submissions", "standings", "contests") and key:
+                contests.add(int(key))
+            elif table == "users":
+                # Names on every board
+                contests = None
+                break
+        if self.loop is not None and contests != set():
+            self.loop.call_soon_threadsafe(self.mark_dirty, contests)
+
+    def mark_dirty(self, contests: Optional[Set[int]]) -> None:
+        """Re-read the feeds of contests (None: all); changes arriving during a read coalesce into one more"""
+        for contest_id in (self.feeds if contests is None else contests & self.feeds.keys()):
+            feed = self.feeds[contest_id]
+            feed.dirty = True
+            if feed.task is None:
+                feed.task = self.loop.create_task(self.refresh(feed))
+
+    async def refresh(self, feed: ContestFeed) -> None:
+        try:
+            while feed.dirty:
+                feed.dirty = False
+                rows = await run_in_threadpool(self.read, feed.contest_id)
+                self.reads += 1
+                frame = feed.apply(rows)
+                if frame is not None:
+                    self.broadcast(feed, frame)
+        except Exception as e:
+            logger.error(f"Scoreboard refresh of contest {feed.contest_id} failed: {str(e)}")
+            if not feed.loaded.is_set():
+                feed.error = e
+                self.feeds.pop(feed.contest_id, None)
+        finally:
+            feed.task = None
+            feed.loaded.set()
+
+    def broadcast(self, feed: ContestFeed, frame: bytes) -> None:
+        for subscriber in feed.subscribers:
+            if not subscriber.push(frame):
+                self.resyncs += 1
+        self.frames += len(feed.subscribers)
+
+    async def subscribe(self, contest_id: int) -> Optional[Subscriber]:
+        """
+        Subscriber of the contest's loaded feed, None when there is no such contest.
+        The subscriber is registered together with the feed, so a feed never outlives
+        its viewers: the caller must unsubscribe() (ScoreboardResponse does).
+        """
+        feed = self.feeds.get(contest_id)
+        if feed is None:
+            feed = self.feeds[contest_id] = ContestFeed(contest_id)
+            feed.task = self.loop.create_task(self.refresh(feed))
+        subscriber = Subscriber(feed)
+        feed.subscribers.add(subscriber)
+        try:
+            await feed.loaded.wait()
+            if feed.error is not None:
+                raise feed.error
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+        if not feed.exists:
+            self.unsubscribe(subscriber)
+            return None
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """Drop the subscriber, and its feed with the last one; safe to call twice"""
+        feed = subscriber.feed
+        feed.subscribers.discard(subscriber)
+        if not feed.subscribers and self.feeds.get(feed.contest_id) is feed:
+            del self.feeds[feed.contest_id]
+
+    async def stream(self, subscriber: Subscriber):
+        """SSE body: a snapshot event, then delta events (or a new snapshot after falling behind)"""
+        feed = subscriber.feed
+        while True:
+            if subscriber.resync:
+                # Deltas queued so far are all in the snapshot
+                subscriber.resync = False
+                subscriber.frames.clear()
+                yield feed.snapshot_frame()
+            elif subscriber.frames:
+                yield subscriber.frames.popleft()
+            else:
+                subscriber.wakeup.clear()
+                await subscriber.wakeup.wait()
+
+    async def ping_loop(self) -> None:
+        while True:
+            await asyncio.sleep(SCOREBOARD_STREAM_PING_SECONDS)
+            if not cache_listener.connected:
+                self.mark_dirty(None)
+            for feed in self.feeds.values():
+                for subscriber in feed.subscribers:
+                    subscriber.push(PING_FRAME)
+
+    def status(self) -> dict:
+        return {
+            "contests": len(self.feeds),
+            "subscribers": sum(len(feed.subscribers) for feed in self.feeds.values()),
+            "reads": self.reads,
+            "frames": self.frames,
+            "resyncs": self.resyncs,
+        }
+
+
+class ScoreboardResponse(StreamingResponse):
+    """SSE response of one subscriber; unsubscribes however the response ends, even before the body starts"""
+
+    def __init__(self, hub: ScoreboardHub, subscriber: Subscriber):
+        super().__init__(hub.stream(subscriber), media_type="text/event-stream",
+                         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        self.hub = hub
+        self.subscriber = subscriber
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.hub.unsubscribe(self.subscriber)
@@ -0,0 +1,237 @@
+"""
+Columnar (Parquet / Arrow IPC) snapshots of contest data for offline analysis
+
+Usage (from the backend directory):
+    python -m app.snapshot_export 1 20 --format parquet --out snapshots/research
+"""
+from sqlalchemy import Boolean, DECIMAL, Integer, String, Text, TIMESTAMP, select, text
+from sqlalchemy.engine import Connection
+from datetime import datetime
+from typing import Iterator, Optional
+from app.database import engine
+from app.models import ContestProblem, Standing, Submission, User
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+# Rows per server-side cursor fetch and per row group / record batch
+SNAPSHOT_EXPORT_BATCH_ROWS = int(os.getenv("SNAPSHOT_EXPORT_BATCH_ROWS", "50000"))
+SNAPSHOT_EXPORT_DIR = os.getenv("SNAPSHOT_EXPORT_DIR", "snapshots")
+SNAPSHOT_FORMATS = {"parquet": "parquet", "arrow": "arrow"}
+COMPRESSION = "zstd"
+MANIFEST = "manifest.json"
+# Written into the manifest and the CLI help: what an incremental export does not pick up
+APPEND_ONLY_NOTE = (
+    "Incremental exports append submissions with submission_id above last_submission_id only. "
+    "Verdict changes of exported submissions (rejudges) and submissions committed after a higher "
+    "submission_id was exported are not picked up; run a full export to include them."
+)
+
+
+class SnapshotExportError(Exception):
+    """The export cannot run with these parameters (e.g. they differ from the existing snapshot)"""
+
+
+class SnapshotExportBusy(SnapshotExportError):
+    """Another export into the same directory is running"""
+
+
+def arrow_type(column_type):
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, DECIMAL):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, TIMESTAMP):
+        return pa.timestamp("us")
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, (String, Text)):
+        return pa.string()
+    raise TypeError(f"No Arrow type for {column_type!r}")
+
+
+def snapshot_tables(contest_from: int, contest_to: int, after_submission_id: int, include_source: bool) -> dict:
+    """Columns and query of each snapshot table; email is left out, source_code on request"""
+    in_range = lambda model: model.contest_id.between(contest_from, contest_to)
+    submission_columns = [column for column in Submission.__table__.columns
+                          if include_source or column.name != "source_code"]
+    user_columns = [column for column in User.__table__.columns if column.name != "email"]
+    contest_users = select(Submission.user_id).where(in_range(Submission)).distinct()
+    return {
+        "submissions": select(*submission_columns)
+            .where(in_range(Submission), Submission.submission_id > after_submission_id)
+            .order_by(Submission.submission_id),
+        "standings": select(*Standing.__table__.columns)
+            .where(in_range(Standing)).order_by(Standing.contest_id, Standing.standing_id),
+        "contest_problems": select(*ContestProblem.__table__.columns)
+            .where(in_range(ContestProblem)).order_by(ContestProblem.contest_id, ContestProblem.problem_order),
+        "users": select(*user_columns)
+            .where(User.user_id.in_(contest_users)).order_by(User.user_id),
+    }
+
+
+def query_schema(query) -> pa.Schema:
+    return pa.schema([pa.field(column.name, arrow_type(column.type)) for column in query.selected_columns])
+
+
+def record_batches(connection: Connection, query, schema: pa.Schema) -> Iterator[pa.RecordBatch]:
+    """Rows of query read from a server-side cursor, one record batch per fetch"""
+    result = connection.execution_options(stream_results=True, yield_per=SNAPSHOT_EXPORT_BATCH_ROWS).execute(query)
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+
+def write_file(path: str, fmt: str, schema: pa.Schema, batches: Iterator[pa.RecordBatch]) -> int:
+    """Write batches to path via a temporary file, so readers never see a partial file; returns the row count"""
+    temporary = f"{path}.tmp"
+    rows = 0
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(temporary, schema, compression=COMPRESSION)
+    else:
+        writer = pa.ipc.new_file(temporary, schema, options=pa.ipc.IpcWriteOptions(compression=COMPRESSION))
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            rows += batch.num_rows
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(temporary)
+        raise
+    os.replace(temporary, path)
+    return rows
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest:
+        return json.load(manifest)
+
+
+def export_snapshot(contest_from: int, contest_to: int, fmt: str = "parquet", directory: Optional[str] = None,
+                    incremental: bool = True, include_source: bool = False) -> dict:
+    """
+    Export submissions, standings, contest_problems and users of contests
+    contest_from..contest_to into directory, one file per table.
+
+    All tables are read in one REPEATABLE READ transaction, so they are
+    consistent with each other. Submissions are written as numbered part
+    files (submissions/part-NNNNN.*): an incremental export appends a part with
+    the submissions whose submission_id is above the last exported one; the
+    other tables are small and are rewritten. The parts are append-only (see
+    APPEND_ONLY_NOTE): rejudged submissions keep their id, and a submission
+    whose transaction commits after a higher id was exported stays below the
+    watermark, so both need a full export (incremental=False).
+    Read the result with pyarrow.dataset.dataset(directory/submissions, format=...).
+    """
+    if fmt not in SNAPSHOT_FORMATS:
+        raise SnapshotExportError(f"Unsupported format: {fmt}")
+    if contest_from > contest_to:
+        raise SnapshotExportError("contest_from must not exceed contest_to")
+    directory = directory or os.path.join(SNAPSHOT_EXPORT_DIR, f"contests_{contest_from}_{contest_to}_{fmt}")
+    extension = SNAPSHOT_FORMATS[fmt]
+    params = {"format": fmt, "contest_from": contest_from, "contest_to": contest_to, "include_source": include_source}
+    start = time.perf_counter()
+
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as connection:
+        # One export per directory at a time, across processes
+        locked = connection.execute(text("SELECT pg_try_advisory_xact_lock(hashtext(:key))"),
+                                    {"key": f"snapshot_export:{os.path.abspath(directory)}"}).scalar()
+        if not locked:
+            raise SnapshotExportBusy(f"An export into {directory} is already running")
+
+        manifest = read_manifest(directory) if incremental else None
+        if manifest is not None and any(manifest[key] != value for key, value in params.items()):
+            raise SnapshotExportError(
+                f"{directory} holds a snapshot with different parameters; export with incremental=False to replace it")
+        parts_dir = os.path.join(directory, "submissions")
+        if manifest is None:
+            # A full export that fails midway must not leave a manifest describing removed parts
+            if os.path.exists(os.path.join(directory, MANIFEST)):
+                os.remove(os.path.join(directory, MANIFEST))
+            shutil.rmtree(parts_dir, ignore_errors=True)
+            manifest = {**params, "last_submission_id": 0, "parts": 0, "exports": []}
+        os.makedirs(parts_dir, exist_ok=True)
+
+        tables = snapshot_tables(contest_from, contest_to, manifest["last_submission_id"], include_source)
+        result = {}
+        for name, query in tables.items():
+            schema = query_schema(query)
+            if name == "submissions":
+                path = os.path.join(parts_dir, f"part-{manifest['parts']:05d}.{extension}")
+                last_id = manifest["last_submission_id"]
+
+                def tracked(batches):
+                    nonlocal last_id
+                    for batch in batches:
+                        last_id = batch.column("submission_id")[-1].as_py()
+                        yield batch
+
+                rows = write_file(path, fmt, schema, tracked(record_batches(connection, query, schema)))
+                if rows:
+                    manifest["parts"] += 1
+                    manifest["last_submission_id"] = last_id
+                    result[name] = {"rows": rows, "bytes": os.path.getsize(path)}
+                else:
+                    # Nothing new: do not leave an empty part behind
+                    os.remove(path)
+                    result[name] = {"rows": 0, "bytes": 0}
+            else:
+                path = os.path.join(directory, f"{name}.{extension}")
+                rows = write_file(path, fmt, schema, record_batches(connection, query, schema))
+                result[name] = {"rows": rows, "bytes": os.path.getsize(path)}
+            logger.info(f"Snapshot export: {name} {rows} rows")
+
+        manifest["append_only"] = APPEND_ONLY_NOTE
+        manifest["exports"].append({"exported_at": datetime.now().isoformat(), "submissions": result["submissions"]["rows"]})
+        with open(os.path.join(directory, f"{MANIFEST}.tmp"), "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(os.path.join(directory, f"{MANIFEST}.tmp"), os.path.join(directory, MANIFEST))
+
+    return {
+        **params,
+        "directory": directory,
+        "incremental": len(manifest["exports"]) > 1,
+        "last_submission_id": manifest["last_submission_id"],
+        "submission_parts": manifest["parts"],
+        "tables": result,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export contest data to Parquet or Arrow IPC files",
+                                     epilog=APPEND_ONLY_NOTE)
+    parser.add_argument("contest_from", type=int)
+    parser.add_argument("contest_to", type=int)
+    parser.add_argument("--format", choices=list(SNAPSHOT_FORMATS), default="parquet")
+    parser.add_argument("--out", help=f"output directory (default: under {SNAPSHOT_EXPORT_DIR})")
+    parser.add_argument("--full", action="store_true",
+                        help="replace the snapshot instead of appending new submissions; "
+                             "needed to pick up rejudges and late-committed submissions")
+    parser.add_argument("--include-source", action="store_true", help="export submissions.source_code")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        summary = export_snapshot(args.contest_from, args.contest_to, args.format, args.out,
+                                  incremental=not args.full, include_source=args.include_source)
+    except SnapshotExportError as e:
+        parser.exit(1, f"error: {e}\n")
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Testcase blob store: tests larger than TESTCASE_INLINE_KB are split into chunks of
+chunk_size bytes, compressed with zlib and stored once per SHA-256 of the content
+in testcase_chunks, so equal tests of different problems share their chunks.
+A test (or a byte range of it) is read as a stream, a few chunks per query
+"""
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from sqlalchemy import text
+from app.database import engine
+import hashlib
+import os
+import threading
+import zlib
+
+TESTCASE_CHUNK_KB = int(os.getenv("TESTCASE_CHUNK_KB", "1024"))
+# Tests up to this size stay in the testcases row
+TESTCASE_INLINE_KB = int(os.getenv("TESTCASE_INLINE_KB", "64"))
+TESTCASE_COMPRESS_LEVEL = int(os.getenv("TESTCASE_COMPRESS_LEVEL", "6"))
+# Chunks written or read per query; a stream holds at most this many chunks in memory
+TESTCASE_FETCH_CHUNKS = int(os.getenv("TESTCASE_FETCH_CHUNKS", "4"))
+
+# Part name -> (inline column, chunks column, size column)
+PARTS = {
+    "input": ("input_data", "input_chunks", "input_size"),
+    "output": ("expected_output", "output_chunks", "output_size"),
+}
+
+# Marks the chunks that already exist as used, so the orphan collector keeps them
+TOUCH_CHUNKS_QUERY = text("""
+    UPDATE testcase_chunks SET last_used_at = CURRENT_TIMESTAMP
+    WHERE chunk_hash = ANY(CAST(:hashes AS BYTEA[]))
+    RETURNING chunk_hash
+""")
+INSERT_CHUNKS_QUERY = text("""
+    INSERT INTO testcase_chunks (chunk_hash, data, raw_size)
+    SELECT * FROM unnest(CAST(:hashes AS BYTEA[]), CAST(:data AS BYTEA[]), CAST(:sizes AS INTEGER[]))
+    ON CONFLICT (chunk_hash) DO UPDATE SET last_used_at = CURRENT_TIMESTAMP
+""")
+READ_CHUNKS_QUERY = text("""
+    SELECT chunk_hash, data FROM testcase_chunks WHERE chunk_hash = ANY(CAST(:hashes AS BYTEA[]))
+""")
+DELETE_ORPHANS_QUERY = text("SELECT delete_orphan_testcase_chunks()")
+
+
+class ChunkWriter:
+    """
+    Split a byte stream into chunks and store the ones not yet in testcase_chunks.
+    write() only buffers; flush() hashes, compresses and writes the buffered chunks,
+    so an async caller can run it in a thread once the writer is full
+    """
+
+    def __init__(self, db, chunk_size: int):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.pending: List[bytes] = []
+        self.hashes: List[bytes] = []
+        self.size = 0
+        self.new_chunks = 0
+        self.stored_bytes = 0
+
+    @property
+    def full(self) -> bool:
+        return len(self.pending) >= TESTCASE_FETCH_CHUNKS
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+        self.size += len(data)
+        while len(self.buffer) >= self.chunk_size:
+            self.pending.append(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        digests = [hashlib.sha256(chunk).digest() for chunk in self.pending]
+        self.hashes += digests
+        existing = {bytes(row.chunk_hash) for row in self.db.execute(TOUCH_CHUNKS_QUERY, {"hashes": digests})}
+        new = {}
+        for digest, chunk in zip(digests, self.pending):
+            if digest not in existing:
+                new.setdefault(digest, chunk)
+        if new:
+            data = [zlib.compress(chunk, TESTCASE_COMPRESS_LEVEL) for chunk in new.values()]
+            self.db.execute(INSERT_CHUNKS_QUERY, {
+                "hashes": list(new), "data": data, "sizes": [len(chunk) for chunk in new.values()],
+            })
+            self.new_chunks += len(new)
+            self.stored_bytes += sum(map(len, data))
+        self.pending.clear()
+
+    def close(self) -> List[bytes]:
+        """Store the rest; returns the chunk hashes of the whole stream in order"""
+        if self.buffer:
+            self.pending.append(bytes(self.buffer))
+            self.buffer.clear()
+        self.flush()
+        return self.hashes
+
+
+def store_text(db, value: str, chunk_size: int) -> Tuple[Optional[str], Optional[List[bytes]], int]:
+    """(inline text, chunk hashes, size in bytes) of a test given as text; one of the first two is None"""
+    data = value.encode()
+    if len(data) <= TESTCASE_INLINE_KB * 1024:
+        return value, None, len(data)
+    writer = ChunkWriter(db, chunk_size)
+    for start in range(0, len(data), chunk_size):
+        writer.write(data[start:start + chunk_size])
+        if writer.full:
+            writer.flush()
+    return None, writer.close(), len(data)
+
+
+class ChunkCache:
+    """
+    Process-local LRU of compressed chunks, bounded by limit_mb. A chunk never
+    changes under its hash, so entries are never stale; 0 disables the cache
+    """
+
+    def __init__(self, limit_mb: int):
+        self.limit = limit_mb * 1024 * 1024
+        self.chunks: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_many(self, hashes: Sequence[bytes]) -> Dict[bytes, bytes]:
+        found = {}
+        with self.lock:
+            for digest in hashes:
+                data = self.chunks.get(digest)
+                if data is None:
+                    self.misses += 1
+                    continue
+                self.hits += 1
+                self.chunks.move_to_end(digest)
+                found[digest] = data
+        return found
+
+    def put(self, digest: bytes, data: bytes) -> None:
+        if len(data) > self.limit:
+            return
+        with self.lock:
+            if digest in self.chunks:
+                return
+            self.chunks[digest] = data
+            self.size += len(data)
+            while self.size > self.limit:
+                _, evicted = self.chunks.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def read_chunks(hashes: Sequence[bytes], cache: Optional[ChunkCache] = None) -> Dict[bytes, bytes]:
+    """Compressed chunks by hash: from the cache, the rest with one query"""
+    found = cache.get_many(hashes) if cache is not None else {}
+    missing = [digest for digest in dict.fromkeys(hashes) if digest not in found]
+    if missing:
+        with engine.connect() as connection:
+            for row in connection.execute(READ_CHUNKS_QUERY, {"hashes": missing}):
+                digest, data = bytes(row.chunk_hash), bytes(row.data)
+                found[digest] = data
+                if cache is not None:
+                    cache.put(digest, data)
+    return found
+
+
+def iter_chunks(hashes: Sequence[bytes], chunk_size: int, start: int = 0, end: Optional[int] = None,
+                cache: Optional[ChunkCache] = None) -> Iterator[bytes]:
+    """Bytes [start, end) of a chunked test (end None: to the end); only the chunks covering the range are read"""
+    first = start // chunk_size
+    last = len(hashes) if end is None else min(len(hashes), -(-end // chunk_size))
+    for batch_start in range(first, last, TESTCASE_FETCH_CHUNKS):
+        batch = hashes[batch_start:min(batch_start + TESTCASE_FETCH_CHUNKS, last)]
+        found = read_chunks(batch, cache)
+        for number, digest in enumerate(batch, batch_start):
+            if digest not in found:
+                raise LookupError(f"Testcase chunk {digest.hex()} is missing")
+            data = zlib.decompress(found[digest])
+            offset = number * chunk_size
+            yield data[max(start - offset, 0):len(data) if end is None else end - offset]
@@ -3,7 +3,14 @@
 -- ============================================================================================
 
 -- Очистка БД
+DROP TABLE IF EXISTS testcase_chunks CASCADE;
+DROP TABLE IF EXISTS rejudge_jobs CASCADE;
+DROP TABLE IF EXISTS judge_leases CASCADE;
+DROP TABLE IF EXISTS frozen_standings CASCADE;
+DROP TABLE IF EXISTS analytics_snapshots CASCADE;
+DROP TABLE IF EXISTS batch_jobs CASCADE;
 DROP TABLE IF EXISTS audit_log CASCADE;
+DROP TABLE IF EXISTS standing_problems CASCADE;
 DROP TABLE IF EXISTS problem_tags CASCADE;
 DROP TABLE IF EXISTS tags CASCADE;
 DROP TABLE IF EXISTS standings CASCADE;
@@ -41,9 +48,18 @@ CREATE TABLE contests (
     start_time TIMESTAMP NOT NULL,
     duration_minutes INTEGER NOT NULL CHECK (duration_minutes > 0),
     created_by INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
-    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    freeze_minutes INTEGER CHECK (freeze_minutes > 0 AND freeze_minutes <= duration_minutes),
+    freeze_time TIMESTAMP GENERATED ALWAYS AS
+        (start_time + (duration_minutes - freeze_minutes) * INTERVAL '1 minute') STORED,
+    frozen_at TIMESTAMP,
+    unfrozen_at TIMESTAMP
 );
 
+COMMENT ON COLUMN contests.freeze_minutes IS 'Заморозка публичной турнирной таблицы за столько минут до конца (NULL - без заморозки)';
+COMMENT ON COLUMN contests.frozen_at IS 'Когда снят снимок frozen_standings';
+COMMENT ON COLUMN contests.unfrozen_at IS 'Когда таблица разморожена (resolve); с этого момента публичная таблица снова живая';
+
 -- ================================================
 -- ТАБЛИЦА 3: Problems (Задачи)
 -- ================================================
@@ -73,15 +89,24 @@ CREATE TABLE contest_problems (
 -- ================================================
 -- ТАБЛИЦА 5: Testcases (Тестовые данные для задач)
 -- ================================================
+-- Небольшие тесты хранятся в строке (input_data, expected_output), большие - в
+-- testcase_chunks: *_chunks - хеши кусков по chunk_size байт по порядку, *_size - длина в байтах
 CREATE TABLE testcases (
     testcase_id SERIAL PRIMARY KEY,
     problem_id INTEGER NOT NULL REFERENCES problems(problem_id) ON DELETE CASCADE,
-    input_data TEXT NOT NULL,
-    expected_output TEXT NOT NULL,
+    input_data TEXT,
+    expected_output TEXT,
+    input_chunks BYTEA[],
+    output_chunks BYTEA[],
+    input_size BIGINT CHECK (input_size >= 0),
+    output_size BIGINT CHECK (output_size >= 0),
+    chunk_size INTEGER NOT NULL DEFAULT 1048576 CHECK (chunk_size > 0),
     is_sample BOOLEAN NOT NULL DEFAULT FALSE,
     test_order INTEGER NOT NULL CHECK (test_order > 0),
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE (problem_id, test_order)
+    UNIQUE (problem_id, test_order),
+    CHECK ((input_data IS NULL) <> (input_chunks IS NULL)),
+    CHECK ((expected_output IS NULL) <> (output_chunks IS NULL))
 );
 
 -- ================================================
@@ -100,7 +125,9 @@ CREATE TABLE submissions (
     execution_time_ms INTEGER CHECK (execution_time_ms >= 0),
     memory_used_mb DECIMAL(10,2) CHECK (memory_used_mb >= 0),
     score INTEGER DEFAULT 0 CHECK (score >= 0),
-    submitted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    submitted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Последняя перепроверка посылки (внешний ключ ниже, после rejudge_jobs)
+    rejudge_job_id INTEGER
 );
 
 -- ================================================
@@ -113,7 +140,6 @@ CREATE TABLE standings (
     total_score INTEGER NOT NULL DEFAULT 0 CHECK (total_score >= 0),
     problems_solved INTEGER NOT NULL DEFAULT 0 CHECK (problems_solved >= 0),
     penalty_time INTEGER NOT NULL DEFAULT 0 CHECK (penalty_time >= 0),
-    rank INTEGER CHECK (rank > 0),
     last_updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     UNIQUE (contest_id, user_id)
 );
@@ -151,6 +177,158 @@ CREATE TABLE audit_log (
     changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
+-- ================================================
+-- ТАБЛИЦА 11: Standing_Problems (Состояние решения задачи участником)
+-- ================================================
+-- Одна строка на (contest_id, user_id, problem_id). Триггер обновляет только
+-- затронутую строку и применяет разницу (дельту) к standings,
+-- поэтому стоимость записи не зависит от числа участников контеста.
+CREATE TABLE standing_problems (
+    contest_id INTEGER NOT NULL REFERENCES contests(contest_id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    problem_id INTEGER NOT NULL REFERENCES problems(problem_id) ON DELETE CASCADE,
+    attempts INTEGER NOT NULL DEFAULT 0 CHECK (attempts >= 0),
+    solved BOOLEAN NOT NULL DEFAULT FALSE,
+    first_ac_at TIMESTAMP,
+    solve_minute INTEGER CHECK (solve_minute >= 0),
+    rejected_attempts INTEGER NOT NULL DEFAULT 0 CHECK (rejected_attempts >= 0),
+    best_score INTEGER NOT NULL DEFAULT 0 CHECK (best_score >= 0),
+    best_time_ms INTEGER CHECK (best_time_ms >= 0),
+    score INTEGER NOT NULL DEFAULT 0 CHECK (score >= 0),
+    penalty INTEGER NOT NULL DEFAULT 0 CHECK (penalty >= 0),
+    PRIMARY KEY (contest_id, user_id, problem_id)
+);
+
+COMMENT ON COLUMN standing_problems.solve_minute IS 'Минута первого accepted от начала контеста';
+COMMENT ON COLUMN standing_problems.rejected_attempts IS 'Отклоненные попытки до первого accepted (без compilation_error)';
+COMMENT ON COLUMN standing_problems.score IS 'Очки задачи по правилу типа контеста (вклад в standings.total_score)';
+COMMENT ON COLUMN standing_problems.penalty IS 'Штраф задачи по правилу типа контеста (вклад в standings.penalty_time)';
+
+-- ================================================
+-- ТАБЛИЦА 12: Batch_Jobs (Фоновые задачи массового импорта)
+-- ================================================
+-- Состояние хранится в БД, чтобы задача пережила перезапуск API:
+-- при старте воркер продолжает незавершенные задачи с rows_done.
+CREATE TABLE batch_jobs (
+    job_id SERIAL PRIMARY KEY,
+    entity_type VARCHAR(20) NOT NULL CHECK (entity_type IN ('users', 'contests', 'problems', 'submissions')),
+    mode VARCHAR(10) NOT NULL DEFAULT 'orm' CHECK (mode IN ('orm', 'copy')),
+    chunk_size INTEGER NOT NULL CHECK (chunk_size > 0),
+    status VARCHAR(20) NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'completed', 'failed')),
+    total_rows INTEGER NOT NULL CHECK (total_rows >= 0),
+    rows_done INTEGER NOT NULL DEFAULT 0 CHECK (rows_done >= 0),
+    rows_success INTEGER NOT NULL DEFAULT 0 CHECK (rows_success >= 0),
+    rows_failed INTEGER NOT NULL DEFAULT 0 CHECK (rows_failed >= 0),
+    errors JSONB NOT NULL DEFAULT '[]',
+    payload JSONB,
+    error_message TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+COMMENT ON COLUMN batch_jobs.rows_done IS 'Обработано строк (успешных и ошибочных); с этой позиции задача продолжается после перезапуска';
+COMMENT ON COLUMN batch_jobs.errors IS 'Первые ошибки по строкам (не более 1000), полное число - rows_failed';
+COMMENT ON COLUMN batch_jobs.payload IS 'Строки импорта; очищается после завершения задачи';
+
+-- ================================================
+-- ТАБЛИЦА 13: Analytics_Snapshots (Снимки материализованных представлений)
+-- ================================================
+-- Одна строка на материализованное представление аналитики (mv_*):
+-- когда оно обновлялось и как часто его обновлять.
+-- Число изменений в исходных таблицах берется из pg_stat_user_tables,
+-- поэтому запись в submissions не платит за учет изменений.
+CREATE TABLE analytics_snapshots (
+    view_name VARCHAR(100) PRIMARY KEY,
+    source_tables TEXT[] NOT NULL,
+    refresh_interval_seconds INTEGER NOT NULL DEFAULT 300 CHECK (refresh_interval_seconds > 0),
+    refresh_min_changes INTEGER NOT NULL DEFAULT 1000 CHECK (refresh_min_changes > 0),
+    refreshed_at TIMESTAMP,
+    source_changes BIGINT NOT NULL DEFAULT 0,
+    last_refresh_ms INTEGER
+);
+
+COMMENT ON COLUMN analytics_snapshots.refresh_interval_seconds IS 'Обновлять не реже этого интервала, если в исходных таблицах были изменения';
+COMMENT ON COLUMN analytics_snapshots.refresh_min_changes IS 'Обновлять сразу, когда накопилось столько измененных строк';
+COMMENT ON COLUMN analytics_snapshots.source_changes IS 'Счетчик изменений исходных таблиц (pg_stat_user_tables) на момент обновления';
+
+-- ================================================
+-- ТАБЛИЦА 14: Frozen_Standings (Замороженная турнирная таблица)
+-- ================================================
+-- Публичная турнирная таблица контеста по посылкам, отправленным до contests.freeze_time.
+-- Снимается один раз при первом публичном чтении после начала заморозки
+-- (freeze_contest_standings) и больше не пересчитывается
+CREATE TABLE frozen_standings (
+    contest_id INTEGER NOT NULL REFERENCES contests(contest_id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    total_score INTEGER NOT NULL DEFAULT 0 CHECK (total_score >= 0),
+    problems_solved INTEGER NOT NULL DEFAULT 0 CHECK (problems_solved >= 0),
+    penalty_time INTEGER NOT NULL DEFAULT 0 CHECK (penalty_time >= 0),
+    last_updated TIMESTAMP NOT NULL,
+    PRIMARY KEY (contest_id, user_id)
+);
+
+-- ================================================
+-- ТАБЛИЦА 15: Judge_Leases (Аренда посылок проверяющими)
+-- ================================================
+-- Очередь проверки - это сами посылки с verdict = 'pending'; здесь только то, кто из
+-- проверяющих взял посылку и до какого времени. Отдельная таблица, чтобы выдача и
+-- продление аренды не обновляли submissions (аудит, standings, уведомления кеша).
+-- Истекшая аренда означает, что посылка вернулась в очередь.
+CREATE TABLE judge_leases (
+    submission_id INTEGER PRIMARY KEY REFERENCES submissions(submission_id) ON DELETE CASCADE,
+    judge_id VARCHAR(64) NOT NULL,
+    claimed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    heartbeat_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1 CHECK (attempts > 0)
+);
+
+COMMENT ON COLUMN judge_leases.expires_at IS 'Аренда действует до этого времени; продлевается heartbeat проверяющего';
+COMMENT ON COLUMN judge_leases.attempts IS 'Сколько раз посылку выдавали (больше 1 - аренда истекала)';
+
+-- ================================================
+-- ТАБЛИЦА 16: Rejudge_Jobs (Перепроверки контестов)
+-- ================================================
+-- Перепроверка сбрасывает вердикты выбранных посылок контеста одним оператором и
+-- помечает их rejudge_job_id. Такие посылки выдаются проверяющим после обычных, а
+-- standings пересчитываются один раз, когда проверена последняя из них.
+CREATE TABLE rejudge_jobs (
+    job_id SERIAL PRIMARY KEY,
+    contest_id INTEGER NOT NULL REFERENCES contests(contest_id) ON DELETE CASCADE,
+    problem_id INTEGER REFERENCES problems(problem_id) ON DELETE CASCADE,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE CASCADE,
+    verdict VARCHAR(30) CHECK (verdict IN
+        ('accepted', 'wrong_answer', 'time_limit', 'memory_limit', 'runtime_error', 'compilation_error')),
+    status VARCHAR(20) NOT NULL DEFAULT 'judging' CHECK (status IN ('judging', 'completed')),
+    total_submissions INTEGER NOT NULL DEFAULT 0 CHECK (total_submissions >= 0),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+ALTER TABLE submissions ADD CONSTRAINT submissions_rejudge_job_fkey
+    FOREIGN KEY (rejudge_job_id) REFERENCES rejudge_jobs(job_id) ON DELETE SET NULL;
+
+COMMENT ON COLUMN rejudge_jobs.problem_id IS 'Фильтры перепроверки: задача, участник, прежний вердикт (NULL - любые)';
+COMMENT ON COLUMN rejudge_jobs.finished_at IS 'Проверена последняя посылка и пересчитаны standings контеста';
+
+-- ================================================
+-- ТАБЛИЦА 17: Testcase_Chunks (Куски больших тестов)
+-- ================================================
+-- Куски адресуются хешем содержимого (SHA-256 до сжатия), поэтому одинаковые тесты
+-- разных задач хранятся один раз. data уже сжата (zlib): STORAGE EXTERNAL выносит ее
+-- в TOAST без второго сжатия. last_used_at обновляется при каждой записи куска:
+-- сборщик сирот не удалит кусок, на который только что сослалась новая загрузка.
+CREATE TABLE testcase_chunks (
+    chunk_hash BYTEA PRIMARY KEY,
+    data BYTEA NOT NULL,
+    raw_size INTEGER NOT NULL CHECK (raw_size > 0),
+    last_used_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE testcase_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
+
 -- Комментарии к таблицам
 COMMENT ON TABLE users IS 'Пользователи системы: участники, жюри, администраторы';
 COMMENT ON TABLE contests IS 'Соревнования по программированию';
@@ -162,3 +340,10 @@ COMMENT ON TABLE standings IS 'Турнирная таблица соревно
 COMMENT ON TABLE tags IS 'Теги для категоризации задач';
 COMMENT ON TABLE problem_tags IS 'Связь задач с тегами (N:M)';
 COMMENT ON TABLE audit_log IS 'Журнал всех изменений в БД';
+COMMENT ON TABLE standing_problems IS 'Состояние решения каждой задачи участником (основа для инкрементальных standings)';
+COMMENT ON TABLE batch_jobs IS 'Фоновые задачи массового импорта и их прогресс';
+COMMENT ON TABLE analytics_snapshots IS 'Состояние и расписание обновления материализованных представлений аналитики';
+COMMENT ON TABLE frozen_standings IS 'Снимок публичной турнирной таблицы на момент заморозки';
+COMMENT ON TABLE judge_leases IS 'Посылки, взятые проверяющими из очереди, и срок их аренды';
+COMMENT ON TABLE rejudge_jobs IS 'Перепроверки посылок контеста и их состояние';
+COMMENT ON TABLE testcase_chunks IS 'Сжатые куски больших тестов, общие для всех задач';
@@ -2,6 +2,10 @@
 -- ТРИГГЕРЫ ДЛЯ АУДИТА ИЗМЕНЕНИЙ
 -- ================================================
 
+-- Массовый импорт (/batch/import, mode=copy) выставляет app.bulk_import = 'on'
+-- на время одной вставки и сам пишет аудит и пересчитывает standings набором,
+-- поэтому построчные триггеры в этот момент не выполняются (условие WHEN).
+
 -- Функция для логирования изменений в Users
 CREATE OR REPLACE FUNCTION log_users_changes()
 RETURNS TRIGGER AS $$
@@ -25,7 +29,9 @@ $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER users_audit_trigger
 AFTER INSERT OR UPDATE OR DELETE ON users
-FOR EACH ROW EXECUTE FUNCTION log_users_changes();
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION log_users_changes();
 
 -- Функция для логирования изменений в Contests
 CREATE OR REPLACE FUNCTION log_contests_changes()
@@ -50,7 +56,9 @@ $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER contests_audit_trigger
 AFTER INSERT OR UPDATE OR DELETE ON contests
-FOR EACH ROW EXECUTE FUNCTION log_contests_changes();
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION log_contests_changes();
 
 -- Функция для логирования изменений в Submissions
 CREATE OR REPLACE FUNCTION log_submissions_changes()
@@ -75,90 +83,294 @@ $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER submissions_audit_trigger
 AFTER INSERT OR UPDATE OR DELETE ON submissions
-FOR EACH ROW EXECUTE FUNCTION log_submissions_changes();
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION log_submissions_changes();
+
+-- Функция для логирования изменений в Problems (по журналу отдается ETag задачи)
+CREATE OR REPLACE FUNCTION log_problems_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        INSERT INTO audit_log (table_name, operation, record_id, old_values)
+        VALUES ('problems', 'DELETE', OLD.problem_id, row_to_json(OLD)::jsonb);
+        RETURN OLD;
+    ELSIF (TG_OP = 'UPDATE') THEN
+        INSERT INTO audit_log (table_name, operation, record_id, old_values, new_values)
+        VALUES ('problems', 'UPDATE', NEW.problem_id, row_to_json(OLD)::jsonb, row_to_json(NEW)::jsonb);
+        RETURN NEW;
+    ELSIF (TG_OP = 'INSERT') THEN
+        INSERT INTO audit_log (table_name, operation, record_id, new_values)
+        VALUES ('problems', 'INSERT', NEW.problem_id, row_to_json(NEW)::jsonb);
+        RETURN NEW;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER problems_audit_trigger
+AFTER INSERT OR UPDATE OR DELETE ON problems
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION log_problems_changes();
 
 -- ================================================
 -- ТРИГГЕР ДЛЯ АВТООБНОВЛЕНИЯ ТУРНИРНОЙ ТАБЛИЦЫ
 -- ================================================
 
--- Функция для обновления standings при изменении submission
-CREATE OR REPLACE FUNCTION update_standings()
-RETURNS TRIGGER AS $$
+-- Пересчет состояния одной задачи участника и применение дельты к standings.
+-- Читаются только посылки этой тройки (contest, user, problem), ранги не
+-- переписываются: место вычисляется при чтении (v_contest_standings,
+-- get_user_contest_rank) по индексу idx_standings_leaderboard.
+-- Очки и штраф задачи считает правило типа контеста (apply_scoring_rule).
+CREATE OR REPLACE FUNCTION refresh_standing_problem(
+    p_contest_id INTEGER,
+    p_user_id INTEGER,
+    p_problem_id INTEGER
+)
+RETURNS VOID AS $$
 DECLARE
-    v_total_score INTEGER;
-    v_problems_solved INTEGER;
-    v_penalty INTEGER;
-    v_rank INTEGER;
+    v_old standing_problems%ROWTYPE;
+    v_new RECORD;
+    v_delta_score INTEGER;
+    v_delta_solved INTEGER;
+    v_delta_penalty INTEGER;
 BEGIN
-    -- Обновляем standings при INSERT или UPDATE submission с вердиктом 'accepted'
-    IF (TG_OP = 'INSERT' OR TG_OP = 'UPDATE') AND NEW.verdict = 'accepted' THEN
-        -- Вычисляем total_score для пользователя в контесте
-        SELECT COALESCE(SUM(DISTINCT s.score), 0)
-        INTO v_total_score
-        FROM submissions s
-        WHERE s.contest_id = NEW.contest_id 
-          AND s.user_id = NEW.user_id 
-          AND s.verdict = 'accepted';
+    -- Пока строки standing_problems нет, FOR UPDATE ничего не блокирует: две первые посылки
+    -- по тройке посчитали бы дельту от пустого состояния обе, и одна из них потерялась бы,
+    -- а дельта попала бы в standings дважды. Блокировка тройки до коммита выстраивает их по очереди;
+    -- вторая перечитывает посылки уже после коммита первой
+    PERFORM pg_advisory_xact_lock(
+        'standing_problems'::regclass::oid::INTEGER,
+        hashtext(p_contest_id || ':' || p_user_id || ':' || p_problem_id)
+    );
 
-        -- Вычисляем количество решенных задач
-        SELECT COUNT(DISTINCT s.problem_id)
-        INTO v_problems_solved
-        FROM submissions s
-        WHERE s.contest_id = NEW.contest_id 
-          AND s.user_id = NEW.user_id 
-          AND s.verdict = 'accepted';
-
-        -- Вычисляем penalty time (сумма времени до первого accepted для каждой задачи)
-        SELECT COALESCE(SUM(EXTRACT(EPOCH FROM (
-            SELECT MIN(s2.submitted_at) 
-            FROM submissions s2 
-            WHERE s2.contest_id = NEW.contest_id 
-              AND s2.user_id = NEW.user_id 
-              AND s2.problem_id = s1.problem_id 
-              AND s2.verdict = 'accepted'
-        )) / 60), 0)::INTEGER
-        INTO v_penalty
-        FROM (
-            SELECT DISTINCT problem_id 
-            FROM submissions 
-            WHERE contest_id = NEW.contest_id 
-              AND user_id = NEW.user_id 
-              AND verdict = 'accepted'
-        ) s1;
-
-        -- Обновляем или создаем запись в standings
-        INSERT INTO standings (contest_id, user_id, total_score, problems_solved, penalty_time)
-        VALUES (NEW.contest_id, NEW.user_id, v_total_score, v_problems_solved, v_penalty)
-        ON CONFLICT (contest_id, user_id) 
-        DO UPDATE SET 
-            total_score = v_total_score,
-            problems_solved = v_problems_solved,
-            penalty_time = v_penalty,
-            last_updated = CURRENT_TIMESTAMP;
-
-        -- Обновляем ранги для всех участников этого контеста
-        WITH ranked AS (
-            SELECT 
-                standing_id,
-                ROW_NUMBER() OVER (
-                    ORDER BY total_score DESC, penalty_time ASC
-                ) as new_rank
-            FROM standings
-            WHERE contest_id = NEW.contest_id
+    SELECT * INTO v_old
+    FROM standing_problems
+    WHERE contest_id = p_contest_id
+      AND user_id = p_user_id
+      AND problem_id = p_problem_id
+    FOR UPDATE;
+
+    SELECT * INTO v_new
+    FROM v_standing_problem_state
+    WHERE contest_id = p_contest_id
+      AND user_id = p_user_id
+      AND problem_id = p_problem_id;
+
+    IF FOUND THEN
+        INSERT INTO standing_problems (
+            contest_id, user_id, problem_id, attempts, solved, first_ac_at, solve_minute,
+            rejected_attempts, best_score, best_time_ms, score, penalty
+        )
+        VALUES (
+            p_contest_id, p_user_id, p_problem_id, v_new.attempts, v_new.solved, v_new.first_ac_at, v_new.solve_minute,
+            v_new.rejected_attempts, v_new.best_score, v_new.best_time_ms, v_new.score, v_new.penalty
         )
-        UPDATE standings s
-        SET rank = r.new_rank
-        FROM ranked r
-        WHERE s.standing_id = r.standing_id;
+        ON CONFLICT (contest_id, user_id, problem_id)
+        DO UPDATE SET
+            attempts = EXCLUDED.attempts,
+            solved = EXCLUDED.solved,
+            first_ac_at = EXCLUDED.first_ac_at,
+            solve_minute = EXCLUDED.solve_minute,
+            rejected_attempts = EXCLUDED.rejected_attempts,
+            best_score = EXCLUDED.best_score,
+            best_time_ms = EXCLUDED.best_time_ms,
+            score = EXCLUDED.score,
+            penalty = EXCLUDED.penalty;
+
+        v_delta_score := v_new.score - COALESCE(v_old.score, 0);
+        v_delta_solved := v_new.solved::INTEGER - COALESCE(v_old.solved, FALSE)::INTEGER;
+        v_delta_penalty := v_new.penalty - COALESCE(v_old.penalty, 0);
+    ELSE
+        -- Посылок по задаче не осталось (удаление, перенос в другой контест)
+        DELETE FROM standing_problems
+        WHERE contest_id = p_contest_id
+          AND user_id = p_user_id
+          AND problem_id = p_problem_id;
+
+        v_delta_score := -COALESCE(v_old.score, 0);
+        v_delta_solved := -COALESCE(v_old.solved, FALSE)::INTEGER;
+        v_delta_penalty := -COALESCE(v_old.penalty, 0);
     END IF;
 
-    RETURN NEW;
+    IF v_delta_score = 0 AND v_delta_solved = 0 AND v_delta_penalty = 0 THEN
+        RETURN;
+    END IF;
+
+    -- Строка standings появляется с первым ненулевым результатом.
+    -- Дельта может быть отрицательной (более ранний accepted, rejudge),
+    -- поэтому сначала создаем пустую строку, затем применяем дельту
+    IF v_new.contest_id IS NOT NULL THEN
+        INSERT INTO standings (contest_id, user_id)
+        VALUES (p_contest_id, p_user_id)
+        ON CONFLICT (contest_id, user_id) DO NOTHING;
+    END IF;
+
+    UPDATE standings
+    SET total_score = total_score + v_delta_score,
+        problems_solved = problems_solved + v_delta_solved,
+        penalty_time = penalty_time + v_delta_penalty,
+        last_updated = CURRENT_TIMESTAMP
+    WHERE contest_id = p_contest_id
+      AND user_id = p_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчет standing_problems и standings одного контеста одним набором запросов.
+-- Нужен при изменении правил подсчета (тип, время начала, стоимость задач)
+CREATE OR REPLACE FUNCTION refresh_contest_standings(p_contest_id INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM standing_problems WHERE contest_id = p_contest_id;
+
+    INSERT INTO standing_problems (
+        contest_id, user_id, problem_id, attempts, solved, first_ac_at, solve_minute,
+        rejected_attempts, best_score, best_time_ms, score, penalty
+    )
+    SELECT 
+        contest_id, user_id, problem_id, attempts, solved, first_ac_at, solve_minute,
+        rejected_attempts, best_score, best_time_ms, score, penalty
+    FROM v_standing_problem_state
+    WHERE contest_id = p_contest_id;
+
+    WITH totals AS (
+        SELECT 
+            user_id,
+            SUM(score)::INTEGER as total_score,
+            COUNT(*) FILTER (WHERE solved)::INTEGER as problems_solved,
+            SUM(penalty)::INTEGER as penalty_time
+        FROM standing_problems
+        WHERE contest_id = p_contest_id
+        GROUP BY user_id
+    )
+    INSERT INTO standings (contest_id, user_id, total_score, problems_solved, penalty_time)
+    SELECT p_contest_id, t.user_id, t.total_score, t.problems_solved, t.penalty_time
+    FROM totals t
+    WHERE t.total_score > 0 OR t.problems_solved > 0 OR t.penalty_time > 0
+       OR EXISTS (SELECT 1 FROM standings st WHERE st.contest_id = p_contest_id AND st.user_id = t.user_id)
+    ON CONFLICT (contest_id, user_id)
+    DO UPDATE SET
+        total_score = EXCLUDED.total_score,
+        problems_solved = EXCLUDED.problems_solved,
+        penalty_time = EXCLUDED.penalty_time,
+        last_updated = CURRENT_TIMESTAMP
+    WHERE (standings.total_score, standings.problems_solved, standings.penalty_time)
+       IS DISTINCT FROM (EXCLUDED.total_score, EXCLUDED.problems_solved, EXCLUDED.penalty_time);
+
+    -- Участники, у которых не осталось результатов
+    UPDATE standings st
+    SET total_score = 0,
+        problems_solved = 0,
+        penalty_time = 0,
+        last_updated = CURRENT_TIMESTAMP
+    WHERE st.contest_id = p_contest_id
+      AND (st.total_score, st.problems_solved, st.penalty_time) <> (0, 0, 0)
+      AND NOT EXISTS (
+          SELECT 1 FROM standing_problems sp
+          WHERE sp.contest_id = p_contest_id AND sp.user_id = st.user_id
+      );
+
+    PERFORM pg_notify('analytics_changes', 'standings:' || p_contest_id);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция для обновления standings при изменении submission
+CREATE OR REPLACE FUNCTION update_standings()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'INSERT') THEN
+        PERFORM refresh_standing_problem(NEW.contest_id, NEW.user_id, NEW.problem_id);
+        RETURN NEW;
+    ELSIF (TG_OP = 'UPDATE') THEN
+        IF NEW.verdict IS NOT DISTINCT FROM OLD.verdict
+           AND NEW.score IS NOT DISTINCT FROM OLD.score
+           AND NEW.execution_time_ms IS NOT DISTINCT FROM OLD.execution_time_ms
+           AND NEW.submitted_at IS NOT DISTINCT FROM OLD.submitted_at
+           AND NEW.contest_id = OLD.contest_id
+           AND NEW.user_id = OLD.user_id
+           AND NEW.problem_id = OLD.problem_id THEN
+            RETURN NEW;
+        END IF;
+        -- Вердикт перепроверяемой посылки: standings пересчитываются один раз в конце перепроверки
+        IF NEW.rejudge_job_id IS NOT NULL
+           AND (NEW.contest_id, NEW.user_id, NEW.problem_id) = (OLD.contest_id, OLD.user_id, OLD.problem_id)
+           AND EXISTS (
+               SELECT 1 FROM rejudge_jobs j WHERE j.job_id = NEW.rejudge_job_id AND j.status = 'judging'
+           ) THEN
+            RETURN NEW;
+        END IF;
+        IF (NEW.contest_id, NEW.user_id, NEW.problem_id) <> (OLD.contest_id, OLD.user_id, OLD.problem_id) THEN
+            PERFORM refresh_standing_problem(OLD.contest_id, OLD.user_id, OLD.problem_id);
+        END IF;
+        PERFORM refresh_standing_problem(NEW.contest_id, NEW.user_id, NEW.problem_id);
+        RETURN NEW;
+    ELSIF (TG_OP = 'DELETE') THEN
+        PERFORM refresh_standing_problem(OLD.contest_id, OLD.user_id, OLD.problem_id);
+        RETURN OLD;
+    END IF;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 CREATE TRIGGER update_standings_trigger
-AFTER INSERT OR UPDATE ON submissions
-FOR EACH ROW EXECUTE FUNCTION update_standings();
+AFTER INSERT OR UPDATE OR DELETE ON submissions
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION update_standings();
+
+-- Перепроверка завершается, когда у нее не остается непроверенных посылок, кто бы ни снял
+-- посылку с проверки: проверяющий (report_judge_results), PUT /submissions/{id}, удаление посылки
+-- или новая перепроверка, забравшая ее себе. Триггеры отложенные и срабатывают при COMMIT:
+-- строка перепроверки блокируется только на время коммита, а вердикты всей транзакции уже записаны
+CREATE OR REPLACE FUNCTION complete_rejudge_on_submission_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM complete_rejudge_jobs(ARRAY[OLD.rejudge_job_id]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE CONSTRAINT TRIGGER submissions_rejudge_verdict_trigger
+AFTER UPDATE ON submissions
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW
+WHEN (OLD.rejudge_job_id IS NOT NULL AND OLD.verdict = 'pending'
+      AND (NEW.verdict <> 'pending' OR NEW.rejudge_job_id IS DISTINCT FROM OLD.rejudge_job_id))
+EXECUTE FUNCTION complete_rejudge_on_submission_change();
+
+CREATE CONSTRAINT TRIGGER submissions_rejudge_delete_trigger
+AFTER DELETE ON submissions
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW
+WHEN (OLD.rejudge_job_id IS NOT NULL AND OLD.verdict = 'pending')
+EXECUTE FUNCTION complete_rejudge_on_submission_change();
+
+-- Функция для пересчета standings при изменении правил подсчета контеста
+CREATE OR REPLACE FUNCTION refresh_standings_on_rules_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_TABLE_NAME = 'contests') THEN
+        IF NEW.contest_type IS DISTINCT FROM OLD.contest_type
+           OR NEW.start_time IS DISTINCT FROM OLD.start_time THEN
+            PERFORM refresh_contest_standings(NEW.contest_id);
+        END IF;
+    ELSIF (TG_TABLE_NAME = 'contest_problems') THEN
+        IF NEW.max_score IS DISTINCT FROM OLD.max_score THEN
+            PERFORM refresh_contest_standings(NEW.contest_id);
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER contests_scoring_trigger
+AFTER UPDATE OF contest_type, start_time ON contests
+FOR EACH ROW EXECUTE FUNCTION refresh_standings_on_rules_change();
+
+CREATE TRIGGER contest_problems_scoring_trigger
+AFTER UPDATE OF max_score ON contest_problems
+FOR EACH ROW EXECUTE FUNCTION refresh_standings_on_rules_change();
 
 -- ================================================
 -- ТРИГГЕР ДЛЯ ОБНОВЛЕНИЯ РЕЙТИНГА ПОЛЬЗОВАТЕЛЯ
@@ -184,3 +396,62 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER update_user_rating_trigger
 AFTER UPDATE ON contests
 FOR EACH ROW EXECUTE FUNCTION update_user_rating();
+
+-- ================================================
+-- УВЕДОМЛЕНИЯ ОБ ИЗМЕНЕНИЯХ ДЛЯ КЕША АНАЛИТИКИ
+-- ================================================
+
+-- Каждый процесс API держит кеш аналитики в памяти и слушает канал analytics_changes.
+-- Полезная нагрузка: 'таблица:contest_id', 'analytics_snapshots:имя_снимка' или 'таблица'.
+-- NOTIFY доставляется только после COMMIT; одинаковые уведомления одной транзакции
+-- схлопываются, поэтому пакет посылок в один контест дает одно уведомление.
+-- Массовый импорт (mode=copy) уведомляет сам, по одному разу на контест.
+
+-- Функция для уведомления об изменении данных контеста
+CREATE OR REPLACE FUNCTION notify_analytics_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_TABLE_NAME = 'analytics_snapshots') THEN
+        PERFORM pg_notify('analytics_changes', 'analytics_snapshots:' || NEW.view_name);
+    ELSIF (TG_OP = 'DELETE') THEN
+        PERFORM pg_notify('analytics_changes', TG_TABLE_NAME || ':' || OLD.contest_id);
+    ELSE
+        IF (TG_OP = 'UPDATE') AND NEW.contest_id <> OLD.contest_id THEN
+            PERFORM pg_notify('analytics_changes', TG_TABLE_NAME || ':' || OLD.contest_id);
+        END IF;
+        PERFORM pg_notify('analytics_changes', TG_TABLE_NAME || ':' || NEW.contest_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция для уведомления об изменении таблицы без ключа (один раз на оператор)
+CREATE OR REPLACE FUNCTION notify_analytics_table_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('analytics_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER submissions_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE ON submissions
+FOR EACH ROW
+WHEN (current_setting('app.bulk_import', true) IS DISTINCT FROM 'on')
+EXECUTE FUNCTION notify_analytics_change();
+
+CREATE TRIGGER contests_notify_trigger
+AFTER UPDATE OR DELETE ON contests
+FOR EACH ROW EXECUTE FUNCTION notify_analytics_change();
+
+CREATE TRIGGER analytics_snapshots_notify_trigger
+AFTER UPDATE ON analytics_snapshots
+FOR EACH ROW EXECUTE FUNCTION notify_analytics_change();
+
+CREATE TRIGGER users_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE ON users
+FOR EACH STATEMENT EXECUTE FUNCTION notify_analytics_table_change();
+
+CREATE TRIGGER problems_notify_trigger
+AFTER INSERT OR UPDATE OR DELETE ON problems
+FOR EACH STATEMENT EXECUTE FUNCTION notify_analytics_table_change();
@@ -62,16 +62,32 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Функция: Получить место пользователя в контесте
+-- Место вычисляется при чтении: число участников выше по
+-- (total_score DESC, penalty_time ASC, user_id) + 1, диапазон по idx_standings_leaderboard
 CREATE OR REPLACE FUNCTION get_user_contest_rank(p_user_id INTEGER, p_contest_id INTEGER)
 RETURNS INTEGER AS $$
 DECLARE
+    v_score INTEGER;
+    v_penalty INTEGER;
     user_rank INTEGER;
 BEGIN
-    SELECT rank INTO user_rank
+    SELECT total_score, penalty_time INTO v_score, v_penalty
     FROM standings
     WHERE user_id = p_user_id AND contest_id = p_contest_id;
 
-    RETURN COALESCE(user_rank, 0);
+    IF NOT FOUND THEN
+        RETURN 0;
+    END IF;
+
+    SELECT COUNT(*) + 1 INTO user_rank
+    FROM standings
+    WHERE contest_id = p_contest_id
+      AND total_score >= v_score
+      AND (total_score > v_score
+           OR penalty_time < v_penalty
+           OR (penalty_time = v_penalty AND user_id < p_user_id));
+
+    RETURN user_rank;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -146,29 +162,35 @@ END;
 $$ LANGUAGE plpgsql;
 
 -- Функция: Получить детальный отчет по посылкам пользователя в контесте
+-- Читает готовое состояние задач из standing_problems, а не сырые посылки
 CREATE OR REPLACE FUNCTION get_user_contest_report(p_user_id INTEGER, p_contest_id INTEGER)
 RETURNS TABLE (
     problem_title VARCHAR(200),
     attempts BIGINT,
     accepted BOOLEAN,
     best_time_ms INTEGER,
-    score INTEGER
+    score INTEGER,
+    rejected_attempts INTEGER,
+    solve_minute INTEGER,
+    penalty INTEGER
 ) AS $$
 BEGIN
     RETURN QUERY
     SELECT 
         p.title as problem_title,
-        COUNT(s.submission_id) as attempts,
-        BOOL_OR(s.verdict = 'accepted') as accepted,
-        MIN(s.execution_time_ms) as best_time_ms,
-        MAX(s.score) as score
+        COALESCE(sp.attempts, 0)::BIGINT as attempts,
+        sp.solved as accepted,
+        sp.best_time_ms,
+        sp.score,
+        sp.rejected_attempts,
+        sp.solve_minute,
+        sp.penalty
     FROM contest_problems cp
     INNER JOIN problems p ON cp.problem_id = p.problem_id
-    LEFT JOIN submissions s ON cp.problem_id = s.problem_id 
-        AND s.contest_id = p_contest_id 
-        AND s.user_id = p_user_id
+    LEFT JOIN standing_problems sp ON sp.contest_id = cp.contest_id
+        AND sp.problem_id = cp.problem_id
+        AND sp.user_id = p_user_id
     WHERE cp.contest_id = p_contest_id
-    GROUP BY p.problem_id, p.title, cp.problem_order
     ORDER BY cp.problem_order;
 END;
 $$ LANGUAGE plpgsql;
@@ -202,3 +224,703 @@ BEGIN
     ORDER BY p.problem_id;
 END;
 $$ LANGUAGE plpgsql;
+
+
+-- ================================================
+-- ПРАВИЛА ПОДСЧЕТА ОЧКОВ ПО ТИПАМ КОНТЕСТОВ
+-- ================================================
+-- Каждое правило получает состояние задачи участника (standing_problems)
+-- и возвращает вклад задачи в standings: очки и штраф.
+-- Новый тип контеста = новая функция score_rule_* и ветка в apply_scoring_rule.
+
+-- ACM ICPC: штраф = минута решения + 20 минут за каждую отклоненную попытку до accepted
+CREATE OR REPLACE FUNCTION score_rule_acm_icpc(
+    p_solved BOOLEAN,
+    p_solve_minute INTEGER,
+    p_rejected_attempts INTEGER,
+    p_best_score INTEGER,
+    p_max_score INTEGER,
+    OUT score INTEGER,
+    OUT penalty INTEGER
+) AS $$
+BEGIN
+    IF NOT p_solved THEN
+        score := 0;
+        penalty := 0;
+        RETURN;
+    END IF;
+    score := p_best_score;
+    penalty := p_solve_minute + 20 * p_rejected_attempts;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Codeforces: стоимость задачи падает на 0.4% в минуту и на 10% за отклоненную попытку,
+-- но не ниже 30% от max_score; штрафного времени нет
+CREATE OR REPLACE FUNCTION score_rule_codeforces(
+    p_solved BOOLEAN,
+    p_solve_minute INTEGER,
+    p_rejected_attempts INTEGER,
+    p_best_score INTEGER,
+    p_max_score INTEGER,
+    OUT score INTEGER,
+    OUT penalty INTEGER
+) AS $$
+BEGIN
+    penalty := 0;
+    IF NOT p_solved THEN
+        score := 0;
+        RETURN;
+    END IF;
+    score := GREATEST(
+        ROUND(p_max_score * 0.3),
+        ROUND(p_max_score * (1 - 0.004 * p_solve_minute) - p_max_score * 0.1 * p_rejected_attempts)
+    )::INTEGER;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- IOI: засчитывается лучший (в том числе частичный) результат, штрафа нет
+CREATE OR REPLACE FUNCTION score_rule_ioi(
+    p_solved BOOLEAN,
+    p_solve_minute INTEGER,
+    p_rejected_attempts INTEGER,
+    p_best_score INTEGER,
+    p_max_score INTEGER,
+    OUT score INTEGER,
+    OUT penalty INTEGER
+) AS $$
+BEGIN
+    score := p_best_score;
+    penalty := 0;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Выбор правила по типу контеста
+CREATE OR REPLACE FUNCTION apply_scoring_rule(
+    p_contest_type VARCHAR(20),
+    p_solved BOOLEAN,
+    p_solve_minute INTEGER,
+    p_rejected_attempts INTEGER,
+    p_best_score INTEGER,
+    p_max_score INTEGER,
+    OUT score INTEGER,
+    OUT penalty INTEGER
+) AS $$
+BEGIN
+    CASE p_contest_type
+        WHEN 'ACM_ICPC' THEN
+            SELECT r.score, r.penalty INTO score, penalty
+            FROM score_rule_acm_icpc(p_solved, p_solve_minute, p_rejected_attempts, p_best_score, p_max_score) r;
+        WHEN 'Codeforces' THEN
+            SELECT r.score, r.penalty INTO score, penalty
+            FROM score_rule_codeforces(p_solved, p_solve_minute, p_rejected_attempts, p_best_score, p_max_score) r;
+        WHEN 'IOI' THEN
+            SELECT r.score, r.penalty INTO score, penalty
+            FROM score_rule_ioi(p_solved, p_solve_minute, p_rejected_attempts, p_best_score, p_max_score) r;
+        ELSE
+            RAISE EXCEPTION 'Unknown contest type: %', p_contest_type;
+    END CASE;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- ================================================
+-- ЗАМОРОЗКА ТУРНИРНОЙ ТАБЛИЦЫ
+-- ================================================
+-- За contests.freeze_minutes до конца контеста публичная таблица замораживается:
+-- читается снимок frozen_standings, а не живые standings. Жюри и администраторы
+-- видят живую таблицу. Разморозка (resolve) открывает скрытые посылки по одной.
+
+-- Функция: Состояние задачи участника после каждой посылки контеста
+-- Те же очки и штраф, что в v_standing_problem_state, но по префиксу посылок задачи:
+-- строка посылки учитывает только посылки, идущие не позже нее по (submitted_at, submission_id).
+-- Поэтому отбор по submitted_at не меняет состояния оставшихся строк
+CREATE OR REPLACE FUNCTION get_submission_standing_states(p_contest_id INTEGER)
+RETURNS TABLE (
+    submission_id INTEGER,
+    user_id INTEGER,
+    problem_id INTEGER,
+    submitted_at TIMESTAMP,
+    verdict VARCHAR(30),
+    solved BOOLEAN,
+    score INTEGER,
+    penalty INTEGER
+) AS $$
+    SELECT t.submission_id, t.user_id, t.problem_id, t.submitted_at, t.verdict, t.solved, r.score, r.penalty
+    FROM (
+        SELECT 
+            p.submission_id,
+            p.user_id,
+            p.problem_id,
+            p.submitted_at,
+            p.verdict,
+            p.first_ac_at IS NOT NULL as solved,
+            GREATEST(FLOOR(EXTRACT(EPOCH FROM (p.first_ac_at - c.start_time)) / 60), 0)::INTEGER as solve_minute,
+            -- Отклоненные попытки до первого accepted (строго раньше по времени)
+            COALESCE(MIN(p.rejected_before) FILTER (WHERE p.verdict = 'accepted') OVER w, 0)::INTEGER as rejected_attempts,
+            p.best_score,
+            c.contest_type,
+            COALESCE(cp.max_score, 100) as max_score
+        FROM (
+            SELECT 
+                s.submission_id,
+                s.user_id,
+                s.problem_id,
+                s.submitted_at,
+                s.verdict,
+                MIN(s.submitted_at) FILTER (WHERE s.verdict = 'accepted') OVER w as first_ac_at,
+                COALESCE(MAX(s.score) OVER w, 0) as best_score,
+                COUNT(*) FILTER (
+                    WHERE s.verdict IN ('wrong_answer', 'time_limit', 'memory_limit', 'runtime_error')
+                ) OVER (
+                    PARTITION BY s.user_id, s.problem_id ORDER BY s.submitted_at
+                    RANGE UNBOUNDED PRECEDING EXCLUDE GROUP
+                ) as rejected_before
+            FROM submissions s
+            WHERE s.contest_id = p_contest_id
+            WINDOW w AS (PARTITION BY s.user_id, s.problem_id ORDER BY s.submitted_at, s.submission_id)
+        ) p
+        INNER JOIN contests c ON c.contest_id = p_contest_id
+        LEFT JOIN contest_problems cp ON cp.contest_id = p_contest_id AND cp.problem_id = p.problem_id
+        WINDOW w AS (PARTITION BY p.user_id, p.problem_id ORDER BY p.submitted_at, p.submission_id)
+    ) t
+    CROSS JOIN LATERAL apply_scoring_rule(
+        t.contest_type, t.solved, t.solve_minute, t.rejected_attempts, t.best_score, t.max_score
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+-- Функция: Турнирная таблица контеста по посылкам, отправленным до p_before
+-- (участники с ненулевым результатом, как в standings)
+CREATE OR REPLACE FUNCTION get_contest_standings_before(p_contest_id INTEGER, p_before TIMESTAMP)
+RETURNS TABLE (
+    user_id INTEGER,
+    total_score INTEGER,
+    problems_solved INTEGER,
+    penalty_time INTEGER,
+    last_updated TIMESTAMP
+) AS $$
+    SELECT 
+        st.user_id,
+        SUM(st.score)::INTEGER,
+        COUNT(*) FILTER (WHERE st.solved)::INTEGER,
+        SUM(st.penalty)::INTEGER,
+        MAX(st.submitted_at)
+    FROM (
+        SELECT DISTINCT ON (user_id, problem_id) *
+        FROM get_submission_standing_states(p_contest_id)
+        WHERE submitted_at < p_before
+        ORDER BY user_id, problem_id, submitted_at DESC, submission_id DESC
+    ) st
+    GROUP BY st.user_id
+    HAVING SUM(st.score) > 0 OR COUNT(*) FILTER (WHERE st.solved) > 0 OR SUM(st.penalty) > 0;
+$$ LANGUAGE sql STABLE;
+
+-- Функция: Снять замороженную таблицу контеста, если заморозка началась, а снимка еще нет
+-- Конкурентные вызовы ждут блокировку строки контеста и снимок не повторяют.
+-- Обновление contests пишет аудит и уведомляет кеш аналитики.
+-- Возвращает TRUE, если снимок снят этим вызовом
+CREATE OR REPLACE FUNCTION freeze_contest_standings(p_contest_id INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_freeze_time TIMESTAMP;
+BEGIN
+    UPDATE contests
+    SET frozen_at = CURRENT_TIMESTAMP
+    WHERE contest_id = p_contest_id
+      AND frozen_at IS NULL
+      AND unfrozen_at IS NULL
+      AND freeze_time <= LOCALTIMESTAMP
+    RETURNING freeze_time INTO v_freeze_time;
+
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    INSERT INTO frozen_standings (contest_id, user_id, total_score, problems_solved, penalty_time, last_updated)
+    SELECT p_contest_id, s.user_id, s.total_score, s.problems_solved, s.penalty_time, s.last_updated
+    FROM get_contest_standings_before(p_contest_id, v_freeze_time) s;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция: Скрытые заморозкой посылки в порядке отправки и изменение результата
+-- участника после каждой из них (для пошагового открытия таблицы при разморозке).
+-- Отсчет идет от снимка frozen_standings, который видела публика. Скрыты посылки, отправленные
+-- после freeze_time, и посылки до freeze_time, вердикт или очки которых изменились после снимка
+-- (проверены позже него, перепроверены): их состояние на момент снимка - old_values первой
+-- записи аудита после frozen_at. Результат задачи на каждом шаге считается по всем ее посылкам:
+-- открытые и не скрытые - с текущим вердиктом, еще не открытые до freeze_time - с вердиктом
+-- на момент снимка, еще не открытые после freeze_time не учитываются.
+-- Без снимка (публика заморозку не видела) отсчет идет от таблицы на freeze_time по текущим вердиктам
+CREATE OR REPLACE FUNCTION get_standings_replay(p_contest_id INTEGER)
+RETURNS TABLE (
+    submission_id INTEGER,
+    user_id INTEGER,
+    problem_id INTEGER,
+    submitted_at TIMESTAMP,
+    verdict VARCHAR(30),
+    score_delta INTEGER,
+    solved_delta INTEGER,
+    penalty_delta INTEGER
+) AS $$
+    WITH contest AS (
+        SELECT c.contest_type, c.start_time, c.freeze_time, c.frozen_at
+        FROM contests c
+        WHERE c.contest_id = p_contest_id
+    ), snapshot AS (
+        SELECT DISTINCT ON (a.record_id)
+            a.record_id AS submission_id,
+            a.old_values->>'verdict' AS verdict,
+            (a.old_values->>'score')::INTEGER AS score
+        FROM audit_log a
+        CROSS JOIN contest c
+        WHERE a.table_name = 'submissions'
+          AND a.operation = 'UPDATE'
+          AND (COALESCE(a.new_values, a.old_values)->>'contest_id')::INTEGER = p_contest_id
+          AND a.changed_at > c.frozen_at
+        ORDER BY a.record_id, a.changed_at, a.log_id
+    ), versions AS (
+        SELECT 
+            s.submission_id,
+            s.user_id,
+            s.problem_id,
+            s.submitted_at,
+            s.verdict,
+            s.score,
+            s.submitted_at < c.freeze_time AS before_freeze,
+            COALESCE(snap.verdict, s.verdict) AS snapshot_verdict,
+            COALESCE(snap.score, s.score) AS snapshot_score,
+            s.submitted_at >= c.freeze_time
+                OR (snap.submission_id IS NOT NULL AND (snap.verdict, snap.score) IS DISTINCT FROM (s.verdict, s.score))
+                AS hidden
+        FROM submissions s
+        CROSS JOIN contest c
+        LEFT JOIN snapshot snap ON snap.submission_id = s.submission_id AND s.submitted_at < c.freeze_time
+        WHERE s.contest_id = p_contest_id
+    ), steps AS (
+        SELECT v.*, ROW_NUMBER() OVER (ORDER BY v.submitted_at, v.submission_id) AS step
+        FROM versions v
+        WHERE v.hidden
+    ), points AS (
+        -- Шаг 0 - задача участника на снимке, шаг N - после открытия N-й скрытой посылки
+        SELECT DISTINCT st.user_id, st.problem_id, 0::BIGINT AS step FROM steps st
+        UNION ALL
+        SELECT st.user_id, st.problem_id, st.step FROM steps st
+    ), point_submissions AS (
+        SELECT 
+            pt.user_id,
+            pt.problem_id,
+            pt.step,
+            v.submitted_at,
+            CASE WHEN st.step > pt.step THEN v.snapshot_verdict ELSE v.verdict END as verdict,
+            CASE WHEN st.step > pt.step THEN v.snapshot_score ELSE v.score END as score
+        FROM points pt
+        INNER JOIN versions v ON v.user_id = pt.user_id AND v.problem_id = pt.problem_id
+        LEFT JOIN steps st ON st.submission_id = v.submission_id
+        WHERE st.step IS NULL OR st.step <= pt.step OR v.before_freeze
+    ), point_states AS (
+        SELECT 
+            ps.user_id,
+            ps.problem_id,
+            ps.step,
+            ps.first_ac_at,
+            COUNT(*) FILTER (
+                WHERE ps.verdict IN ('wrong_answer', 'time_limit', 'memory_limit', 'runtime_error')
+                  AND (ps.first_ac_at IS NULL OR ps.submitted_at < ps.first_ac_at)
+            )::INTEGER as rejected_attempts,
+            COALESCE(MAX(ps.score), 0) as best_score
+        FROM (
+            SELECT ps.*, MIN(ps.submitted_at) FILTER (WHERE ps.verdict = 'accepted') OVER (
+                PARTITION BY ps.user_id, ps.problem_id, ps.step
+            ) as first_ac_at
+            FROM point_submissions ps
+        ) ps
+        GROUP BY ps.user_id, ps.problem_id, ps.step, ps.first_ac_at
+    ), states AS (
+        -- Задача без учитываемых посылок ничего не дает, как отсутствующая строка standings
+        SELECT 
+            pt.user_id,
+            pt.problem_id,
+            pt.step,
+            CASE WHEN x.step IS NULL THEN 0 ELSE r.score END as score,
+            COALESCE(x.first_ac_at IS NOT NULL, FALSE)::INTEGER as solved,
+            CASE WHEN x.step IS NULL THEN 0 ELSE r.penalty END as penalty
+        FROM points pt
+        CROSS JOIN contest c
+        LEFT JOIN point_states x ON x.user_id = pt.user_id AND x.problem_id = pt.problem_id AND x.step = pt.step
+        LEFT JOIN contest_problems cp ON cp.contest_id = p_contest_id AND cp.problem_id = pt.problem_id
+        CROSS JOIN LATERAL apply_scoring_rule(
+            c.contest_type,
+            x.first_ac_at IS NOT NULL,
+            GREATEST(FLOOR(EXTRACT(EPOCH FROM (x.first_ac_at - c.start_time)) / 60), 0)::INTEGER,
+            COALESCE(x.rejected_attempts, 0),
+            COALESCE(x.best_score, 0),
+            COALESCE(cp.max_score, 100)
+        ) r
+    ), deltas AS (
+        SELECT 
+            s.user_id,
+            s.problem_id,
+            s.step,
+            s.score - LAG(s.score) OVER w as score_delta,
+            s.solved - LAG(s.solved) OVER w as solved_delta,
+            s.penalty - LAG(s.penalty) OVER w as penalty_delta
+        FROM states s
+        WINDOW w AS (PARTITION BY s.user_id, s.problem_id ORDER BY s.step)
+    )
+    SELECT st.submission_id, st.user_id, st.problem_id, st.submitted_at, st.verdict,
+           d.score_delta, d.solved_delta, d.penalty_delta
+    FROM steps st
+    INNER JOIN deltas d ON d.user_id = st.user_id AND d.problem_id = st.problem_id AND d.step = st.step
+    ORDER BY st.step;
+$$ LANGUAGE sql STABLE;
+
+-- ================================================
+-- ОЧЕРЕДЬ ПРОВЕРКИ ПОСЫЛОК
+-- ================================================
+-- Проверяющие берут посылки с verdict = 'pending' в аренду (judge_leases),
+-- продлевают ее, пока проверяют, и сдают вердикты пачкой. Посылка с истекшей
+-- арендой снова выдается первому, кто попросит.
+
+-- Функция: Выдать проверяющему до p_limit свободных посылок в порядке отправки,
+-- сначала новые посылки, затем перепроверяемые (rejudge_job_id)
+-- FOR UPDATE SKIP LOCKED: конкурентные вызовы не ждут друг друга и разбирают разные посылки.
+-- Посылку, которую другой вызов успел взять и закоммитить, пока этот ждал ее блокировку,
+-- ON CONFLICT ... WHERE не перезаписывает: активная аренда не отбирается.
+-- p_languages ограничивает выдачу языками, которые проверяющий умеет запускать (NULL - любые).
+-- p_with_testcases: только посылки задач, у которых есть тесты (встроенные проверяющие
+-- проверяют по тестам из базы; без них посылка остается внешним проверяющим)
+-- p_max_attempts: посылка, которую выдавали столько раз и ни разу не проверили (проверяющий
+-- падает на ней или теряет аренду), больше не выдается (NULL - без ограничения)
+CREATE OR REPLACE FUNCTION claim_pending_submissions(
+    p_judge_id VARCHAR(64),
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_languages VARCHAR(20)[] DEFAULT NULL,
+    p_with_testcases BOOLEAN DEFAULT FALSE,
+    p_max_attempts INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    submission_id INTEGER,
+    contest_id INTEGER,
+    problem_id INTEGER,
+    user_id INTEGER,
+    language VARCHAR(20),
+    source_code TEXT,
+    submitted_at TIMESTAMP,
+    lease_expires_at TIMESTAMP,
+    attempts INTEGER
+) AS $$
+    WITH candidates AS (
+        SELECT s.submission_id
+        FROM submissions s
+        WHERE s.verdict = 'pending'
+          AND (p_languages IS NULL OR s.language = ANY(p_languages))
+          AND (NOT p_with_testcases OR EXISTS (SELECT 1 FROM testcases t WHERE t.problem_id = s.problem_id))
+          AND NOT EXISTS (
+              SELECT 1 FROM judge_leases l
+              WHERE l.submission_id = s.submission_id
+                AND (l.expires_at > LOCALTIMESTAMP OR l.attempts >= p_max_attempts)
+          )
+        ORDER BY s.rejudge_job_id IS NOT NULL, s.submitted_at, s.submission_id
+        LIMIT p_limit
+        FOR UPDATE OF s SKIP LOCKED
+    ), claimed AS (
+        INSERT INTO judge_leases (submission_id, judge_id, expires_at)
+        SELECT c.submission_id, p_judge_id, LOCALTIMESTAMP + p_lease_seconds * INTERVAL '1 second'
+        FROM candidates c
+        ON CONFLICT ON CONSTRAINT judge_leases_pkey DO UPDATE
+        SET judge_id = EXCLUDED.judge_id,
+            claimed_at = EXCLUDED.claimed_at,
+            heartbeat_at = EXCLUDED.heartbeat_at,
+            expires_at = EXCLUDED.expires_at,
+            attempts = judge_leases.attempts + 1
+        WHERE judge_leases.expires_at <= LOCALTIMESTAMP
+        RETURNING judge_leases.submission_id, judge_leases.expires_at, judge_leases.attempts
+    )
+    SELECT s.submission_id, s.contest_id, s.problem_id, s.user_id, s.language, s.source_code,
+           s.submitted_at, c.expires_at, c.attempts
+    FROM claimed c
+    INNER JOIN submissions s ON s.submission_id = c.submission_id
+    ORDER BY s.rejudge_job_id IS NOT NULL, s.submitted_at, s.submission_id;
+$$ LANGUAGE sql;
+
+-- Функция: Продлить аренду посылок проверяющего
+-- Возвращает посылки, которые все еще за ним и не проверены; остальные он потерял
+CREATE OR REPLACE FUNCTION extend_judge_leases(p_judge_id VARCHAR(64), p_submission_ids INTEGER[], p_lease_seconds INTEGER)
+RETURNS TABLE (
+    submission_id INTEGER,
+    lease_expires_at TIMESTAMP
+) AS $$
+    UPDATE judge_leases l
+    SET heartbeat_at = LOCALTIMESTAMP,
+        expires_at = LOCALTIMESTAMP + p_lease_seconds * INTERVAL '1 second'
+    FROM submissions s
+    WHERE l.submission_id = ANY(p_submission_ids)
+      AND l.judge_id = p_judge_id
+      AND s.submission_id = l.submission_id
+      AND s.verdict = 'pending'
+    RETURNING l.submission_id, l.expires_at;
+$$ LANGUAGE sql;
+
+-- Функция: Записать вердикты проверяющего одной транзакцией
+-- p_results: [{"submission_id", "verdict", "execution_time_ms", "memory_used_mb", "score"}, ...]
+-- Записывается только вердикт посылки, аренда которой за этим проверяющим.
+-- Посылки обновляются по порядку (contest_id, user_id), поэтому триггер update_standings
+-- в конкурентных пачках блокирует строки standings в одном порядке и взаимных блокировок нет.
+-- Перепроверки, у которых это были последние непроверенные посылки, завершаются при COMMIT
+-- (submissions_rejudge_verdict_trigger). Возвращает записанные посылки
+CREATE OR REPLACE FUNCTION report_judge_results(p_judge_id VARCHAR(64), p_results JSONB)
+RETURNS TABLE (
+    submission_id INTEGER,
+    contest_id INTEGER
+) AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN
+        SELECT x.submission_id, x.verdict, x.execution_time_ms, x.memory_used_mb, x.score
+        FROM jsonb_to_recordset(p_results) AS x(
+            submission_id INTEGER, verdict VARCHAR(30), execution_time_ms INTEGER,
+            memory_used_mb DECIMAL(10,2), score INTEGER
+        )
+        INNER JOIN submissions s ON s.submission_id = x.submission_id
+        ORDER BY s.contest_id, s.user_id, x.submission_id
+    LOOP
+        DELETE FROM judge_leases l
+        WHERE l.submission_id = r.submission_id AND l.judge_id = p_judge_id;
+        CONTINUE WHEN NOT FOUND;
+
+        UPDATE submissions s
+        SET verdict = r.verdict,
+            execution_time_ms = r.execution_time_ms,
+            memory_used_mb = r.memory_used_mb,
+            score = COALESCE(r.score, 0)
+        WHERE s.submission_id = r.submission_id AND s.verdict = 'pending'
+        RETURNING s.submission_id, s.contest_id
+        INTO submission_id, contest_id;
+        CONTINUE WHEN NOT FOUND;
+
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ================================================
+-- ПЕРЕПРОВЕРКА КОНТЕСТА
+-- ================================================
+-- Сброс вердиктов - один UPDATE без построчных триггеров (аудит, standings, уведомления):
+-- записи аудита посылок (по ним считаются ETag, см. app/conditional.py) пишет тот же запрос
+-- из RETURNING, как слияние COPY в пакетном импорте; кеш аналитики получает одно уведомление.
+-- Пока перепроверка идет, вердикты ее посылок не трогают standings (update_standings);
+-- когда с проверки снята последняя посылка, standings контеста пересчитываются один раз
+-- (отложенные триггеры submissions_rejudge_*_trigger).
+
+-- Функция: Завершить перепроверки, у которых не осталось непроверенных посылок
+-- Строка перепроверки блокируется до проверки остатка: из двух конкурентных пачек,
+-- сдающих последние посылки, вторая дождется коммита первой и увидит ее вердикты
+CREATE OR REPLACE FUNCTION complete_rejudge_jobs(p_job_ids INTEGER[])
+RETURNS VOID AS $$
+DECLARE
+    j RECORD;
+BEGIN
+    FOR j IN
+        SELECT rj.job_id, rj.contest_id
+        FROM rejudge_jobs rj
+        WHERE rj.job_id = ANY(p_job_ids) AND rj.status = 'judging'
+        ORDER BY rj.job_id
+        FOR UPDATE
+    LOOP
+        CONTINUE WHEN EXISTS (
+            SELECT 1 FROM submissions s WHERE s.rejudge_job_id = j.job_id AND s.verdict = 'pending'
+        );
+        UPDATE rejudge_jobs
+        SET status = 'completed', finished_at = CURRENT_TIMESTAMP
+        WHERE job_id = j.job_id;
+        PERFORM refresh_contest_standings(j.contest_id);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция: Перепроверить посылки контеста (фильтры задача, участник, вердикт; NULL - любые)
+-- Посылки, уже отобранные незавершенной перепроверкой, переходят к новой;
+-- старая перепроверка завершается при COMMIT, если у нее ничего не осталось
+CREATE OR REPLACE FUNCTION start_contest_rejudge(
+    p_contest_id INTEGER,
+    p_problem_id INTEGER DEFAULT NULL,
+    p_user_id INTEGER DEFAULT NULL,
+    p_verdict VARCHAR(30) DEFAULT NULL
+)
+RETURNS SETOF rejudge_jobs AS $$
+DECLARE
+    v_job rejudge_jobs;
+    v_bulk_import TEXT := current_setting('app.bulk_import', true);
+    v_previous_jobs INTEGER[];
+    v_total INTEGER;
+BEGIN
+    INSERT INTO rejudge_jobs (contest_id, problem_id, user_id, verdict)
+    VALUES (p_contest_id, p_problem_id, p_user_id, p_verdict)
+    RETURNING * INTO v_job;
+
+    SELECT COALESCE(array_agg(job_id), '{}') INTO v_previous_jobs
+    FROM rejudge_jobs
+    WHERE contest_id = p_contest_id AND status = 'judging' AND job_id <> v_job.job_id;
+
+    PERFORM set_config('app.bulk_import', 'on', true);
+    WITH reset AS (
+        UPDATE submissions s
+        SET verdict = 'pending',
+            execution_time_ms = NULL,
+            memory_used_mb = NULL,
+            score = 0,
+            rejudge_job_id = v_job.job_id
+        FROM submissions prev
+        WHERE prev.submission_id = s.submission_id
+          AND s.contest_id = p_contest_id
+          AND (p_problem_id IS NULL OR s.problem_id = p_problem_id)
+          AND (p_user_id IS NULL OR s.user_id = p_user_id)
+          AND (p_verdict IS NULL OR s.verdict = p_verdict)
+          AND (s.verdict <> 'pending' OR s.rejudge_job_id = ANY(v_previous_jobs))
+        RETURNING s.submission_id, row_to_json(prev)::jsonb AS old_values, row_to_json(s)::jsonb AS new_values
+    ), expired_leases AS (
+        -- Перепроверка начинает счет выдач заново, в том числе у посылок, исчерпавших попытки
+        DELETE FROM judge_leases l
+        USING reset r
+        WHERE l.submission_id = r.submission_id AND l.expires_at <= LOCALTIMESTAMP
+    )
+    INSERT INTO audit_log (table_name, operation, record_id, old_values, new_values)
+    SELECT 'submissions', 'UPDATE', r.submission_id, r.old_values, r.new_values FROM reset r;
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    PERFORM set_config('app.bulk_import', COALESCE(v_bulk_import, ''), true);
+
+    UPDATE rejudge_jobs
+    SET total_submissions = v_total,
+        status = CASE WHEN v_total = 0 THEN 'completed' ELSE 'judging' END,
+        finished_at = CASE WHEN v_total = 0 THEN CURRENT_TIMESTAMP END
+    WHERE job_id = v_job.job_id
+    RETURNING * INTO v_job;
+
+    INSERT INTO audit_log (table_name, operation, record_id, new_values)
+    VALUES ('rejudge_jobs', 'INSERT', v_job.job_id, row_to_json(v_job)::jsonb);
+
+    IF v_total > 0 THEN
+        PERFORM pg_notify('analytics_changes', 'submissions:' || p_contest_id);
+    END IF;
+    RETURN NEXT v_job;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ================================================
+-- ХРАНИЛИЩЕ БОЛЬШИХ ТЕСТОВ
+-- ================================================
+
+-- Функция: Удалить куски тестов, на которые не ссылается ни один тест
+-- Кусок, записанный или переиспользованный позже чем p_grace_seconds назад, не трогается:
+-- его может ждать еще не закоммиченная загрузка. Возвращает число удаленных кусков
+CREATE OR REPLACE FUNCTION delete_orphan_testcase_chunks(p_grace_seconds INTEGER DEFAULT 3600)
+RETURNS INTEGER AS $$
+    WITH deleted AS (
+        DELETE FROM testcase_chunks c
+        WHERE c.last_used_at < LOCALTIMESTAMP - p_grace_seconds * INTERVAL '1 second'
+          AND NOT EXISTS (SELECT 1 FROM testcases t WHERE t.input_chunks @> ARRAY[c.chunk_hash])
+          AND NOT EXISTS (SELECT 1 FROM testcases t WHERE t.output_chunks @> ARRAY[c.chunk_hash])
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM deleted;
+$$ LANGUAGE sql;
+
+-- ================================================
+-- МАТЕРИАЛИЗОВАННЫЕ ПРЕДСТАВЛЕНИЯ АНАЛИТИКИ
+-- ================================================
+
+-- Функция: Число изменений (вставки, обновления, удаления) в таблицах по статистике PostgreSQL
+CREATE OR REPLACE FUNCTION analytics_source_changes(p_tables TEXT[])
+RETURNS BIGINT AS $$
+    SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)::BIGINT
+    FROM pg_stat_user_tables
+    WHERE schemaname = current_schema() AND relname = ANY(p_tables);
+$$ LANGUAGE sql STABLE;
+
+-- Функция: Возраст снимков и число изменений с последнего обновления
+-- due = пора обновлять: накопилось refresh_min_changes изменений
+-- или прошел refresh_interval_seconds и изменения были
+CREATE OR REPLACE FUNCTION get_analytics_snapshots()
+RETURNS TABLE (
+    view_name VARCHAR(100),
+    refreshed_at TIMESTAMP,
+    age_seconds NUMERIC,
+    pending_changes BIGINT,
+    last_refresh_ms INTEGER,
+    due BOOLEAN
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        t.view_name,
+        t.refreshed_at,
+        t.age_seconds,
+        t.pending_changes,
+        t.last_refresh_ms,
+        t.refreshed_at IS NULL
+            OR t.pending_changes >= t.refresh_min_changes
+            OR (t.pending_changes > 0 AND t.age_seconds >= t.refresh_interval_seconds)
+    FROM (
+        SELECT 
+            a.view_name,
+            a.refreshed_at,
+            a.last_refresh_ms,
+            a.refresh_interval_seconds,
+            a.refresh_min_changes,
+            ROUND(EXTRACT(EPOCH FROM (clock_timestamp()::TIMESTAMP - a.refreshed_at))::NUMERIC, 1) as age_seconds,
+            -- После сброса статистики счетчик меньше сохраненного: считаем все заново
+            CASE WHEN c.total >= a.source_changes THEN c.total - a.source_changes ELSE c.total END as pending_changes
+        FROM analytics_snapshots a
+        CROSS JOIN LATERAL (SELECT analytics_source_changes(a.source_tables) as total) c
+    ) t
+    ORDER BY t.view_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функция: Обновить материализованное представление без блокировки чтения (CONCURRENTLY)
+-- p_only_if_due: обновлять, только если снимок устарел по правилам get_analytics_snapshots
+-- p_max_age_seconds: обновлять, только если снимок старше указанного возраста
+-- Возвращает TRUE, если представление было обновлено
+CREATE OR REPLACE FUNCTION refresh_analytics_view(
+    p_view_name VARCHAR(100),
+    p_only_if_due BOOLEAN DEFAULT FALSE,
+    p_max_age_seconds INTEGER DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_snapshot RECORD;
+    v_sources TEXT[];
+    v_total BIGINT;
+    v_started TIMESTAMP := clock_timestamp();
+BEGIN
+    -- Одно обновление представления за раз; остальные процессы ждут
+    -- и затем заново проверяют условия, поэтому повторно не обновляют
+    PERFORM pg_advisory_xact_lock('analytics_snapshots'::regclass::oid::INTEGER, hashtext(p_view_name));
+
+    SELECT * INTO v_snapshot FROM get_analytics_snapshots() s WHERE s.view_name = p_view_name;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Unknown analytics view: %', p_view_name;
+    END IF;
+    IF p_only_if_due AND NOT v_snapshot.due THEN
+        RETURN FALSE;
+    END IF;
+    IF p_max_age_seconds IS NOT NULL AND v_snapshot.age_seconds <= p_max_age_seconds THEN
+        RETURN FALSE;
+    END IF;
+
+    -- Счетчик снимается до обновления: изменения во время REFRESH попадут в следующий
+    SELECT source_tables INTO v_sources FROM analytics_snapshots WHERE view_name = p_view_name;
+    v_total := analytics_source_changes(v_sources);
+
+    EXECUTE format('REFRESH MATERIALIZED VIEW CONCURRENTLY %I', p_view_name);
+
+    UPDATE analytics_snapshots
+    SET refreshed_at = clock_timestamp(),
+        source_changes = v_total,
+        last_refresh_ms = (EXTRACT(EPOCH FROM (clock_timestamp() - v_started)) * 1000)::INTEGER
+    WHERE view_name = p_view_name;
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
@@ -15,14 +15,43 @@ SELECT
     s.total_score,
     s.problems_solved,
     s.penalty_time,
-    s.rank,
+    ROW_NUMBER() OVER (
+        PARTITION BY c.contest_id
+        ORDER BY s.total_score DESC, s.penalty_time ASC, s.user_id ASC
+    ) as rank,
     s.last_updated
 FROM standings s
 INNER JOIN contests c ON s.contest_id = c.contest_id
 INNER JOIN users u ON s.user_id = u.user_id
-ORDER BY c.contest_id, s.rank;
+ORDER BY c.contest_id, rank;
 
-COMMENT ON VIEW v_contest_standings IS 'Детальная турнирная таблица со всеми контестами';
+COMMENT ON VIEW v_contest_standings IS 'Детальная турнирная таблица со всеми контестами (место вычисляется при чтении)';
+
+-- VIEW 1a: Замороженная турнирная таблица (снимок frozen_standings) с теми же столбцами
+CREATE OR REPLACE VIEW v_frozen_contest_standings AS
+SELECT 
+    st.standing_id,
+    c.contest_id,
+    c.title as contest_title,
+    u.user_id,
+    u.username,
+    u.full_name,
+    u.country,
+    f.total_score,
+    f.problems_solved,
+    f.penalty_time,
+    ROW_NUMBER() OVER (
+        PARTITION BY c.contest_id
+        ORDER BY f.total_score DESC, f.penalty_time ASC, f.user_id ASC
+    ) as rank,
+    f.last_updated
+FROM frozen_standings f
+INNER JOIN contests c ON f.contest_id = c.contest_id
+INNER JOIN users u ON f.user_id = u.user_id
+LEFT JOIN standings st ON st.contest_id = f.contest_id AND st.user_id = f.user_id
+ORDER BY c.contest_id, rank;
+
+COMMENT ON VIEW v_frozen_contest_standings IS 'Публичная турнирная таблица на момент заморозки';
 
 -- VIEW 2: Статистика пользователей
 CREATE OR REPLACE VIEW v_user_statistics AS
@@ -54,6 +83,7 @@ ORDER BY u.rating DESC;
 COMMENT ON VIEW v_user_statistics IS 'Агрегированная статистика по пользователям-участникам';
 
 -- VIEW 3: Статистика по задачам
+-- Теги собираются подзапросом, чтобы JOIN с тегами не размножал посылки
 CREATE OR REPLACE VIEW v_problem_statistics AS
 SELECT 
     p.problem_id,
@@ -62,7 +92,7 @@ SELECT
     p.time_limit_ms,
     p.memory_limit_mb,
     u.username as author_name,
-    COUNT(DISTINCT s.submission_id) as total_submissions,
+    COUNT(s.submission_id) as total_submissions,
     COUNT(DISTINCT s.user_id) as unique_users_attempted,
     COUNT(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.user_id END) as unique_users_solved,
     COUNT(CASE WHEN s.verdict = 'accepted' THEN 1 END) as accepted_count,
@@ -73,14 +103,18 @@ SELECT
     END as acceptance_rate,
     AVG(CASE WHEN s.verdict = 'accepted' THEN s.execution_time_ms END)::INTEGER as avg_execution_time_ms,
     MIN(CASE WHEN s.verdict = 'accepted' THEN s.execution_time_ms END) as best_execution_time_ms,
-    STRING_AGG(DISTINCT t.tag_name, ', ' ORDER BY t.tag_name) as tags,
+    pt.tags,
     p.created_at
 FROM problems p
 INNER JOIN users u ON p.author_id = u.user_id
 LEFT JOIN submissions s ON p.problem_id = s.problem_id
-LEFT JOIN problem_tags pt ON p.problem_id = pt.problem_id
-LEFT JOIN tags t ON pt.tag_id = t.tag_id
-GROUP BY p.problem_id, p.title, p.difficulty, p.time_limit_ms, p.memory_limit_mb, u.username, p.created_at
+LEFT JOIN LATERAL (
+    SELECT STRING_AGG(t.tag_name, ', ' ORDER BY t.tag_name) as tags
+    FROM problem_tags pt
+    INNER JOIN tags t ON pt.tag_id = t.tag_id
+    WHERE pt.problem_id = p.problem_id
+) pt ON TRUE
+GROUP BY p.problem_id, p.title, p.difficulty, p.time_limit_ms, p.memory_limit_mb, u.username, p.created_at, pt.tags
 ORDER BY p.problem_id;
 
 COMMENT ON VIEW v_problem_statistics IS 'Детальная статистика по задачам с тегами и метриками';
@@ -112,3 +146,92 @@ GROUP BY s.verdict
 ORDER BY count DESC;
 
 COMMENT ON VIEW v_verdict_distribution IS 'Распределение вердиктов по посылкам';
+
+-- VIEW 6: Состояние решения задач участниками
+-- Источник для standing_problems: при фильтре по (contest_id, user_id, problem_id)
+-- читает только посылки этой тройки по idx_submissions_contest_user_problem
+CREATE OR REPLACE VIEW v_standing_problem_state AS
+SELECT 
+    t.contest_id,
+    t.user_id,
+    t.problem_id,
+    t.attempts,
+    t.solved,
+    t.first_ac_at,
+    t.solve_minute,
+    t.rejected_attempts,
+    t.best_score,
+    t.best_time_ms,
+    r.score,
+    r.penalty
+FROM (
+    SELECT 
+        s.contest_id,
+        s.user_id,
+        s.problem_id,
+        COUNT(*)::INTEGER as attempts,
+        BOOL_OR(s.verdict = 'accepted') as solved,
+        s.first_ac_at,
+        GREATEST(FLOOR(EXTRACT(EPOCH FROM (s.first_ac_at - c.start_time)) / 60), 0)::INTEGER as solve_minute,
+        COUNT(*) FILTER (
+            WHERE s.verdict IN ('wrong_answer', 'time_limit', 'memory_limit', 'runtime_error')
+              AND (s.first_ac_at IS NULL OR s.submitted_at < s.first_ac_at)
+        )::INTEGER as rejected_attempts,
+        COALESCE(MAX(s.score), 0) as best_score,
+        MIN(s.execution_time_ms) as best_time_ms,
+        c.contest_type,
+        COALESCE(cp.max_score, 100) as max_score
+    FROM (
+        SELECT 
+            sub.*,
+            MIN(sub.submitted_at) FILTER (WHERE sub.verdict = 'accepted') OVER (
+                PARTITION BY sub.contest_id, sub.user_id, sub.problem_id
+            ) as first_ac_at
+        FROM submissions sub
+    ) s
+    INNER JOIN contests c ON s.contest_id = c.contest_id
+    LEFT JOIN contest_problems cp ON cp.contest_id = s.contest_id AND cp.problem_id = s.problem_id
+    GROUP BY s.contest_id, s.user_id, s.problem_id, s.first_ac_at,
+             c.contest_type, c.start_time, cp.max_score
+) t
+CROSS JOIN LATERAL apply_scoring_rule(
+    t.contest_type, t.solved, t.solve_minute, t.rejected_attempts, t.best_score, t.max_score
+) r;
+
+COMMENT ON VIEW v_standing_problem_state IS 'Состояние решения каждой задачи участником с очками и штрафом по правилу контеста';
+
+-- ================================================
+-- МАТЕРИАЛИЗОВАННЫЕ ПРЕДСТАВЛЕНИЯ АНАЛИТИКИ
+-- ================================================
+-- Снимки VIEW 2-5 для /analytics: чтение без пересчета всей таблицы submissions.
+-- Обновляются через refresh_analytics_view (CONCURRENTLY, по уникальным индексам
+-- из 05_indexes.sql) по расписанию из analytics_snapshots.
+
+DROP MATERIALIZED VIEW IF EXISTS mv_user_statistics;
+CREATE MATERIALIZED VIEW mv_user_statistics AS SELECT * FROM v_user_statistics;
+
+DROP MATERIALIZED VIEW IF EXISTS mv_problem_statistics;
+CREATE MATERIALIZED VIEW mv_problem_statistics AS SELECT * FROM v_problem_statistics;
+
+DROP MATERIALIZED VIEW IF EXISTS mv_language_statistics;
+CREATE MATERIALIZED VIEW mv_language_statistics AS SELECT * FROM v_language_statistics;
+
+DROP MATERIALIZED VIEW IF EXISTS mv_verdict_distribution;
+CREATE MATERIALIZED VIEW mv_verdict_distribution AS SELECT * FROM v_verdict_distribution;
+
+COMMENT ON MATERIALIZED VIEW mv_user_statistics IS 'Снимок v_user_statistics';
+COMMENT ON MATERIALIZED VIEW mv_problem_statistics IS 'Снимок v_problem_statistics';
+COMMENT ON MATERIALIZED VIEW mv_language_statistics IS 'Снимок v_language_statistics';
+COMMENT ON MATERIALIZED VIEW mv_verdict_distribution IS 'Снимок v_verdict_distribution';
+
+INSERT INTO analytics_snapshots (view_name, source_tables, refreshed_at, source_changes)
+VALUES
+    ('mv_user_statistics', ARRAY['users', 'submissions'], CURRENT_TIMESTAMP,
+     analytics_source_changes(ARRAY['users', 'submissions'])),
+    ('mv_problem_statistics', ARRAY['problems', 'users', 'submissions', 'problem_tags', 'tags'], CURRENT_TIMESTAMP,
+     analytics_source_changes(ARRAY['problems', 'users', 'submissions', 'problem_tags', 'tags'])),
+    ('mv_language_statistics', ARRAY['submissions'], CURRENT_TIMESTAMP,
+     analytics_source_changes(ARRAY['submissions'])),
+    ('mv_verdict_distribution', ARRAY['submissions'], CURRENT_TIMESTAMP,
+     analytics_source_changes(ARRAY['submissions']))
+ON CONFLICT (view_name) DO NOTHING;
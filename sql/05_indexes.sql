@@ -18,23 +18,44 @@ CREATE INDEX idx_problems_difficulty ON problems(difficulty);
 CREATE INDEX idx_problems_author ON problems(author_id);
 
 -- Индексы для таблицы Submissions
-CREATE INDEX idx_submissions_user ON submissions(user_id);
-CREATE INDEX idx_submissions_contest ON submissions(contest_id);
-CREATE INDEX idx_submissions_problem ON submissions(problem_id);
-CREATE INDEX idx_submissions_verdict ON submissions(verdict);
-CREATE INDEX idx_submissions_submitted_at ON submissions(submitted_at DESC);
--- Композитный индекс для частых JOIN'ов
-CREATE INDEX idx_submissions_contest_user ON submissions(contest_id, user_id);
+-- Ленточная выдача посылок: ORDER BY submitted_at DESC, submission_id DESC и курсор по этой паре
+CREATE INDEX idx_submissions_submitted_at ON submissions(submitted_at DESC, submission_id DESC);
+-- Фильтры GET /submissions/: равенство по столбцу + порядок ленты, страница читается
+-- из индекса без сортировки; префикс покрывает прежние запросы по одному столбцу
+CREATE INDEX idx_submissions_user ON submissions(user_id, submitted_at DESC, submission_id DESC);
+CREATE INDEX idx_submissions_contest ON submissions(contest_id, submitted_at DESC, submission_id DESC);
+CREATE INDEX idx_submissions_problem ON submissions(problem_id, submitted_at DESC, submission_id DESC);
+CREATE INDEX idx_submissions_verdict ON submissions(verdict, submitted_at DESC, submission_id DESC);
+-- Частичный индекс: очередь непроверенных посылок мала по сравнению с таблицей
+CREATE INDEX idx_submissions_pending ON submissions(contest_id, submitted_at, submission_id) WHERE verdict = 'pending';
+-- Очередь проверки (claim_pending_submissions): непроверенные посылки всех контестов
+-- в порядке отправки, без сортировки и без чтения проверенных посылок
+CREATE INDEX idx_submissions_judge_queue ON submissions((rejudge_job_id IS NOT NULL), submitted_at, submission_id)
+WHERE verdict = 'pending';
+-- Перепроверки: остаток непроверенных посылок и прогресс (complete_rejudge_jobs, GET .../rejudge/{job_id})
+CREATE INDEX idx_submissions_rejudge_job ON submissions(rejudge_job_id, verdict) WHERE rejudge_job_id IS NOT NULL;
+-- Композитный индекс для частых JOIN'ов и пересчета состояния задачи участника
+-- в триггере update_standings (префикс (contest_id, user_id) покрывает прежние запросы)
+CREATE INDEX idx_submissions_contest_user_problem ON submissions(contest_id, user_id, problem_id);
 CREATE INDEX idx_submissions_problem_verdict ON submissions(problem_id, verdict);
 
 -- Индексы для таблицы Standings
-CREATE INDEX idx_standings_contest ON standings(contest_id);
+-- Версия турнирной таблицы для ETag: MAX(last_updated) контеста читается из индекса
+CREATE INDEX idx_standings_contest ON standings(contest_id, last_updated DESC);
 CREATE INDEX idx_standings_user ON standings(user_id);
-CREATE INDEX idx_standings_rank ON standings(contest_id, rank);
+-- Порядок турнирной таблицы: место вычисляется при чтении по этому индексу
+CREATE INDEX idx_standings_leaderboard ON standings(contest_id, total_score DESC, penalty_time ASC, user_id);
 CREATE INDEX idx_standings_score ON standings(total_score DESC);
 
+-- Индексы для таблицы Standing_Problems
+CREATE INDEX idx_standing_problems_user ON standing_problems(user_id);
+CREATE INDEX idx_standing_problems_problem ON standing_problems(problem_id);
+
 -- Индексы для таблицы Testcases
 CREATE INDEX idx_testcases_problem ON testcases(problem_id);
+-- Поиск ссылок на кусок (delete_orphan_testcase_chunks)
+CREATE INDEX idx_testcases_input_chunks ON testcases USING GIN (input_chunks);
+CREATE INDEX idx_testcases_output_chunks ON testcases USING GIN (output_chunks);
 
 -- Индексы для таблицы Contest_Problems
 CREATE INDEX idx_contest_problems_contest ON contest_problems(contest_id);
@@ -44,7 +65,26 @@ CREATE INDEX idx_contest_problems_problem ON contest_problems(problem_id);
 CREATE INDEX idx_tags_name ON tags(tag_name);
 
 -- Индексы для таблицы Audit_Log
-CREATE INDEX idx_audit_table ON audit_log(table_name);
+-- Время последнего изменения таблицы и записи (ETag / Last-Modified) - MAX(changed_at)
+-- по индексу; префиксы покрывают прежние запросы по table_name и (table_name, record_id)
+CREATE INDEX idx_audit_table ON audit_log(table_name, changed_at DESC);
 CREATE INDEX idx_audit_operation ON audit_log(operation);
 CREATE INDEX idx_audit_changed_at ON audit_log(changed_at DESC);
-CREATE INDEX idx_audit_record ON audit_log(table_name, record_id);
+CREATE INDEX idx_audit_record ON audit_log(table_name, record_id, changed_at DESC);
+-- Последнее изменение посылок контеста (лидерборд, сводка контеста): контест берется из записи,
+-- при удалении - из старой; вторым индексом - контест, из которого посылку перенесли
+CREATE INDEX idx_audit_submission_contest ON audit_log(((COALESCE(new_values, old_values)->>'contest_id')::INTEGER), changed_at DESC)
+    WHERE table_name = 'submissions';
+CREATE INDEX idx_audit_submission_moved ON audit_log(((old_values->>'contest_id')::INTEGER), changed_at DESC)
+    WHERE table_name = 'submissions' AND operation = 'UPDATE'
+      AND old_values->'contest_id' IS DISTINCT FROM new_values->'contest_id';
+
+-- Индексы для таблицы Batch_Jobs
+-- Частичный индекс: при старте API ищутся только незавершенные задачи
+CREATE INDEX idx_batch_jobs_active ON batch_jobs(job_id) WHERE status IN ('queued', 'running');
+
+-- Уникальные индексы материализованных представлений (нужны для REFRESH ... CONCURRENTLY)
+CREATE UNIQUE INDEX idx_mv_user_statistics_user ON mv_user_statistics(user_id);
+CREATE UNIQUE INDEX idx_mv_problem_statistics_problem ON mv_problem_statistics(problem_id);
+CREATE UNIQUE INDEX idx_mv_language_statistics_language ON mv_language_statistics(language);
+CREATE UNIQUE INDEX idx_mv_verdict_distribution_verdict ON mv_verdict_distribution(verdict);
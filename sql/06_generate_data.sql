@@ -190,25 +190,23 @@ BEGIN
     END LOOP;
 END $$;
 
--- Генерируем standings на основе реальных посылок
+-- Генерируем standings на основе реальных посылок.
+-- Участники с accepted уже получили строки через триггер update_standings,
+-- здесь добавляются нулевые строки для остальных участников контестов
 INSERT INTO standings (contest_id, user_id, total_score, problems_solved, penalty_time)
-SELECT 
+SELECT DISTINCT
     s.contest_id,
     s.user_id,
-    COALESCE(SUM(DISTINCT 
-        CASE 
-            WHEN s.verdict = 'accepted' 
-            THEN (SELECT MAX(score) FROM submissions s2 
-                  WHERE s2.contest_id = s.contest_id 
-                  AND s2.user_id = s.user_id 
-                  AND s2.problem_id = s.problem_id)
-            ELSE 0 
-        END
-    ), 0)::INTEGER as total_score,
-    COUNT(DISTINCT CASE WHEN s.verdict = 'accepted' THEN s.problem_id END)::INTEGER as problems_solved,
-    COALESCE(SUM(EXTRACT(EPOCH FROM (s.submitted_at - c.start_time))::INTEGER / 60), 0)::INTEGER as penalty_time
+    0,
+    0,
+    0
 FROM submissions s
 JOIN contests c ON s.contest_id = c.contest_id
 WHERE c.status IN ('finished', 'running')
-GROUP BY s.contest_id, s.user_id
-ON CONFLICT (contest_id, user_id) DO NOTHING;
\ No newline at end of file
+ON CONFLICT (contest_id, user_id) DO NOTHING;
+
+-- Снимки аналитики по сгенерированным данным
+DO $$
+BEGIN
+    PERFORM refresh_analytics_view(view_name) FROM analytics_snapshots;
+END $$;
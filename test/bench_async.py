@@ -0,0 +1,111 @@
+"""
+Бенчмарк предела параллельности: синхронные обработчики (threadpool) против async (asyncpg)
+Для каждого режима (DB_ASYNC=false/true) запускает uvicorn и нагружает горячие эндпоинты
+(турнирная таблица, лидерборд, создание посылки) при разном числе одновременных запросов.
+Пул соединений увеличен до 80 (max_connections в PostgreSQL по умолчанию 100), чтобы ограничением был обработчик, а не пул.
+Запуск: python bench_async.py [секунд на уровень]   (по умолчанию 5), из каталога backend
+Требует httpx
+"""
+import os
+import sys
+import time
+import asyncio
+import subprocess
+import statistics
+import httpx
+import requests
+
+PORT = 8001
+BASE_URL = f"http://localhost:{PORT}"
+CONCURRENCY = [10, 40, 100, 200]
+POOL_ENV = {"DB_POOL_SIZE": "80", "DB_MAX_OVERFLOW": "0"}
+
+
+def start_server(env):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+        env={**os.environ, **POOL_ENV, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"{BASE_URL}/health")
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    return server
+
+
+async def worker(client, deadline, refs, timings, errors, seed):
+    i = seed
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if i % 3 == 0:
+                response = await client.get(f"/analytics/standings/{refs['read_contest_id']}")
+            elif i % 3 == 1:
+                response = await client.get(f"/analytics/contests/{refs['read_contest_id']}/leaderboard")
+            else:
+                response = await client.post("/submissions/", json={
+                    "contest_id": refs["write_contest_id"],
+                    "problem_id": refs["problem_ids"][i % len(refs["problem_ids"])],
+                    "user_id": refs["user_ids"][i % len(refs["user_ids"])],
+                    "source_code": "// bench async", "language": "C++",
+                })
+        except httpx.TransportError as e:
+            errors.append(type(e).__name__)
+            continue
+        finally:
+            i += 1
+        if response.status_code in (200, 201):
+            timings.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(response.status_code)
+
+
+async def sample_pool(client, deadline, peak):
+    """Максимум одновременно выданных соединений за прогон"""
+    while time.perf_counter() < deadline:
+        pool = (await client.get("/health/db-pool")).json()
+        checked_out = pool["async_pool"]["checked_out"] if pool["async_endpoints"] else pool["checked_out"]
+        peak[0] = max(peak[0], checked_out)
+        await asyncio.sleep(0.05)
+
+
+async def run_level(concurrency, seconds, refs):
+    timings, errors, peak = [], [], [0]
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            sample_pool(client, deadline, peak),
+            *[worker(client, deadline, refs, timings, errors, seed) for seed in range(concurrency)],
+        )
+    timings.sort()
+    return len(timings) / seconds, statistics.median(timings), timings[int(len(timings) * 0.95) - 1], peak[0], len(errors)
+
+
+def main():
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'mode':>6} | {'clients':>7} | {'req/s':>7} | {'p50, ms':>8} | {'p95, ms':>8} | {'peak conns':>10} | {'errors':>6}")
+    print("-" * 70)
+    for label, env in [("sync", {"DB_ASYNC": "false"}), ("async", {"DB_ASYNC": "true"})]:
+        server = start_server(env)
+        try:
+            contests = requests.get(f"{BASE_URL}/contests/").json()
+            # Writes go to another contest so the read queries do not grow during the run
+            refs = {
+                "read_contest_id": contests[0]["contest_id"],
+                "write_contest_id": contests[-1]["contest_id"],
+                "problem_ids": [p["problem_id"] for p in requests.get(f"{BASE_URL}/problems/", params={"limit": 10}).json()],
+                "user_ids": [u["user_id"] for u in requests.get(f"{BASE_URL}/users/", params={"limit": 100}).json()],
+            }
+            for concurrency in CONCURRENCY:
+                rps, p50, p95, peak, errors = asyncio.run(run_level(concurrency, seconds, refs))
+                print(f"{label:>6} | {concurrency:>7} | {rps:>7.0f} | {p50:>8.1f} | {p95:>8.1f} | {peak:>10} | {errors:>6}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
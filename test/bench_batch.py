@@ -0,0 +1,94 @@
+"""
+Бенчмарк пропускной способности /batch/import: ORM-режим против COPY
+и ORM-режим при разных chunk_size (с 1% заведомо ошибочных строк)
+Запуск: python bench_batch.py [число строк]   (по умолчанию 2000)
+Внимание: создает реальные записи (bench_batch_*) в базе, на которую смотрит API
+"""
+import sys
+import time
+import requests
+from datetime import datetime
+
+BASE_URL = "http://localhost:8000"
+CHUNK_SIZES = [1, 10, 100, 1000]
+
+
+def make_rows(entity_type, count, tag, refs):
+    """Генерирует строки импорта для сущности"""
+    if entity_type == "users":
+        return [{
+            "username": f"bench_batch_{tag}_{i}",
+            "email": f"bench_batch_{tag}_{i}@example.com",
+            "full_name": f"Bench User {i}",
+            "role": "participant",
+        } for i in range(count)]
+    if entity_type == "contests":
+        return [{
+            "title": f"Bench contest {tag} {i}",
+            "contest_type": "ACM_ICPC",
+            "start_time": datetime.now().isoformat(),
+            "duration_minutes": 120,
+            "created_by": refs["user_id"],
+        } for i in range(count)]
+    if entity_type == "problems":
+        return [{
+            "title": f"Bench problem {tag} {i}",
+            "description": "Bench problem",
+            "author_id": refs["user_id"],
+        } for i in range(count)]
+    return [{
+        "contest_id": refs["contest_id"],
+        "problem_id": refs["problem_ids"][i % len(refs["problem_ids"])],
+        "user_id": refs["user_ids"][i % len(refs["user_ids"])],
+        "source_code": f"// bench {tag} {i}",
+        "language": "C++",
+        "verdict": "accepted" if i % 4 == 0 else "wrong_answer",
+        "score": 100 if i % 4 == 0 else 0,
+    } for i in range(count)]
+
+
+def run_import(entity_type, mode, rows, chunk_size=100):
+    start = time.perf_counter()
+    response = requests.post(f"{BASE_URL}/batch/import",
+                             json={"entity_type": entity_type, "mode": mode,
+                                   "chunk_size": chunk_size, "data": rows})
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return elapsed, response.json()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    contest = requests.get(f"{BASE_URL}/contests/").json()[0]
+    problems = requests.get(f"{BASE_URL}/problems/", params={"limit": 10}).json()
+    users = requests.get(f"{BASE_URL}/users/", params={"limit": 100}).json()
+    refs = {
+        "contest_id": contest["contest_id"],
+        "user_id": users[0]["user_id"],
+        "user_ids": [user["user_id"] for user in users],
+        "problem_ids": [problem["problem_id"] for problem in problems],
+    }
+
+    print(f"Строк в пакете: {count}")
+    print(f"{'entity':>12} | {'mode':>5} | {'seconds':>8} | {'rows/s':>9} | {'success':>7}")
+    print("-" * 55)
+    for entity_type in ["users", "contests", "problems", "submissions"]:
+        for mode in ["orm", "copy"]:
+            tag = f"{mode}_{datetime.now().timestamp()}"
+            elapsed, result = run_import(entity_type, mode, make_rows(entity_type, count, tag, refs))
+            print(f"{entity_type:>12} | {mode:>5} | {elapsed:>8.2f} | {count / elapsed:>9.0f} | {result['success']:>7}")
+
+    print()
+    print("ORM-режим, users, каждая сотая строка с недопустимой ролью")
+    print(f"{'chunk_size':>10} | {'seconds':>8} | {'rows/s':>9} | {'success':>7} | {'failed':>6}")
+    print("-" * 53)
+    for chunk_size in CHUNK_SIZES:
+        rows = make_rows("users", count, f"chunk{chunk_size}_{datetime.now().timestamp()}", refs)
+        for row in rows[::100]:
+            row["role"] = "invalid_role"
+        elapsed, result = run_import("users", "orm", rows, chunk_size)
+        print(f"{chunk_size:>10} | {elapsed:>8.2f} | {count / elapsed:>9.0f} | {result['success']:>7} | {result['failed']:>6}")
+
+
+if __name__ == "__main__":
+    main()
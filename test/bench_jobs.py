@@ -0,0 +1,82 @@
+"""
+Нагрузочный тест фоновых задач импорта: задержка API во время импорта
+Сравнивает задержку GET-запросов без импорта, во время синхронного /batch/import
+и во время фоновой задачи /batch/jobs
+Запуск: python bench_jobs.py [число строк]   (по умолчанию 100000)
+Внимание: создает реальные записи (bench_job_*) в базе, на которую смотрит API
+"""
+import sys
+import time
+import threading
+import statistics
+import requests
+from datetime import datetime
+
+BASE_URL = "http://localhost:8000"
+PROBE_URLS = ["/contests/", "/users/?limit=20", "/analytics/verdict-stats"]
+
+
+def make_rows(count, tag):
+    return [{
+        "username": f"bench_job_{tag}_{i}",
+        "email": f"bench_job_{tag}_{i}@example.com",
+        "full_name": f"Bench Job User {i}",
+        "role": "participant",
+    } for i in range(count)]
+
+
+def probe(stop, timings):
+    """Опрашивает легкие эндпоинты, пока не выставлен stop"""
+    while not stop.is_set():
+        for url in PROBE_URLS:
+            start = time.perf_counter()
+            requests.get(f"{BASE_URL}{url}").raise_for_status()
+            timings.append((time.perf_counter() - start) * 1000)
+
+
+def measure(label, work):
+    """Задержка проб во время выполнения work()"""
+    stop = threading.Event()
+    timings = []
+    prober = threading.Thread(target=probe, args=(stop, timings))
+    prober.start()
+    start = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+    timings.sort()
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{label:>16} | {elapsed:>8.1f} | {len(timings):>6} | {statistics.median(timings):>8.1f} | {p95:>8.1f} | {timings[-1]:>8.1f}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    def idle():
+        time.sleep(5)
+
+    def sync_import():
+        rows = make_rows(count, f"sync_{datetime.now().timestamp()}")
+        requests.post(f"{BASE_URL}/batch/import",
+                      json={"entity_type": "users", "chunk_size": 1000, "data": rows}).raise_for_status()
+
+    def background_job():
+        rows = make_rows(count, f"job_{datetime.now().timestamp()}")
+        response = requests.post(f"{BASE_URL}/batch/jobs",
+                                 json={"entity_type": "users", "chunk_size": 1000, "data": rows})
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while requests.get(f"{BASE_URL}/batch/jobs/{job_id}").json()["status"] in ("queued", "running"):
+            time.sleep(0.5)
+
+    print(f"Строк в импорте: {count}")
+    print(f"{'scenario':>16} | {'seconds':>8} | {'probes':>6} | {'p50, ms':>8} | {'p95, ms':>8} | {'max, ms':>8}")
+    print("-" * 72)
+    measure("idle", idle)
+    measure("sync import", sync_import)
+    measure("background job", background_job)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Бенчмарк пропускной способности API при разных настройках пула соединений
+Для каждой конфигурации запускает uvicorn с нужными переменными окружения,
+нагружает его параллельными клиентами и читает метрики пула из /health/db-pool
+Запуск: python bench_pool.py [клиентов] [секунд]   (по умолчанию 32 и 10), из каталога backend
+"""
+import os
+import sys
+import time
+import threading
+import subprocess
+import statistics
+import requests
+
+PORT = 8001
+BASE_URL = f"http://localhost:{PORT}"
+LOAD_URLS = ["/analytics/top-participants", "/contests/", "/analytics/verdict-stats"]
+CONFIGS = [
+    ("pool 2, overflow 0", {"DB_POOL_SIZE": "2", "DB_MAX_OVERFLOW": "0"}),
+    ("pool 5, overflow 10", {"DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10"}),
+    ("pool 20, overflow 20", {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "20"}),
+    ("pool 20 + pre-ping", {"DB_POOL_SIZE": "20", "DB_MAX_OVERFLOW": "20", "DB_POOL_PRE_PING": "true"}),
+    ("NullPool", {"DB_PGBOUNCER": "true"}),
+]
+
+
+def client(stop, timings, errors):
+    session = requests.Session()
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = session.get(f"{BASE_URL}{LOAD_URLS[i % len(LOAD_URLS)]}")
+        if response.status_code == 200:
+            timings.append((time.perf_counter() - start) * 1000)
+        else:
+            errors.append(response.status_code)
+        i += 1
+
+
+def run_config(env, clients, seconds):
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+        env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                requests.get(f"{BASE_URL}/health")
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        stop = threading.Event()
+        timings, errors = [], []
+        threads = [threading.Thread(target=client, args=(stop, timings, errors)) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        pool = requests.get(f"{BASE_URL}/health/db-pool").json()
+    finally:
+        server.terminate()
+        server.wait()
+    timings.sort()
+    return {
+        "rps": len(timings) / seconds,
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "errors": len(errors),
+        "pool": pool,
+    }
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"Клиентов: {clients}, длительность: {seconds} с")
+    print(f"{'config':>22} | {'req/s':>7} | {'p50, ms':>8} | {'p95, ms':>8} | {'wait avg':>8} | {'wait max':>8} | {'overflow':>8} | {'errors':>6}")
+    print("-" * 98)
+    for label, env in CONFIGS:
+        result = run_config(env, clients, seconds)
+        pool = result["pool"]
+        print(f"{label:>22} | {result['rps']:>7.0f} | {result['p50']:>8.1f} | {result['p95']:>8.1f} | "
+              f"{pool['wait_avg_ms']:>8.2f} | {pool['wait_max_ms']:>8.1f} | {pool['overflow_events']:>8} | {result['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Микробенчмарк сериализации ответов аналитики: прежний путь
+([dict(row._mapping)] -> jsonable_encoder -> json.dumps в JSONResponse) против
+FastJSONResponse (row_dicts -> orjson) на одних и тех же строках
+Для каждого эндпоинта: время сериализации (медиана) и пик выделенной памяти (tracemalloc)
+SQL выполняется один раз, замеряется только превращение строк в тело ответа
+Запуск: python bench_serialization.py [повторов]   (по умолчанию 50)
+"""
+import os
+import sys
+import time
+import statistics
+import tracemalloc
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.database import engine
+from app.responses import FastJSONResponse, row_dicts
+from app.routes.analytics import LEADERBOARD_QUERY, STANDINGS_QUERY
+
+BUSIEST_CONTEST = text("SELECT contest_id FROM submissions GROUP BY contest_id ORDER BY COUNT(*) DESC LIMIT 1")
+ENDPOINTS = [
+    ("contests/{id}/leaderboard", LEADERBOARD_QUERY),
+    ("standings/{id}", STANDINGS_QUERY),
+    ("users/statistics/all", text("SELECT * FROM mv_user_statistics ORDER BY rating DESC, user_id LIMIT 50")),
+    ("problems/statistics/all", text("SELECT * FROM mv_problem_statistics ORDER BY problem_id")),
+    ("problems/statistics/detailed", text("SELECT * FROM get_problem_statistics()")),
+    ("audit-log?limit=1000", text("SELECT * FROM audit_log ORDER BY changed_at DESC LIMIT 1000")),
+    ("audit-log?limit=10000", text("SELECT * FROM audit_log ORDER BY changed_at DESC LIMIT 10000")),
+]
+
+
+def old_path(result):
+    return JSONResponse(jsonable_encoder([dict(row._mapping) for row in result])).body
+
+
+def new_path(result):
+    return FastJSONResponse(row_dicts(result)).body
+
+
+def measure(frozen, serialize, repeats):
+    """Медиана времени в мс и пик памяти в КБ; frozen() отдает свежий Result с теми же строками"""
+    timings = []
+    for _ in range(repeats):
+        result = frozen()
+        start = time.perf_counter()
+        serialize(result)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    serialize(frozen())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 1024
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with engine.connect() as connection:
+        contest_id = connection.execute(BUSIEST_CONTEST).scalar()
+        print(f"Повторов: {repeats}, контест: {contest_id}")
+        print(f"{'endpoint':>28} | {'rows':>5} | {'old, ms':>8} | {'new, ms':>8} | {'speedup':>7} | "
+              f"{'old peak, KB':>12} | {'new peak, KB':>12} | same")
+        print("-" * 110)
+        for name, query in ENDPOINTS:
+            frozen = connection.execute(query, {"contest_id": contest_id}).freeze()
+            rows = len(frozen().all())
+            old_ms, old_kb = measure(frozen, old_path, repeats)
+            new_ms, new_kb = measure(frozen, new_path, repeats)
+            same = old_path(frozen()) == new_path(frozen())
+            print(f"{name:>28} | {rows:>5} | {old_ms:>8.3f} | {new_ms:>8.3f} | {old_ms / new_ms:>6.1f}x | "
+                  f"{old_kb:>12.0f} | {new_kb:>12.0f} | {'✓' if same else '✗'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Бенчмарк эндпоинтов статистики: живое представление (max_age=0)
+против материализованного снимка (по умолчанию) и время REFRESH CONCURRENTLY
+Запуск: python bench_snapshots.py [запросов на эндпоинт]   (по умолчанию 50)
+"""
+import sys
+import time
+import statistics
+import requests
+
+BASE_URL = "http://localhost:8000/analytics"
+ENDPOINTS = {
+    "/users/statistics/all": "mv_user_statistics",
+    "/problems/statistics/all": "mv_problem_statistics",
+    "/languages/statistics": "mv_language_statistics",
+    "/verdicts/distribution": "mv_verdict_distribution",
+}
+
+
+def measure(path, params, count):
+    """Задержка запроса, мс"""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        requests.get(f"{BASE_URL}{path}", params=params).raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    print(f"Запросов на эндпоинт: {count}")
+    print(f"{'endpoint':>26} | {'live p50, ms':>12} | {'snapshot p50, ms':>16} | {'refresh, ms':>11}")
+    print("-" * 76)
+    for path, view_name in ENDPOINTS.items():
+        live = measure(path, {"max_age": 0}, count)
+        snapshot = measure(path, {}, count)
+        refresh = requests.post(f"{BASE_URL}/snapshots/{view_name}/refresh").json()
+        print(f"{path:>26} | {live:>12.2f} | {snapshot:>16.2f} | {refresh['last_refresh_ms']:>11}")
+
+
+if __name__ == "__main__":
+    main()
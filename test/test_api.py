@@ -4,6 +4,7 @@
 """
 import requests
 import json
+import time
 from datetime import datetime, timedelta
 
 BASE_URL = "http://localhost:8000"
@@ -129,6 +130,36 @@ def test_contests():
     response = requests.get(f"{BASE_URL}/contests/")
     print_test("Получение списка соревнований", response.status_code == 200, f"Status: {response.status_code}, Count: {len(response.json())}")
 
+    # Тест 6: Заморозка турнирной таблицы: посылка после freeze_time видна только жюри до разморозки
+    jury_id = next(u["user_id"] for u in users if u["role"] in ("jury", "admin"))
+    participant_id = next(u["user_id"] for u in users if u["role"] == "participant")
+    problem_id = requests.get(f"{BASE_URL}/problems/").json()[0]["problem_id"]
+    frozen_contest = {**contest_data, "title": f"Frozen Contest {datetime.now().timestamp()}",
+                      "start_time": (datetime.now() - timedelta(minutes=90)).isoformat(), "freeze_minutes": 60}
+    contest_id = requests.post(f"{BASE_URL}/contests/", json=frozen_contest).json()["contest_id"]
+    submission = requests.post(f"{BASE_URL}/submissions/", json={
+        "user_id": participant_id, "contest_id": contest_id, "problem_id": problem_id,
+        "language": "Python", "source_code": "print('frozen')"}).json()
+    requests.put(f"{BASE_URL}/submissions/{submission['submission_id']}", json={"verdict": "accepted"})
+    public = requests.get(f"{BASE_URL}/analytics/standings/{contest_id}")
+    live = requests.get(f"{BASE_URL}/analytics/standings/{contest_id}", params={"viewer_id": jury_id})
+    print_test("Замороженная турнирная таблица",
+               public.headers.get("X-Standings-Frozen") == "true" and public.json() == []
+               and [row["user_id"] for row in live.json()] == [participant_id],
+               f"Public: {len(public.json())}, Live: {len(live.json())}")
+
+    # Тест 7: Разморозка проигрывает скрытые посылки и открывает живую таблицу
+    denied = requests.post(f"{BASE_URL}/contests/{contest_id}/resolve", params={"viewer_id": participant_id})
+    response = requests.post(f"{BASE_URL}/contests/{contest_id}/resolve", params={"viewer_id": jury_id})
+    steps = response.json().get("steps", []) if response.status_code == 200 else []
+    public = requests.get(f"{BASE_URL}/analytics/standings/{contest_id}")
+    print_test("Разморозка турнирной таблицы",
+               denied.status_code == 403 and response.status_code == 200
+               and [(s["submission_id"], s["previous_rank"], s["rank"]) for s in steps]
+               == [(submission["submission_id"], None, 1)]
+               and "X-Standings-Frozen" not in public.headers and public.json() == live.json(),
+               f"Status: {response.status_code}, Steps: {len(steps)}")
+
 
 def test_problems():
     print(f"\n{Colors.BLUE}=== Тестирование Problems ==={Colors.END}")
@@ -142,6 +173,7 @@ def test_problems():
         return
     
     # Тест 1: Создание задачи
+    problem_id = None
     problem_data = {
         "title": f"Test Problem {datetime.now().timestamp()}",
         "description": "Test problem description",
@@ -172,6 +204,40 @@ def test_problems():
     response = requests.get(f"{BASE_URL}/problems/")
     print_test("Получение списка задач", response.status_code == 200, f"Status: {response.status_code}, Count: {len(response.json())}")
 
+    # Тест 5: Условный GET (ETag выдается, когда запись не менялась ETAG_SETTLE_SECONDS, по умолчанию 5 с)
+    if problem_id:
+        response = requests.get(f"{BASE_URL}/problems/{problem_id}")
+        if "ETag" not in response.headers:
+            time.sleep(5.5)
+            response = requests.get(f"{BASE_URL}/problems/{problem_id}")
+        etag = response.headers.get("ETag")
+        cached = requests.get(f"{BASE_URL}/problems/{problem_id}", headers={"If-None-Match": etag or ""})
+        requests.put(f"{BASE_URL}/problems/{problem_id}", json={"time_limit_ms": 2000})
+        changed = requests.get(f"{BASE_URL}/problems/{problem_id}", headers={"If-None-Match": etag or ""})
+        print_test("ETag задачи: 304 без изменений, 200 после изменения",
+                   etag is not None and cached.status_code == 304 and changed.status_code == 200,
+                   f"ETag: {etag}, Status: {cached.status_code}, после PUT: {changed.status_code}")
+
+    # Тест 6: Большой тест хранится кусками, загружается потоком и читается по диапазону
+    if problem_id:
+        big_input = "".join(f"{i}\n" for i in range(300000)).encode()
+        response = requests.post(f"{BASE_URL}/testcases/", json={
+            "problem_id": problem_id, "input_data": "", "expected_output": "0\n", "test_order": 1,
+        })
+        testcase_id = response.json().get("testcase_id") if response.status_code == 201 else None
+        if testcase_id:
+            uploaded = requests.put(f"{BASE_URL}/testcases/{testcase_id}/input", data=big_input).json()
+            part = requests.get(f"{BASE_URL}/testcases/{testcase_id}/input", headers={"Range": "bytes=1000-1999"})
+            listed = requests.get(f"{BASE_URL}/testcases/", params={"problem_id": problem_id}).json()
+            print_test("Большой тест: загрузка потоком и чтение диапазона (206)",
+                       uploaded.get("size") == len(big_input) and part.status_code == 206
+                       and part.content == big_input[1000:2000]
+                       and listed[0]["input_size"] == len(big_input) and listed[0]["chunked"],
+                       f"Size: {uploaded.get('size')}, Chunks: {uploaded.get('chunks')}, Range: {part.status_code}")
+        else:
+            print_test("Большой тест: загрузка потоком и чтение диапазона (206)", False,
+                       f"Status: {response.status_code}")
+
 
 def test_submissions():
     print(f"\n{Colors.BLUE}=== Тестирование Submissions ==={Colors.END}")
@@ -216,6 +282,81 @@ def test_submissions():
     response = requests.get(f"{BASE_URL}/submissions/")
     print_test("Получение списка посылок", response.status_code == 200, f"Status: {response.status_code}, Count: {len(response.json())}")
 
+    # Тест 5: Курсорная пагинация продолжает список без пропусков и повторов
+    first = requests.get(f"{BASE_URL}/submissions/", params={"limit": 5})
+    cursor = first.headers.get("X-Next-Cursor")
+    second = requests.get(f"{BASE_URL}/submissions/", params={"limit": 5, "cursor": cursor}) if cursor else None
+    expected = requests.get(f"{BASE_URL}/submissions/", params={"limit": 10}).json()
+    print_test("Курсорная пагинация посылок",
+               second is not None and second.status_code == 200
+               and [s["submission_id"] for s in first.json() + second.json()] == [s["submission_id"] for s in expected],
+               f"Cursor: {cursor}")
+
+    # Тест 6: Фильтры списка посылок
+    filters = {"contest_id": contests[0]["contest_id"], "verdict": "accepted", "language": "Python"}
+    response = requests.get(f"{BASE_URL}/submissions/", params=filters)
+    print_test("Фильтрация посылок по контесту, вердикту и языку",
+               response.status_code == 200 and len(response.json()) > 0
+               and all(all(s[key] == value for key, value in filters.items()) for s in response.json()),
+               f"Status: {response.status_code}, Count: {len(response.json())}")
+
+    # Тест 7: Очередь проверки: посылку получает один проверяющий, вердикт принимается только от него
+    created = [requests.post(f"{BASE_URL}/submissions/", json=submission_data).json()["submission_id"] for _ in range(2)]
+    judge_a = f"test-judge-a-{datetime.now().timestamp()}"
+    judge_b = f"test-judge-b-{datetime.now().timestamp()}"
+    claimed_a, claimed_b = [], []
+    while not set(created) <= set(claimed_a + claimed_b):
+        batch_a = requests.post(f"{BASE_URL}/judge/claim", json={"judge_id": judge_a, "limit": 1}).json()
+        batch_b = requests.post(f"{BASE_URL}/judge/claim", json={"judge_id": judge_b, "limit": 1}).json()
+        if not batch_a and not batch_b:
+            break
+        claimed_a += [task["submission_id"] for task in batch_a]
+        claimed_b += [task["submission_id"] for task in batch_b]
+    results = [{"submission_id": submission_id, "verdict": "accepted", "score": 100} for submission_id in created]
+    foreign = requests.post(f"{BASE_URL}/judge/results", json={"judge_id": "test-judge-other", "results": results}).json()
+    heartbeat = requests.post(f"{BASE_URL}/judge/heartbeat",
+                              json={"judge_id": judge_a, "submission_ids": claimed_a}).json()
+    report_a = requests.post(f"{BASE_URL}/judge/results", json={"judge_id": judge_a, "results": results}).json()
+    report_b = requests.post(f"{BASE_URL}/judge/results", json={"judge_id": judge_b, "results": results}).json()
+    verdicts = [requests.get(f"{BASE_URL}/submissions/{submission_id}").json()["verdict"] for submission_id in created]
+    print_test("Очередь проверки: выдача без повторов и вердикты пачкой",
+               not set(claimed_a) & set(claimed_b) and set(created) <= set(claimed_a + claimed_b)
+               and foreign["applied"] == [] and len(heartbeat) == len(claimed_a)
+               and sorted(report_a["applied"] + report_b["applied"]) == sorted(created)
+               and verdicts == ["accepted", "accepted"],
+               f"Judge A: {len(claimed_a)}, judge B: {len(claimed_b)}, verdicts: {verdicts}")
+
+    # Тест 8: Проверяющий получает только посылки на языках, которые умеет запускать
+    java = requests.post(f"{BASE_URL}/submissions/", json={**submission_data, "language": "Java"}).json()["submission_id"]
+    python = requests.post(f"{BASE_URL}/submissions/", json=submission_data).json()["submission_id"]
+    judge_java = f"test-judge-java-{datetime.now().timestamp()}"
+    tasks = requests.post(f"{BASE_URL}/judge/claim",
+                          json={"judge_id": judge_java, "limit": 100, "languages": ["Java"]}).json()
+    requests.post(f"{BASE_URL}/judge/results", json={"judge_id": judge_java, "results": [
+        {"submission_id": task["submission_id"], "verdict": "compilation_error"} for task in tasks]})
+    claimed = [task["submission_id"] for task in tasks]
+    print_test("Очередь проверки: выдача по языкам",
+               java in claimed and python not in claimed and {task["language"] for task in tasks} == {"Java"},
+               f"Claimed: {len(claimed)}")
+
+    # Тест 9: Перепроверка контеста: посылки выдаются после новых, прогресс виден в задаче перепроверки
+    rejudge = requests.post(f"{BASE_URL}/contests/{submission_data['contest_id']}/rejudge",
+                            json={"user_id": submission_data["user_id"], "verdict": "compilation_error"})
+    job = rejudge.json()
+    live = requests.post(f"{BASE_URL}/submissions/", json={**submission_data, "language": "Java"}).json()["submission_id"]
+    judge_rejudge = f"test-judge-rejudge-{datetime.now().timestamp()}"
+    tasks = requests.post(f"{BASE_URL}/judge/claim",
+                          json={"judge_id": judge_rejudge, "limit": 100, "languages": ["Java"]}).json()
+    requests.post(f"{BASE_URL}/judge/results", json={"judge_id": judge_rejudge, "results": [
+        {"submission_id": task["submission_id"], "verdict": "compilation_error"} for task in tasks]})
+    claimed = [task["submission_id"] for task in tasks]
+    progress = requests.get(f"{BASE_URL}/contests/{submission_data['contest_id']}/rejudge/{job['job_id']}").json()
+    print_test("Перепроверка контеста",
+               rejudge.status_code == 202 and java in claimed and claimed.index(live) < claimed.index(java)
+               and progress["judged"] + progress["pending"] == job["total_submissions"]
+               and progress["status"] == ("completed" if progress["pending"] == 0 else "judging"),
+               f"Status: {rejudge.status_code}, rejudged: {job.get('total_submissions')}, progress: {progress.get('status')}")
+
 
 def test_batch():
     print(f"\n{Colors.BLUE}=== Тестирование Batch Import ==={Colors.END}")
@@ -254,6 +395,48 @@ def test_batch():
         print(f"  Успешно: {result.get('success_count', 0)}, Ошибок: {len(result.get('errors', []))}")
         if result.get('errors'):
             print(f"  Первая ошибка: {result['errors'][0].get('error', 'N/A')[:100]}")
+    
+    # Тест 2: Тот же пакет в режиме COPY (валидация в Python, ошибки по строкам)
+    batch_data["mode"] = "copy"
+    for idx, row in enumerate(batch_data["data"]):
+        row["username"] = f"copy_user_{idx}_{datetime.now().timestamp()}"
+        if "@" in row["email"]:
+            row["email"] = f"copy{idx}_{datetime.now().timestamp()}@example.com"
+    response = requests.post(f"{BASE_URL}/batch/import", json=batch_data)
+    result = response.json() if response.status_code == 200 else {}
+    print_test("Batch import в режиме copy (1 успех, 2 ошибки)", 
+               result.get("success") == 1 and result.get("failed") == 2, 
+               f"Status: {response.status_code}, Ошибочные строки: {[e['row'] for e in result.get('errors', [])]}")
+
+    # Тест 3: Потоковый импорт NDJSON (ответ тоже NDJSON, последняя строка - итог)
+    for idx, row in enumerate(batch_data["data"]):
+        row["username"] = f"stream_user_{idx}_{datetime.now().timestamp()}"
+        if "@" in row["email"]:
+            row["email"] = f"stream{idx}_{datetime.now().timestamp()}@example.com"
+    body = "\n".join(json.dumps(row) for row in batch_data["data"])
+    response = requests.post(f"{BASE_URL}/batch/import/stream",
+                             params={"entity_type": "users", "mode": "copy"}, data=body.encode())
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    summary = lines[-1] if lines else {}
+    print_test("Потоковый импорт NDJSON (1 успех, 2 ошибки)",
+               summary.get("type") == "summary" and summary.get("success") == 1 and summary.get("failed") == 2,
+               f"Status: {response.status_code}, Итог: {summary}")
+
+    # Тест 4: Фоновая задача импорта (ответ 202 сразу, прогресс по GET /batch/jobs/{id})
+    for idx, row in enumerate(batch_data["data"]):
+        row["username"] = f"job_user_{idx}_{datetime.now().timestamp()}"
+        if "@" in row["email"]:
+            row["email"] = f"job{idx}_{datetime.now().timestamp()}@example.com"
+    response = requests.post(f"{BASE_URL}/batch/jobs", json=batch_data)
+    job = response.json() if response.status_code == 202 else {}
+    for _ in range(50):
+        if not job or job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.2)
+        job = requests.get(f"{BASE_URL}/batch/jobs/{job['job_id']}").json()
+    print_test("Фоновая задача импорта (1 успех, 2 ошибки)",
+               job.get("status") == "completed" and job.get("rows_success") == 1 and job.get("rows_failed") == 2,
+               f"Status: {response.status_code}, Задача: {job.get('status')}, {job.get('rows_success')}/{job.get('rows_failed')}")
 
 
 def test_analytics():
@@ -271,6 +454,37 @@ def test_analytics():
     response = requests.get(f"{BASE_URL}/analytics/user-activity")
     print_test("Активность пользователей", response.status_code == 200, f"Status: {response.status_code}")
 
+    # Тест 4: Снимок распределения вердиктов после обновления совпадает с живым VIEW
+    requests.post(f"{BASE_URL}/analytics/snapshots/mv_verdict_distribution/refresh")
+    response = requests.get(f"{BASE_URL}/analytics/verdicts/distribution")
+    live = requests.get(f"{BASE_URL}/analytics/verdicts/distribution", params={"max_age": 0})
+    print_test("Снимок статистики после обновления",
+               response.status_code == 200 and "X-Snapshot-Age" in response.headers
+               and response.json() == live.json(),
+               f"Status: {response.status_code}, Age: {response.headers.get('X-Snapshot-Age')}")
+
+    # Тест 5: Потоковая выгрузка турнирной таблицы совпадает с JSON-ответом
+    contest_id = requests.get(f"{BASE_URL}/contests/").json()[0]["contest_id"]
+    response = requests.get(f"{BASE_URL}/export/standings/{contest_id}")
+    standings = requests.get(f"{BASE_URL}/analytics/standings/{contest_id}").json()
+    print_test("Выгрузка турнирной таблицы в NDJSON",
+               response.status_code == 200
+               and [json.loads(line) for line in response.text.splitlines()] == standings,
+               f"Status: {response.status_code}, Rows: {len(standings)}")
+
+    # Тест 6: Живая турнирная таблица (SSE) начинается со снимка, равного JSON-ответу
+    with requests.get(f"{BASE_URL}/analytics/standings/{contest_id}/stream", stream=True, timeout=10) as response:
+        event = {}
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                break
+            field, _, value = line.partition(": ")
+            event[field] = value
+    snapshot = json.loads(event.get("data", "{}"))
+    print_test("Живая турнирная таблица (SSE)",
+               response.status_code == 200 and event.get("event") == "snapshot"
+               and snapshot.get("rows") == standings,
+               f"Status: {response.status_code}, Event: {event.get('event')}, Seq: {snapshot.get('seq')}")
 
 def main():
     print(f"\n{Colors.YELLOW}{'='*60}")